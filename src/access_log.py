@@ -0,0 +1,269 @@
+import array
+import functools
+import hashlib
+import heapq
+import json
+import re
+import struct
+import time
+import urllib.parse
+from datetime import datetime
+
+# Operações do log de acesso do S3 que representam leitura do conteúdo do objeto
+ACCESS_OPERATIONS = frozenset(['REST.GET.OBJECT', 'REST.COPY.OBJECT_GET'])
+
+# Campos do log: "entre aspas", [data entre colchetes] ou sem espaços
+LOG_FIELD = re.compile(r'"[^"]*"|\[[^\]]*\]|\S+')
+
+# Acima disso (em meias-vidas) os contadores são reescalados para não estourar o float
+MAX_EXPONENT = 60.0
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_log_timestamp(stamp):
+    """
+    Converte "[06/Feb/2019:00:00:38 +0000]" em epoch; None se inválida.
+    Muitas linhas compartilham o mesmo segundo, então o resultado é memorizado
+    """
+
+    try:
+        return datetime.strptime(stamp[1:-1], '%d/%b/%Y:%H:%M:%S %z').timestamp()
+    except ValueError:
+        return None
+
+
+def parse_access_log_line(line):
+    """
+    Extrai (bucket, chave, timestamp) de uma linha do S3 server access log.
+    Retorna None para operações que não leem o objeto e requisições com erro
+    """
+
+    fields = LOG_FIELD.findall(line)
+    if len(fields) < 10 or fields[6] not in ACCESS_OPERATIONS or fields[7] == '-':
+        return None
+    if not fields[9].startswith('2'):
+        return None
+
+    timestamp = parse_log_timestamp(fields[2])
+    if timestamp is None:
+        return None
+
+    return fields[1], urllib.parse.unquote_plus(fields[7]), timestamp
+
+
+def iter_cloudtrail_accesses(document):
+    """Gera (bucket, chave, timestamp) dos eventos de dados GetObject de um arquivo do CloudTrail"""
+
+    for record in document.get('Records', []):
+        if record.get('eventSource') != 's3.amazonaws.com' or record.get('eventName') != 'GetObject':
+            continue
+        if record.get('errorCode'):
+            continue
+
+        parameters = record.get('requestParameters') or {}
+        if not parameters.get('bucketName') or not parameters.get('key'):
+            continue
+        try:
+            timestamp = datetime.fromisoformat(record['eventTime'].replace('Z', '+00:00')).timestamp()
+        except (KeyError, ValueError):
+            continue
+
+        yield parameters['bucketName'], parameters['key'], timestamp
+
+
+class DecayingSketch:
+    """
+    Count-min sketch com decaimento exponencial (meia-vida em segundos) e lista dos
+    top_k itens mais frequentes. O decaimento é "para frente": cada acesso soma
+    2^((t - t0) / meia-vida) e a leitura divide pelo mesmo fator no instante consultado,
+    então acessos fora de ordem não exigem varrer os contadores
+    """
+
+    def __init__(self, width=1 << 16, depth=4, half_life=7 * 86400, top_k=1000):
+        if depth > 16:
+            raise ValueError("depth máximo é 16")
+        self.width = width
+        self.depth = depth
+        self.half_life = half_life
+        self.top_k = top_k
+        self.landmark = None
+        self.counters = array.array('d', bytes(8 * width * depth))
+        self._heavy = {}
+        self._heap = []
+
+    def _cells(self, item):
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=4 * self.depth).digest()
+        return [row * self.width + int.from_bytes(digest[4 * row:4 * row + 4], 'little') % self.width
+                for row in range(self.depth)]
+
+    def _weight(self, timestamp):
+        return 2.0 ** ((timestamp - self.landmark) / self.half_life)
+
+    def add(self, item, timestamp, count=1):
+        if self.landmark is None:
+            self.landmark = timestamp
+        elif (timestamp - self.landmark) / self.half_life > MAX_EXPONENT:
+            self._rescale(timestamp)
+
+        weight = count * self._weight(timestamp)
+        counters = self.counters
+        estimate = None
+        for cell in self._cells(item):
+            counters[cell] += weight
+            if estimate is None or counters[cell] < estimate:
+                estimate = counters[cell]
+
+        self._track(item, estimate)
+
+    def _track(self, item, estimate):
+        heavy = self._heavy
+        if item not in heavy and len(heavy) >= self.top_k:
+            # Descarta entradas obsoletas do heap até achar o menor valor atual
+            while self._heap and heavy.get(self._heap[0][1]) != self._heap[0][0]:
+                heapq.heappop(self._heap)
+            if not self._heap or estimate <= self._heap[0][0]:
+                return
+            del heavy[heapq.heappop(self._heap)[1]]
+
+        heavy[item] = estimate
+        heapq.heappush(self._heap, (estimate, item))
+        if len(self._heap) > 4 * self.top_k:
+            self._heap = [(value, key) for key, value in heavy.items()]
+            heapq.heapify(self._heap)
+
+    def _rescale(self, timestamp):
+        factor = 2.0 ** ((self.landmark - timestamp) / self.half_life)
+        counters = self.counters
+        for index in range(len(counters)):
+            counters[index] *= factor
+        self._heavy = {item: value * factor for item, value in self._heavy.items()}
+        self._heap = [(value, item) for item, value in self._heavy.items()]
+        heapq.heapify(self._heap)
+        self.landmark = timestamp
+
+    def estimate(self, item, now=None):
+        """Acessos estimados (com decaimento até `now`); superestima, nunca subestima"""
+
+        if self.landmark is None:
+            return 0.0
+        counters = self.counters
+        raw = min(counters[cell] for cell in self._cells(item))
+        return raw / self._weight(now if now is not None else time.time())
+
+    def heavy_hitters(self, limit=10, now=None):
+        """[(item, acessos estimados)] dos mais acessados"""
+
+        if self.landmark is None:
+            return []
+        scale = self._weight(now if now is not None else time.time())
+        ranking = sorted(self._heavy.items(), key=lambda entry: entry[1], reverse=True)[:limit]
+        return [(item, value / scale) for item, value in ranking]
+
+    def header(self):
+        return {'width': self.width, 'depth': self.depth, 'half_life': self.half_life,
+                'top_k': self.top_k, 'landmark': self.landmark, 'heavy': self._heavy}
+
+    @classmethod
+    def from_header(cls, header, counters):
+        sketch = cls(header['width'], header['depth'], header['half_life'], header['top_k'])
+        sketch.landmark = header['landmark']
+        sketch.counters = counters
+        sketch._heavy = dict(header['heavy'])
+        sketch._heap = [(value, item) for item, value in sketch._heavy.items()]
+        heapq.heapify(sketch._heap)
+        return sketch
+
+
+def prefixes_of(object_key, levels):
+    """Prefixos da chave até `levels` níveis: a/b/c.txt -> ['a/', 'a/b/']"""
+
+    parts = object_key.split('/')[:-1][:levels]
+    return ['/'.join(parts[:depth]) + '/' for depth in range(1, len(parts) + 1)]
+
+
+class AccessTracker:
+    """
+    Frequência de acesso por objeto e por prefixo a partir dos logs de acesso do S3
+    (ou eventos de dados do CloudTrail), em memória limitada: um sketch por dimensão
+    """
+
+    MAGIC = b'S3OA1'
+
+    def __init__(self, width=1 << 16, depth=4, half_life_days=7.0, top_k=1000, prefix_levels=3):
+        self.prefix_levels = prefix_levels
+        self.keys = DecayingSketch(width, depth, half_life_days * 86400, top_k)
+        self.prefixes = DecayingSketch(max(1024, width // 4), depth, half_life_days * 86400, top_k)
+        self.stats = {'lines': 0, 'accesses': 0, 'ignored': 0}
+
+    def record(self, bucket_name, object_key, timestamp):
+        self.keys.add(f"{bucket_name}/{object_key}", timestamp)
+        for prefix in prefixes_of(object_key, self.prefix_levels):
+            self.prefixes.add(f"{bucket_name}/{prefix}", timestamp)
+        self.stats['accesses'] += 1
+
+    def ingest_access_log(self, lines):
+        """Processa linhas do server access log (str ou bytes) em streaming"""
+
+        for line in lines:
+            if isinstance(line, bytes):
+                line = line.decode('utf-8', errors='replace')
+            self.stats['lines'] += 1
+            access = parse_access_log_line(line)
+            if access is None:
+                self.stats['ignored'] += 1
+                continue
+            self.record(*access)
+
+    def ingest_cloudtrail(self, document):
+        for access in iter_cloudtrail_accesses(document):
+            self.record(*access)
+
+    def access_counts(self, bucket_name, object_key, now=None):
+        """Acessos estimados do objeto e do prefixo mais específico (com decaimento)"""
+
+        prefixes = prefixes_of(object_key, self.prefix_levels)
+        return {
+            'key': self.keys.estimate(f"{bucket_name}/{object_key}", now),
+            'prefix': self.prefixes.estimate(f"{bucket_name}/{prefixes[-1]}", now) if prefixes else None
+        }
+
+    def hot_keys(self, limit=10, now=None):
+        """Objetos mais acessados: [('bucket/chave', acessos estimados)]"""
+
+        return self.keys.heavy_hitters(limit, now)
+
+    def hot_prefixes(self, limit=10, now=None):
+        """Prefixos mais acessados: [('bucket/prefixo/', acessos estimados)]"""
+
+        return self.prefixes.heavy_hitters(limit, now)
+
+    def dumps(self):
+        """Serializa: cabeçalho JSON + contadores binários dos dois sketches"""
+
+        header = json.dumps({'prefix_levels': self.prefix_levels, 'stats': self.stats,
+                             'keys': self.keys.header(), 'prefixes': self.prefixes.header()}).encode('utf-8')
+        return b''.join([self.MAGIC, struct.pack('>I', len(header)), header,
+                         self.keys.counters.tobytes(), self.prefixes.counters.tobytes()])
+
+    @classmethod
+    def loads(cls, data):
+        if data[:len(cls.MAGIC)] != cls.MAGIC:
+            raise ValueError("snapshot de acessos inválido")
+
+        offset = len(cls.MAGIC)
+        (size,) = struct.unpack('>I', data[offset:offset + 4])
+        header = json.loads(data[offset + 4:offset + 4 + size])
+        offset += 4 + size
+
+        tracker = cls.__new__(cls)
+        tracker.prefix_levels = header['prefix_levels']
+        tracker.stats = header['stats']
+        for name in ('keys', 'prefixes'):
+            sketch_header = header[name]
+            length = 8 * sketch_header['width'] * sketch_header['depth']
+            counters = array.array('d')
+            counters.frombytes(data[offset:offset + length])
+            offset += length
+            setattr(tracker, name, DecayingSketch.from_header(sketch_header, counters))
+
+        return tracker
@@ -0,0 +1,39 @@
+import json
+from datetime import datetime
+
+
+class CheckpointStore:
+    """Persiste o progresso de jobs longos (backfill, crawler) para retomada após timeout"""
+
+    def __init__(self, table_provider):
+        self.table_provider = table_provider
+
+    def load(self, job_id):
+        """Retorna o estado salvo do job ou None"""
+
+        table = self.table_provider()
+        if table is None:
+            return None
+
+        item = table.get_item(Key={'job_id': job_id}).get('Item')
+        return json.loads(item['state']) if item else None
+
+    def save(self, job_id, state):
+        """Grava o estado atual do job"""
+
+        table = self.table_provider()
+        if table is None:
+            return
+
+        table.put_item(Item={
+            'job_id': job_id,
+            'state': json.dumps(state),
+            'updated_at': datetime.now().isoformat()
+        })
+
+    def clear(self, job_id):
+        """Remove o checkpoint de um job concluído"""
+
+        table = self.table_provider()
+        if table is not None:
+            table.delete_item(Key={'job_id': job_id})
@@ -0,0 +1,129 @@
+import collections
+import threading
+import time
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpen(Exception):
+    """O circuito está aberto: a chamada não foi feita"""
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker com janela deslizante de `window_seconds`. Com ao menos `min_calls`
+    chamadas na janela, abre quando a taxa de erros passa de `error_rate` ou a de chamadas
+    lentas (acima de `slow_seconds`) passa de `slow_rate`. Aberto, recusa chamadas por
+    `open_seconds`; depois fica meio aberto e deixa passar `probes` chamadas de teste:
+    sucesso fecha o circuito, falha reabre. Exceções para as quais ignore(e) é
+    verdadeiro (ex.: throttling, já tratado pelo limitador) não contam como falha
+    """
+
+    def __init__(self, window_seconds=60.0, min_calls=10, error_rate=0.5, slow_seconds=10.0,
+                 slow_rate=0.5, open_seconds=30.0, probes=1, ignore=None, clock=time.monotonic):
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_seconds = slow_seconds
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self.probes = probes
+        self.ignore = ignore
+        self.clock = clock
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probing = 0
+        self._window = collections.deque()
+        self._lock = threading.Lock()
+        self.stats = {'calls': 0, 'failures': 0, 'slow': 0, 'rejected': 0, 'opened': 0}
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if self._state == OPEN and self.clock() - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._probing = 0
+        return self._state
+
+    def available(self):
+        """Indica se uma chamada seria aceita agora, sem reservar vaga de teste"""
+
+        with self._lock:
+            state = self._current_state()
+            return state == CLOSED or (state == HALF_OPEN and self._probing < self.probes)
+
+    def call(self, func):
+        """Executa func se o circuito permitir (senão levanta CircuitOpen) e registra o resultado"""
+
+        with self._lock:
+            state = self._current_state()
+            if state == OPEN or (state == HALF_OPEN and self._probing >= self.probes):
+                self.stats['rejected'] += 1
+                raise CircuitOpen("Bedrock indisponível (circuito aberto)")
+            if state == HALF_OPEN:
+                self._probing += 1
+
+        started = self.clock()
+        try:
+            result = func()
+        except Exception as e:
+            if self.ignore is not None and self.ignore(e):
+                self._release(state)
+            else:
+                self._record(state, False, self.clock() - started)
+            raise
+        self._record(state, True, self.clock() - started)
+        return result
+
+    def _release(self, state):
+        """Devolve a vaga de teste sem registrar resultado"""
+
+        if state == HALF_OPEN:
+            with self._lock:
+                self._probing = max(0, self._probing - 1)
+
+    def _record(self, state, success, elapsed):
+        slow = elapsed >= self.slow_seconds
+
+        with self._lock:
+            now = self.clock()
+            self.stats['calls'] += 1
+            self.stats['failures'] += not success
+            self.stats['slow'] += slow
+
+            if state == HALF_OPEN:
+                self._probing = max(0, self._probing - 1)
+                if success and not slow:
+                    self._state = CLOSED
+                    self._window.clear()
+                else:
+                    self._open(now)
+                return
+
+            self._window.append((now, not success, slow))
+            while self._window and now - self._window[0][0] > self.window_seconds:
+                self._window.popleft()
+
+            if self._state == CLOSED and len(self._window) >= self.min_calls:
+                failures = sum(1 for _, failed, _ in self._window if failed)
+                slow_calls = sum(1 for _, _, was_slow in self._window if was_slow)
+                if (failures / len(self._window) >= self.error_rate
+                        or slow_calls / len(self._window) >= self.slow_rate):
+                    self._open(now)
+
+    def _open(self, now):
+        self._state = OPEN
+        self._opened_at = now
+        self._window.clear()
+        self.stats['opened'] += 1
+
+    def metrics(self):
+        """Estado atual e contadores acumulados"""
+
+        with self._lock:
+            return dict(self.stats, state=self._current_state())
@@ -0,0 +1,77 @@
+import os
+import threading
+
+# Padrões aplicados quando a variável de ambiente não é informada
+DEFAULT_CONNECT_TIMEOUT = 5
+DEFAULT_READ_TIMEOUT = 60
+DEFAULT_RETRY_MODE = 'adaptive'
+DEFAULT_MAX_ATTEMPTS = 5
+
+
+def _env(prefix, name, default, environ):
+    """Lê {PREFIX}_{NAME} (específico do serviço) e depois CLIENT_{NAME} (global)"""
+
+    for key in (f"{prefix}_{name}", f"CLIENT_{name}"):
+        if environ.get(key):
+            return environ[key]
+    return default
+
+
+def client_settings(prefix, max_pool_connections=10, default_region=None, environ=None):
+    """
+    Resolve as configurações do cliente a partir do ambiente. Cada opção aceita
+    uma variável por serviço (ex.: BEDROCK_READ_TIMEOUT) com fallback para a global
+    (CLIENT_READ_TIMEOUT): MAX_POOL, CONNECT_TIMEOUT, READ_TIMEOUT, RETRY_MODE,
+    MAX_ATTEMPTS, TCP_KEEPALIVE e REGION
+    """
+
+    environ = os.environ if environ is None else environ
+
+    return {
+        'region_name': environ.get(f"{prefix}_REGION") or default_region,
+        'max_pool_connections': int(_env(prefix, 'MAX_POOL', max_pool_connections, environ)),
+        'connect_timeout': float(_env(prefix, 'CONNECT_TIMEOUT', DEFAULT_CONNECT_TIMEOUT, environ)),
+        'read_timeout': float(_env(prefix, 'READ_TIMEOUT', DEFAULT_READ_TIMEOUT, environ)),
+        'retries': {
+            'mode': _env(prefix, 'RETRY_MODE', DEFAULT_RETRY_MODE, environ),
+            'max_attempts': int(_env(prefix, 'MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS, environ))
+        },
+        'tcp_keepalive': str(_env(prefix, 'TCP_KEEPALIVE', 'true', environ)).lower() == 'true'
+    }
+
+
+def create_client(service_name, prefix, resource=False, **settings_kwargs):
+    """Cria o cliente (ou resource) boto3 com as configurações resolvidas do ambiente"""
+
+    # boto3 é importado só quando algum cliente é de fato criado
+    import boto3
+    from botocore.config import Config
+
+    settings = client_settings(prefix, **settings_kwargs)
+    region_name = settings.pop('region_name')
+    factory = boto3.resource if resource else boto3.client
+
+    return factory(service_name, region_name=region_name, config=Config(**settings))
+
+
+class LazyClient:
+    """Proxy que cria o cliente no primeiro acesso a um atributo e o reutiliza entre invocações"""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def created(self):
+        return self._client is not None
+
+    def get(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._factory()
+        return self._client
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
@@ -0,0 +1,97 @@
+import zlib
+
+# Bytes lidos do início do objeto (GET com Range): suficiente para todas as assinaturas abaixo
+SNIFF_BYTES = 4096
+
+# (formato, deslocamento, assinatura), avaliados em ordem
+SIGNATURES = [
+    ('gzip', 0, b'\x1f\x8b'),
+    ('zstd', 0, b'\x28\xb5\x2f\xfd'),
+    ('bzip2', 0, b'BZh'),
+    ('xz', 0, b'\xfd7zXZ\x00'),
+    ('7z', 0, b'7z\xbc\xaf\x27\x1c'),
+    ('zip', 0, b'PK\x03\x04'),
+    ('pdf', 0, b'%PDF-'),
+    ('jpeg', 0, b'\xff\xd8\xff'),
+    ('png', 0, b'\x89PNG\r\n\x1a\n'),
+    ('gif', 0, b'GIF8'),
+    ('parquet', 0, b'PAR1'),
+    ('orc', 0, b'ORC'),
+    ('avro', 0, b'Obj\x01'),
+    ('sqlite', 0, b'SQLite format 3\x00'),
+    ('tar', 257, b'ustar'),
+    ('mp4', 4, b'ftyp'),
+]
+
+# Extensão usada como file_type e content type de cada formato
+FORMATS = {
+    'gzip': ('gz', 'application/gzip'),
+    'zstd': ('zst', 'application/zstd'),
+    'bzip2': ('bz2', 'application/x-bzip2'),
+    'xz': ('xz', 'application/x-xz'),
+    '7z': ('7z', 'application/x-7z-compressed'),
+    'zip': ('zip', 'application/zip'),
+    'pdf': ('pdf', 'application/pdf'),
+    'jpeg': ('jpg', 'image/jpeg'),
+    'png': ('png', 'image/png'),
+    'gif': ('gif', 'image/gif'),
+    'parquet': ('parquet', 'application/vnd.apache.parquet'),
+    'orc': ('orc', 'application/octet-stream'),
+    'avro': ('avro', 'application/avro'),
+    'sqlite': ('sqlite', 'application/vnd.sqlite3'),
+    'tar': ('tar', 'application/x-tar'),
+    'mp4': ('mp4', 'video/mp4'),
+    'json': ('json', 'application/json'),
+    'text': ('txt', 'text/plain'),
+}
+
+# Formatos cujo conteúdo já está comprimido (recompactar não reduz o tamanho)
+COMPRESSED_FORMATS = frozenset([
+    'gzip', 'zstd', 'bzip2', 'xz', '7z', 'zip', 'jpeg', 'png', 'gif', 'parquet', 'orc', 'mp4'
+])
+
+# Abaixo desta razão (comprimido/original) a amostra é considerada compressível
+COMPRESSIBLE_RATIO = 0.8
+
+
+def _is_text(data):
+    if b'\x00' in data:
+        return False
+    try:
+        data.decode('utf-8')
+    except UnicodeDecodeError as e:
+        # Amostra cortada no meio de um caractere multibyte continua sendo texto
+        if e.start < len(data) - 3:
+            return False
+    return True
+
+
+def sniff(data):
+    """
+    Identifica o formato pelos primeiros bytes. Retorna {'format', 'compressed',
+    'compressible'}; formato 'unknown' quando nenhuma assinatura casa
+    """
+
+    detected = 'unknown'
+    for name, offset, signature in SIGNATURES:
+        if data[offset:offset + len(signature)] == signature:
+            detected = name
+            break
+    else:
+        if data and _is_text(data):
+            detected = 'json' if data.lstrip()[:1] in (b'{', b'[') else 'text'
+
+    compressed = detected in COMPRESSED_FORMATS
+    compressible = False
+    if not compressed and data:
+        # Razão de compressão da própria amostra (nível 1, barato)
+        compressible = len(zlib.compress(data, 1)) / len(data) < COMPRESSIBLE_RATIO
+
+    return {'format': detected, 'compressed': compressed, 'compressible': compressible}
+
+
+def sniff_object(s3_client, bucket_name, object_key, size=SNIFF_BYTES):
+    """Lê só os primeiros `size` bytes do objeto (GET com Range) e identifica o formato"""
+
+    response = s3_client.get_object(Bucket=bucket_name, Key=object_key, Range=f"bytes=0-{size - 1}")
+    return sniff(response['Body'].read(size))
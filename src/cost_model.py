@@ -0,0 +1,143 @@
+from datetime import datetime, timezone
+
+# numpy é importado na primeira avaliação em lote (_numpy), não no import do módulo:
+# o import custa cerca de 40ms e ficava no cold start de toda invocação
+np = None
+_numpy_loaded = False
+
+GB = 1024 ** 3
+DAYS_PER_MONTH = 30
+
+# Preços us-east-1: armazenamento por GB/mês conforme COST_CALCULATOR.md; requisição de
+# transição (PUT/COPY na classe de destino) por objeto; duração mínima cobrada em dias;
+# tamanho mínimo faturável e bytes extras de índice cobrados por objeto arquivado
+DEFAULT_PRICES = {
+    'STANDARD': {'storage': 0.023, 'transition': 0.0005 / 1000, 'min_days': 0, 'min_size': 0, 'overhead': 0},
+    'INTELLIGENT_TIERING': {'storage': 0.023, 'transition': 0.005 / 1000, 'min_days': 0, 'min_size': 0, 'overhead': 0},
+    'STANDARD_IA': {'storage': 0.0125, 'transition': 0.01 / 1000, 'min_days': 30, 'min_size': 128 * 1024, 'overhead': 0},
+    'ONEZONE_IA': {'storage': 0.01, 'transition': 0.01 / 1000, 'min_days': 30, 'min_size': 128 * 1024, 'overhead': 0},
+    'GLACIER_IR': {'storage': 0.004, 'transition': 0.02 / 1000, 'min_days': 90, 'min_size': 128 * 1024, 'overhead': 0},
+    'GLACIER': {'storage': 0.004, 'transition': 0.03 / 1000, 'min_days': 90, 'min_size': 0, 'overhead': 40 * 1024},
+    'DEEP_ARCHIVE': {'storage': 0.00099, 'transition': 0.05 / 1000, 'min_days': 180, 'min_size': 0, 'overhead': 40 * 1024}
+}
+
+
+def _numpy():
+    """Módulo numpy, importado na primeira chamada; None se indisponível"""
+
+    global np, _numpy_loaded
+    if not _numpy_loaded:
+        _numpy_loaded = True
+        try:
+            import numpy
+        except ImportError:  # numpy não faz parte do runtime padrão da Lambda
+            numpy = None
+        np = numpy
+    return np
+
+
+def merge_prices(overrides=None):
+    """Aplica sobre a tabela padrão os preços informados por classe (ex.: vindos de COST_PRICES)"""
+
+    prices = {storage_class: dict(values) for storage_class, values in DEFAULT_PRICES.items()}
+    for storage_class, values in (overrides or {}).items():
+        prices.setdefault(storage_class, dict(DEFAULT_PRICES['STANDARD'])).update(values)
+    return prices
+
+
+def age_in_days(last_modified, now=None):
+    """Idade do objeto em dias a partir do last_modified ISO 8601 (0 se desconhecida)"""
+
+    if not last_modified:
+        return 0.0
+    try:
+        modified = datetime.fromisoformat(str(last_modified).replace('Z', '+00:00'))
+    except ValueError:
+        return 0.0
+
+    if modified.tzinfo is None:
+        modified = modified.replace(tzinfo=timezone.utc)
+    now = now or datetime.now(timezone.utc)
+    return max(0.0, (now - modified).total_seconds() / 86400)
+
+
+class CostModel:
+    """
+    Projeta a economia líquida de mover um objeto de classe no horizonte informado:
+    armazenamento evitado menos o custo na classe nova (respeitando tamanho mínimo e
+    duração mínima), a requisição de transição e a cobrança por remoção antecipada da
+    classe atual. Transições abaixo de min_savings (USD) são vetadas
+    """
+
+    def __init__(self, prices=None, horizon_days=365, min_savings=0.0):
+        self.prices = merge_prices(prices)
+        self.horizon_days = horizon_days
+        self.min_savings = min_savings
+        self._classes = list(self.prices)
+        self._index = {storage_class: index for index, storage_class in enumerate(self._classes)}
+        self._columns = {
+            field: [self.prices[storage_class][field] for storage_class in self._classes]
+            for field in ('storage', 'transition', 'min_days', 'min_size', 'overhead')
+        }
+
+    def project_savings(self, file_size, current_class, target_class, age_days=0.0):
+        """Economia líquida projetada (USD) para um objeto"""
+
+        return self.project_savings_batch([file_size], [current_class], [target_class], [age_days])[0]
+
+    def project_savings_batch(self, sizes, current_classes, target_classes, ages_days=None):
+        """
+        Versão vetorizada: recebe sequências paralelas e retorna a economia de cada objeto.
+        Usa numpy quando disponível; sem numpy faz o mesmo cálculo elemento a elemento
+        """
+
+        if ages_days is None:
+            ages_days = [0.0] * len(sizes)
+
+        # Classes fora da tabela (ex.: REDUCED_REDUNDANCY) são precificadas como STANDARD
+        default = self._index['STANDARD']
+        current = [self._index.get(storage_class, default) for storage_class in current_classes]
+        target = [self._index.get(storage_class, default) for storage_class in target_classes]
+
+        if _numpy() is not None:
+            return self._project_numpy(sizes, current, target, ages_days).tolist()
+
+        return [self._project_one(size, src, dst, age)
+                for size, src, dst, age in zip(sizes, current, target, ages_days)]
+
+    def _project_one(self, size, src, dst, age):
+        c = self._columns
+        horizon = self.horizon_days
+
+        current_gb = (max(size, c['min_size'][src]) + c['overhead'][src]) / GB
+        target_gb = (max(size, c['min_size'][dst]) + c['overhead'][dst]) / GB
+
+        current_cost = current_gb * c['storage'][src] * horizon / DAYS_PER_MONTH
+        target_cost = target_gb * c['storage'][dst] * max(horizon, c['min_days'][dst]) / DAYS_PER_MONTH
+        early_delete = current_gb * c['storage'][src] * max(0.0, c['min_days'][src] - age) / DAYS_PER_MONTH
+
+        return current_cost - target_cost - c['transition'][dst] - early_delete
+
+    def _project_numpy(self, sizes, current, target, ages_days):
+        columns = {field: np.asarray(values, dtype=float) for field, values in self._columns.items()}
+        sizes = np.asarray(sizes, dtype=float)
+        ages = np.asarray(ages_days, dtype=float)
+        src = np.asarray(current, dtype=np.intp)
+        dst = np.asarray(target, dtype=np.intp)
+        horizon = self.horizon_days
+
+        current_gb = (np.maximum(sizes, columns['min_size'][src]) + columns['overhead'][src]) / GB
+        target_gb = (np.maximum(sizes, columns['min_size'][dst]) + columns['overhead'][dst]) / GB
+
+        current_cost = current_gb * columns['storage'][src] * horizon / DAYS_PER_MONTH
+        target_cost = target_gb * columns['storage'][dst] * np.maximum(horizon, columns['min_days'][dst]) / DAYS_PER_MONTH
+        early_delete = current_gb * columns['storage'][src] * np.maximum(0.0, columns['min_days'][src] - ages) / DAYS_PER_MONTH
+
+        return current_cost - target_cost - columns['transition'][dst] - early_delete
+
+    def evaluate_batch(self, sizes, current_classes, target_classes, ages_days=None):
+        """Retorna {'decision': 'apply'/'veto', 'projected_savings': USD} para cada objeto"""
+
+        savings = self.project_savings_batch(sizes, current_classes, target_classes, ages_days)
+        return [{'decision': 'apply' if value >= self.min_savings else 'veto', 'projected_savings': value}
+                for value in savings]
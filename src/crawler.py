@@ -0,0 +1,136 @@
+import copy
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Máximo de chaves por página do ListObjectsV2
+PAGE_SIZE = 1000
+
+
+def _list_level(s3_client, bucket_name, prefix, delimiter):
+    """Retorna os prefixos filhos de um nível (CommonPrefixes), percorrendo todas as páginas"""
+
+    children = []
+    params = {'Bucket': bucket_name, 'Prefix': prefix, 'Delimiter': delimiter, 'MaxKeys': PAGE_SIZE}
+
+    while True:
+        response = s3_client.list_objects_v2(**params)
+        children.extend(entry['Prefix'] for entry in response.get('CommonPrefixes', []))
+        if not response.get('IsTruncated'):
+            return children
+        params['ContinuationToken'] = response['NextContinuationToken']
+
+
+def discover_partitions(s3_client, bucket_name, prefix='', delimiter='/', target=32, max_depth=3):
+    """
+    Divide o keyspace pelos prefixos descobertos com o delimitador, descendo nível a nível
+    até ter ao menos `target` partições. Cada prefixo expandido gera uma partição só com
+    os objetos diretos (listada com delimitador); os da fronteira são listados recursivamente
+    """
+
+    partitions = {}
+    frontier = [prefix]
+
+    for _ in range(max_depth):
+        if not frontier or len(partitions) + len(frontier) >= target:
+            break
+
+        next_frontier = []
+        for current in frontier:
+            partitions[f"{current}|{delimiter}"] = {'prefix': current, 'delimiter': delimiter}
+            next_frontier.extend(_list_level(s3_client, bucket_name, current, delimiter))
+        frontier = next_frontier
+
+    for current in frontier:
+        partitions[current] = {'prefix': current, 'delimiter': None}
+
+    return partitions
+
+
+def listing_to_row(bucket_name, entry):
+    """Converte um item do ListObjectsV2 no formato de linha do S3 Inventory"""
+
+    return {
+        'Bucket': bucket_name,
+        'Key': entry['Key'],
+        'Size': entry.get('Size', 0),
+        'LastModifiedDate': entry.get('LastModified', ''),
+        'ETag': entry.get('ETag', ''),
+        'StorageClass': entry.get('StorageClass')
+    }
+
+
+def iter_partition(s3_client, bucket_name, partition):
+    """Percorre as páginas de uma partição a partir do último objeto processado (StartAfter)"""
+
+    params = {'Bucket': bucket_name, 'Prefix': partition['prefix'], 'MaxKeys': PAGE_SIZE}
+    if partition.get('delimiter'):
+        params['Delimiter'] = partition['delimiter']
+    if partition.get('start_after'):
+        params['StartAfter'] = partition['start_after']
+
+    while True:
+        response = s3_client.list_objects_v2(**params)
+        contents = response.get('Contents', [])
+        if contents:
+            yield contents
+        if not response.get('IsTruncated'):
+            return
+        params['ContinuationToken'] = response['NextContinuationToken']
+
+
+def crawl_partitions(s3_client, bucket_name, state, handle_page, on_checkpoint=None,
+                     should_stop=None, max_concurrency=8, checkpoint_seconds=5.0):
+    """
+    Lista as partições pendentes em paralelo, entregando cada página a handle_page.
+    O progresso de cada partição é atualizado em state após cada página; uma cópia é
+    passada para on_checkpoint no máximo a cada checkpoint_seconds e ao final.
+    Se handle_page retornar verdadeiro (falhas temporárias), a página não conta como
+    processada e a partição para ali, para ser relistada na próxima execução.
+    Retorna True se todas as partições terminaram
+    """
+
+    # Gravações serializadas: um snapshot antigo nunca sobrescreve um mais novo
+    lock = threading.Lock()
+    last_saved = [time.time()]
+    pending = [partition_id for partition_id, partition in state['partitions'].items()
+               if not partition.get('done')]
+
+    def save():
+        last_saved[0] = time.time()
+        if on_checkpoint:
+            on_checkpoint(copy.deepcopy(state))
+
+    def checkpoint(partition_id, objects=0, **progress):
+        with lock:
+            state['partitions'][partition_id].update(progress)
+            state['objects'] = state.get('objects', 0) + objects
+            if time.time() - last_saved[0] >= checkpoint_seconds:
+                save()
+
+    def crawl(partition_id):
+        partition = state['partitions'][partition_id]
+
+        for contents in iter_partition(s3_client, bucket_name, partition):
+            if handle_page([listing_to_row(bucket_name, entry) for entry in contents]):
+                return False
+
+            checkpoint(partition_id, start_after=contents[-1]['Key'], objects=len(contents))
+
+            if should_stop and should_stop():
+                return False
+
+        checkpoint(partition_id, done=True)
+        return True
+
+    if not pending:
+        return True
+
+    with ThreadPoolExecutor(max_workers=min(max_concurrency, len(pending))) as executor:
+        finished = list(executor.map(crawl, pending))
+
+    # Páginas já processadas são idempotentes; perder o intervalo entre gravações só gera relistagem
+    with lock:
+        save()
+
+    return all(finished)
@@ -0,0 +1,130 @@
+import random
+import threading
+import time
+
+# Limites da API do DynamoDB
+BATCH_WRITE_LIMIT = 25
+BATCH_GET_LIMIT = 100
+
+
+class InsightSink:
+    """
+    Buffer de insights gravados com batch_write_item (25 itens por requisição).
+    Itens não processados são reenviados com backoff exponencial com jitter
+    """
+
+    def __init__(self, writer, table_name, max_buffer=100, max_age_seconds=5.0,
+                 max_attempts=8, base_delay=0.05, max_delay=2.0, sleep=time.sleep):
+        self.writer = writer
+        self.table_name = table_name
+        self.max_buffer = max_buffer
+        self.max_age_seconds = max_age_seconds
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.sleep = sleep
+        self._buffer = {}
+        self._oldest = None
+        self._lock = threading.Lock()
+        self.failed = []
+        self.stats = {'items': 0, 'requests': 0, 'retries': 0, 'failed': 0}
+
+    def add(self, item):
+        """Adiciona o item ao buffer e grava se o limite de tamanho ou idade foi atingido"""
+
+        with self._lock:
+            # Chaves repetidas no mesmo batch_write_item geram ValidationException
+            self._buffer[item['file_id']] = item
+            if self._oldest is None:
+                self._oldest = time.time()
+
+            ready = (len(self._buffer) >= self.max_buffer
+                     or time.time() - self._oldest >= self.max_age_seconds)
+            items = self._drain() if ready else []
+
+        if items:
+            self._write(items)
+
+    def flush(self):
+        """Grava tudo o que estiver no buffer e retorna os itens que falharam desde o último flush"""
+
+        with self._lock:
+            items = self._drain()
+
+        if items:
+            self._write(items)
+
+        with self._lock:
+            failed, self.failed = self.failed, []
+        return failed
+
+    def _drain(self):
+        items = list(self._buffer.values())
+        self._buffer = {}
+        self._oldest = None
+        return items
+
+    def _write(self, items):
+        for start in range(0, len(items), BATCH_WRITE_LIMIT):
+            self._write_chunk(items[start:start + BATCH_WRITE_LIMIT])
+
+    def _write_chunk(self, items):
+        requests = [{'PutRequest': {'Item': item}} for item in items]
+
+        for attempt in range(self.max_attempts):
+            if attempt:
+                # Backoff exponencial com jitter completo
+                delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+                self.sleep(random.uniform(0, delay))
+
+            try:
+                response = self.writer(RequestItems={self.table_name: requests})
+            except Exception as e:
+                print(f"Erro no batch_write_item: {str(e)}")
+                response = {'UnprocessedItems': {self.table_name: requests}}
+
+            with self._lock:
+                self.stats['requests'] += 1
+                self.stats['retries'] += 1 if attempt else 0
+
+            unprocessed = response.get('UnprocessedItems', {}).get(self.table_name, [])
+            with self._lock:
+                self.stats['items'] += len(requests) - len(unprocessed)
+
+            if not unprocessed:
+                return
+            requests = unprocessed
+
+        failed = [request['PutRequest']['Item'] for request in requests]
+        print(f"Insights não gravados após {self.max_attempts} tentativas: {len(failed)}")
+        with self._lock:
+            self.stats['failed'] += len(failed)
+            self.failed.extend(failed)
+
+
+def fetch_attributes(reader, table_name, keys, projection=None, max_attempts=5, sleep=time.sleep,
+                     key_name='file_id'):
+    """Lê itens em lotes de 100 com batch_get_item; retorna {chave: item} (sem projeção, o item inteiro)"""
+
+    found = {}
+
+    for start in range(0, len(keys), BATCH_GET_LIMIT):
+        pending = [{key_name: key} for key in keys[start:start + BATCH_GET_LIMIT]]
+
+        for attempt in range(max_attempts):
+            if attempt:
+                sleep(random.uniform(0, 0.05 * (2 ** attempt)))
+
+            request = {'Keys': pending}
+            if projection:
+                request['ProjectionExpression'] = projection
+            response = reader(RequestItems={table_name: request})
+
+            for item in response.get('Responses', {}).get(table_name, []):
+                found[item[key_name]] = item
+
+            pending = response.get('UnprocessedKeys', {}).get(table_name, {}).get('Keys', [])
+            if not pending:
+                break
+
+    return found
@@ -0,0 +1,114 @@
+import csv
+import gzip
+import io
+import json
+import mimetypes
+import tempfile
+import urllib.parse
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow não faz parte do runtime padrão da Lambda
+    pq = None
+
+
+def read_manifest(s3_client, bucket_name, manifest_key):
+    """Lê o manifest.json de um relatório do S3 Inventory"""
+
+    body = s3_client.get_object(Bucket=bucket_name, Key=manifest_key)['Body'].read()
+    manifest = json.loads(body)
+
+    # destinationBucket vem como ARN (arn:aws:s3:::bucket)
+    manifest['dataBucket'] = manifest['destinationBucket'].split(':::')[-1]
+    manifest['columns'] = [column.strip() for column in manifest.get('fileSchema', '').split(',')]
+
+    return manifest
+
+
+def _iter_csv(body, columns):
+    """Lê CSV gzip em streaming, uma linha por vez"""
+
+    text = io.TextIOWrapper(gzip.GzipFile(fileobj=body), encoding='utf-8', newline='')
+    for values in csv.reader(text):
+        row = dict(zip(columns, values))
+        # Chaves no CSV do Inventory são URL-encoded
+        if 'Key' in row:
+            row['Key'] = urllib.parse.unquote_plus(row['Key'])
+        yield row
+
+
+def _iter_parquet(body, batch_size=10000):
+    """Lê Parquet por lotes de linhas (o arquivo é copiado para disco, não para memória)"""
+
+    if pq is None:
+        raise RuntimeError("Manifestos Parquet exigem o pacote pyarrow")
+
+    with tempfile.TemporaryFile() as spool:
+        for chunk in iter(lambda: body.read(8 * 1024 * 1024), b''):
+            spool.write(chunk)
+        spool.seek(0)
+
+        for batch in pq.ParquetFile(spool).iter_batches(batch_size=batch_size):
+            for row in batch.to_pylist():
+                yield {_normalize_column(name): value for name, value in row.items()}
+
+
+def _normalize_column(name):
+    # Parquet usa snake_case (last_modified_date, e_tag); o CSV usa o fileSchema (LastModifiedDate, ETag)
+    return ''.join(part.capitalize() for part in name.split('_'))
+
+
+def iter_inventory_rows(s3_client, manifest, start_file=0, start_row=0):
+    """
+    Percorre as linhas de todos os arquivos do manifest em streaming.
+    Gera (índice do arquivo, índice da linha, linha) a partir do checkpoint informado
+    """
+
+    file_format = manifest.get('fileFormat', 'CSV').upper()
+
+    for file_index, data_file in enumerate(manifest['files']):
+        if file_index < start_file:
+            continue
+
+        body = s3_client.get_object(Bucket=manifest['dataBucket'], Key=data_file['key'])['Body']
+
+        if file_format == 'CSV':
+            rows = _iter_csv(body, manifest['columns'])
+        elif file_format == 'PARQUET':
+            rows = _iter_parquet(body)
+        else:
+            raise ValueError(f"Formato de inventário não suportado: {file_format}")
+
+        skip = start_row if file_index == start_file else 0
+        for row_index, row in enumerate(rows):
+            if row_index >= skip:
+                yield file_index, row_index, row
+
+
+def row_to_metadata(row, file_type_from_key):
+    """
+    Converte uma linha do inventário no formato de get_file_metadata.
+    Retorna None para delete markers e versões não atuais
+    """
+
+    if str(row.get('IsDeleteMarker', 'false')).lower() == 'true':
+        return None
+    if str(row.get('IsLatest', 'true')).lower() == 'false':
+        return None
+
+    object_key = row['Key']
+    last_modified = row.get('LastModifiedDate', '')
+    if hasattr(last_modified, 'isoformat'):
+        last_modified = last_modified.isoformat()
+
+    return {
+        'file_name': object_key,
+        'file_size': int(row.get('Size') or 0),
+        'file_type': file_type_from_key(object_key),
+        'content_type': mimetypes.guess_type(object_key)[0] or 'unknown',
+        'last_modified': last_modified,
+        'storage_class': row.get('StorageClass') or 'STANDARD',
+        'etag': str(row.get('ETag') or '').strip('"'),
+        'version_id': row.get('VersionId') or None,
+        'optimized_by': None
+    }
@@ -0,0 +1,131 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# Substituições aplicadas em ordem sobre a chave inteira
+PATTERNS = [
+    ('{uuid}', re.compile(r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}', re.IGNORECASE)),
+    # 2025-10-17, 20251017, 2025/10/17 (partição por caminho), com hora opcional
+    ('{date}', re.compile(
+        r'(?<!\d)(?:19|20)\d{2}([-_/]?)(?:0[1-9]|1[0-2])\1(?:0[1-9]|[12]\d|3[01])'
+        r'(?:[T_/ -]?[0-2]\d(?:[:-]?[0-5]\d){0,2}Z?)?(?!\d)'
+    )),
+    ('{hash}', re.compile(r'(?<![0-9a-z])[0-9a-f]{16,}(?![0-9a-z])', re.IGNORECASE)),
+]
+PARTITION = re.compile(r'^([^=]+)=.+$')
+DIGITS = re.compile(r'\d+')
+
+
+def normalize_key(object_key):
+    """
+    Reduz a chave a um template: UUIDs, datas e hashes viram {uuid}, {date} e {hash};
+    partições Hive (tenant=123) viram tenant={value}; diretórios com números viram {id}
+    e números no nome do arquivo viram {n} (a extensão é preservada).
+    Ex.: logs/2025/10/17/host-42/app.log.gz -> logs/{date}/{id}/app.log.gz
+    """
+
+    template = object_key
+    for placeholder, pattern in PATTERNS:
+        template = pattern.sub(placeholder, template)
+
+    segments = template.split('/')
+    for index, segment in enumerate(segments[:-1]):
+        partition = PARTITION.match(segment)
+        if partition:
+            segments[index] = f"{partition.group(1)}={{value}}"
+        elif DIGITS.search(segment):
+            segments[index] = '{id}'
+
+    stem, dot, extension = segments[-1].partition('.')
+    segments[-1] = DIGITS.sub('{n}', stem) + dot + extension
+
+    return '/'.join(segments)
+
+
+class KeyTemplates:
+    """
+    Registro dos templates de chave aprendidos a partir do tráfego, com contagem de
+    acessos e a recomendação memorizada por template. Limitado a max_templates
+    (os menos usados recentemente saem primeiro)
+    """
+
+    def __init__(self, max_templates=10000, ttl_seconds=86400):
+        self.max_templates = max_templates
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'learned': 0, 'evicted': 0, 'memo_hits': 0, 'memo_misses': 0}
+
+    def learn(self, object_key):
+        """Registra um acesso ao template da chave e o retorna (None se a chave não tem partes variáveis)"""
+
+        template = normalize_key(object_key)
+        if '{' not in template:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(template)
+            if entry is None:
+                entry = self._entries[template] = {'hits': 0, 'recommendation': None, 'expires_at': 0}
+                self.stats['learned'] += 1
+                while len(self._entries) > self.max_templates:
+                    self._entries.popitem(last=False)
+                    self.stats['evicted'] += 1
+            entry['hits'] += 1
+            self._entries.move_to_end(template)
+
+        return template
+
+    def recall(self, template):
+        """Recomendação memorizada para o template ou None"""
+
+        if template is None:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(template)
+            if entry and entry['recommendation'] and entry['expires_at'] > time.time():
+                self.stats['memo_hits'] += 1
+                return dict(entry['recommendation'], source='template')
+            self.stats['memo_misses'] += 1
+        return None
+
+    def remember(self, template, recommendation):
+        """Memoriza a recomendação do template (baixa confiança e heurística local não entram)"""
+
+        if template is None or recommendation.get('confidence') == 'baixa':
+            return
+        if recommendation.get('source') == 'heuristic':
+            return
+
+        with self._lock:
+            entry = self._entries.get(template)
+            if entry is None:
+                return
+            entry['recommendation'] = {
+                'storage_class': recommendation['storage_class'],
+                'reasoning': recommendation.get('reasoning', ''),
+                'confidence': recommendation.get('confidence', 'média')
+            }
+            entry['expires_at'] = time.time() + self.ttl_seconds
+
+    def hits(self, template):
+        with self._lock:
+            entry = self._entries.get(template)
+            return entry['hits'] if entry else 0
+
+    def top(self, limit=10):
+        """Templates mais acessados: [(template, acessos)]"""
+
+        with self._lock:
+            ranking = [(template, entry['hits']) for template, entry in self._entries.items()]
+        return sorted(ranking, key=lambda item: item[1], reverse=True)[:limit]
+
+    def clear(self):
+        """Esquece os templates e zera os contadores"""
+
+        with self._lock:
+            self._entries.clear()
+            for name in self.stats:
+                self.stats[name] = 0
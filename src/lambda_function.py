@@ -1,138 +1,1889 @@
+import gzip
 import json
-import boto3
+import mimetypes
+import threading
+import time
 import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from decimal import Decimal
 import os
 
-s3_client = boto3.client('s3')
-bedrock_client = boto3.client('bedrock-runtime', region_name='us-east-1')
-dynamodb = boto3.resource('dynamodb')
+from botocore.exceptions import ClientError, HTTPClientError
+from botocore.exceptions import ConnectionError as EndpointError
+
+from access_log import AccessTracker
+from checkpoints import CheckpointStore
+from circuit_breaker import CircuitBreaker, CircuitOpen
+from clients import LazyClient, create_client
+from content_sniffer import FORMATS, sniff_object
+from cost_model import CostModel, age_in_days
+from crawler import crawl_partitions, discover_partitions
+from insight_sink import InsightSink, fetch_attributes
+from inventory import iter_inventory_rows, read_manifest, row_to_metadata
+from key_templates import KeyTemplates
+from lifecycle import apply_lifecycle_rules, needs_copy, synthesize_rules
+
+from multipart_copy import copy_attributes, multipart_copy
+from rate_limiter import AdaptiveLimiter, RateLimited, SharedRateCounter, is_throttle
+from recommendation_cache import RecommendationCache, build_signature
+from rules import HEURISTIC_RULES, RuleEngine
+from scheduler import TransitionSchedule, in_window, parse_windows, sweep_due
+from similarity_index import SimilarityIndex
+
+# Número máximo de registros processados em paralelo por invocação
+MAX_CONCURRENCY = int(os.environ.get('MAX_CONCURRENCY', '16'))
+
+# Pool de conexões dimensionado para a concorrência (padrão do botocore é 10)
+CLIENT_POOL_SIZE = max(10, MAX_CONCURRENCY)
+
+# Clientes criados no primeiro uso; pool, timeouts, retries e região vêm do ambiente (clients.py)
+s3_client = LazyClient(lambda: create_client('s3', 'S3', max_pool_connections=CLIENT_POOL_SIZE))
+bedrock_client = LazyClient(lambda: create_client(
+    'bedrock-runtime', 'BEDROCK', max_pool_connections=CLIENT_POOL_SIZE, default_region='us-east-1'
+))
+dynamodb = LazyClient(lambda: create_client('dynamodb', 'DYNAMODB', resource=True,
+                                            max_pool_connections=CLIENT_POOL_SIZE))
+sqs_client = LazyClient(lambda: create_client('sqs', 'SQS'))
 
 # Variáveis de ambiente
 TABLE_NAME = os.environ.get('DYNAMODB_TABLE')
+CACHE_TABLE = os.environ.get('CACHE_TABLE')
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', '1024'))
+CACHE_TTL_SECONDS = int(os.environ.get('CACHE_TTL_SECONDS', str(24 * 60 * 60)))
+RULES_MIN_SCORE = float(os.environ.get('RULES_MIN_SCORE', '0.9'))
+BEDROCK_BATCH_SIZE = int(os.environ.get('BEDROCK_BATCH_SIZE', '10'))
+
+BUCKET_NAME = os.environ.get('BUCKET_NAME')
+LIFECYCLE_MIN_OBJECTS = int(os.environ.get('LIFECYCLE_MIN_OBJECTS', '2'))
+# Regras só em prefixos com ao menos N níveis e cujos insights cobrem a maior parte dos objetos guardados
+LIFECYCLE_MIN_PREFIX_DEPTH = max(1, int(os.environ.get('LIFECYCLE_MIN_PREFIX_DEPTH', '1')))
+LIFECYCLE_MIN_COVERAGE = float(os.environ.get('LIFECYCLE_MIN_COVERAGE', '0.8'))
+
+# Usa tamanho/ETag do evento S3 em vez de head_object quando o evento é completo. O evento não
+# traz a classe de armazenamento: só ligue em buckets cujos uploads nunca definem x-amz-storage-class
+TRUST_EVENT_METADATA = os.environ.get('TRUST_EVENT_METADATA', 'false').lower() == 'true'
+
+# Eventos de upload direto; cópias e multipart (inclusive a cópia multipart do próprio otimizador)
+# sempre passam por head_object para checar classe atual e metadados
+EVENT_METADATA_EVENTS = ('ObjectCreated:Put', 'ObjectCreated:Post')
+
+CHECKPOINT_TABLE = os.environ.get('CHECKPOINT_TABLE')
+BACKFILL_CHUNK_SIZE = int(os.environ.get('BACKFILL_CHUNK_SIZE', '1000'))
+# Margem antes do timeout da Lambda para salvar o checkpoint e encerrar
+BACKFILL_SAFETY_MS = int(os.environ.get('BACKFILL_SAFETY_MS', '60000'))
+
+CRAWLER_PARTITIONS = int(os.environ.get('CRAWLER_PARTITIONS', '32'))
+CRAWLER_CONCURRENCY = int(os.environ.get('CRAWLER_CONCURRENCY', '8'))
+
+# Erros que o S3 Batch Operations deve tentar de novo (TemporaryFailure)
+TEMPORARY_ERROR_CODES = {
+    'ThrottlingException', 'Throttling', 'TooManyRequestsException', 'SlowDown',
+    'RequestTimeout', 'ServiceUnavailable', 'ServiceUnavailableException', 'InternalError',
+    'InternalServerException', 'ModelNotReadyException', 'ModelTimeoutException',
+    'ProvisionedThroughputExceededException', 'RequestLimitExceeded'
+}
+
+# Classes que exigem restore antes de qualquer cópia
+ARCHIVED_CLASSES = ('GLACIER', 'DEEP_ARCHIVE')
+
+# Identificação do formato pelos magic bytes (GET com Range dos primeiros KB):
+# 'off', 'unknown' (só objetos sem tipo reconhecido pela extensão) ou 'all'
+SNIFF_CONTENT = os.environ.get('SNIFF_CONTENT', 'off').lower()
+UNKNOWN_CONTENT_TYPES = ('unknown', 'application/octet-stream', 'binary/octet-stream')
+sniff_stats = {'sniffed': 0, 'retyped': 0, 'compressed': 0, 'compressible': 0, 'errors': 0}
+
+# Objetos acima do limite são copiados com multipart (copy_object aceita no máximo 5GB)
+MULTIPART_THRESHOLD = int(os.environ.get('MULTIPART_THRESHOLD', str(1024 * 1024 * 1024)))
+MULTIPART_PART_SIZE = int(os.environ.get('MULTIPART_PART_SIZE', str(256 * 1024 * 1024)))
+MULTIPART_CONCURRENCY = int(os.environ.get('MULTIPART_CONCURRENCY', '8'))
+
+# Modelos: o rápido responde primeiro e o maior só é chamado quando a resposta
+# tem confiança em ESCALATION_CONFIDENCES ou não passa na validação
+MODEL_ID = os.environ.get('MODEL_ID', 'anthropic.claude-3-sonnet-20240229-v1:0')
+FAST_MODEL_ID = os.environ.get('FAST_MODEL_ID', 'anthropic.claude-3-haiku-20240307-v1:0')
+TIERED_ANALYSIS = os.environ.get('TIERED_ANALYSIS', 'true').lower() == 'true'
+ESCALATION_CONFIDENCES = tuple(
+    level.strip() for level in os.environ.get('ESCALATION_CONFIDENCES', 'baixa').split(',') if level.strip()
+)
+STORAGE_CLASSES = ('STANDARD', 'STANDARD_IA', 'GLACIER', 'DEEP_ARCHIVE')
+CONFIDENCE_LEVELS = ('alta', 'média', 'baixa')
+
+# Saída estruturada: o modelo responde chamando a ferramenta, com storage_class e
+# confidence restritos a enums. As orientações ficam na descrição da ferramenta
+RECOMMENDATION_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'storage_class': {'type': 'string', 'enum': list(STORAGE_CLASSES)},
+        'reasoning': {'type': 'string', 'description': 'explicação curta'},
+        'confidence': {'type': 'string', 'enum': list(CONFIDENCE_LEVELS)}
+    },
+    'required': ['storage_class', 'reasoning', 'confidence']
+}
+STORAGE_GUIDE = (
+    "STANDARD: acesso frequente. STANDARD_IA: acesso infrequente, mínimo 128KB. "
+    "GLACIER: arquivamento, recuperação em minutos/horas. DEEP_ARCHIVE: longo prazo, recuperação em 12h. "
+    "Arquivos <128KB não se beneficiam de IA; logs e backups = GLACIER; documentos = IA; mídia ativa = STANDARD"
+)
+RECOMMEND_TOOL = {
+    'name': 'recommend_storage_class',
+    'description': f"Registra a classe de armazenamento recomendada para o arquivo. {STORAGE_GUIDE}",
+    'input_schema': RECOMMENDATION_SCHEMA
+}
+BATCH_RECOMMEND_TOOL = {
+    'name': 'recommend_storage_classes',
+    'description': f"Registra a classe de armazenamento recomendada para cada arquivo. {STORAGE_GUIDE}",
+    'input_schema': {
+        'type': 'object',
+        'properties': {
+            'recommendations': {
+                'type': 'array',
+                'items': dict(RECOMMENDATION_SCHEMA,
+                              properties=dict(RECOMMENDATION_SCHEMA['properties'], index={'type': 'integer'}),
+                              required=['index'] + RECOMMENDATION_SCHEMA['required'])
+            }
+        },
+        'required': ['recommendations']
+    }
+}
+
+# Contadores da análise em lote
+batch_stats = {'batches': 0, 'batched_items': 0, 'item_fallbacks': 0}
+
+# Respostas por camada de modelo (escalations = respostas do rápido descartadas)
+tier_stats = {'fast': 0, 'escalated': 0, 'single': 0, 'escalations': 0}
+
+# Tokens por chamada (usage da resposta), formato da saída e respostas inválidas/fallbacks
+analysis_stats = {'calls': 0, 'input_tokens': 0, 'output_tokens': 0, 'tool_answers': 0,
+                  'text_answers': 0, 'invalid': 0, 'fallbacks': 0, 'heuristic': 0}
+stats_lock = threading.Lock()
+
+# Contadores de registros ignorados pela camada de idempotência
+skip_stats = {'already_optimized': 0, 'duplicate': 0, 'same_class': 0, 'archived': 0, 'cost_veto': 0,
+              'superseded': 0, 'deleted': 0}
+
+# Chamadas S3 evitadas (head_object via evento, put_object_tagging via copy_object)
+api_stats = {'objects': 0, 'head_object_avoided': 0, 'put_object_tagging_avoided': 0}
+
+# Regras determinísticas avaliadas antes do cache e do Bedrock
+rule_engine = RuleEngine(min_score=RULES_MIN_SCORE)
+
+# Cache de recomendações (camada local sobrevive entre invocações warm)
+recommendation_cache = RecommendationCache(
+    max_entries=CACHE_MAX_ENTRIES,
+    ttl_seconds=CACHE_TTL_SECONDS,
+    table_provider=lambda: get_table(CACHE_TABLE) if CACHE_TABLE else None,
+    batch_reader=lambda signatures: read_cache_entries(signatures)
+)
+
+# Templates de chave (datas, ids, hashes e partições normalizados): uma decisão por padrão
+KEY_TEMPLATES = os.environ.get('KEY_TEMPLATES', 'true').lower() == 'true'
+KEY_TEMPLATE_MAX = int(os.environ.get('KEY_TEMPLATE_MAX', '10000'))
+key_templates = KeyTemplates(max_templates=KEY_TEMPLATE_MAX, ttl_seconds=CACHE_TTL_SECONDS)
+
+# Reaproveitamento por similaridade: objetos quase iguais a um já analisado com confiança
+# alta recebem a mesma recomendação. Snapshot opcional em S3 (s3://bucket/chave) para cold starts
+SIMILARITY_INDEX = os.environ.get('SIMILARITY_INDEX', 'true').lower() == 'true'
+SIMILARITY_THRESHOLD = float(os.environ.get('SIMILARITY_THRESHOLD', '0.85'))
+SIMILARITY_MAX_ENTRIES = int(os.environ.get('SIMILARITY_MAX_ENTRIES', '4096'))
+SIMILARITY_SNAPSHOT = os.environ.get('SIMILARITY_SNAPSHOT')
+SIMILARITY_SNAPSHOT_SECONDS = float(os.environ.get('SIMILARITY_SNAPSHOT_SECONDS', '300'))
+
+similarity_index = SimilarityIndex(max_entries=SIMILARITY_MAX_ENTRIES, threshold=SIMILARITY_THRESHOLD)
+similarity_snapshot = {'loaded': False, 'saved_at': 0.0}
+
+# Frequência de leitura por objeto e prefixo, agregada dos logs de acesso do S3 (ou do
+# CloudTrail) pelo access_log_handler num snapshot em S3 (s3://bucket/chave). Objetos com
+# ao menos ACCESS_HOT_THRESHOLD leituras recentes (com meia-vida) ficam em STANDARD
+ACCESS_STATS = os.environ.get('ACCESS_STATS')
+ACCESS_STATS_REFRESH_SECONDS = float(os.environ.get('ACCESS_STATS_REFRESH_SECONDS', '300'))
+ACCESS_HOT_THRESHOLD = float(os.environ.get('ACCESS_HOT_THRESHOLD', '10'))
+ACCESS_HALF_LIFE_DAYS = float(os.environ.get('ACCESS_HALF_LIFE_DAYS', '7'))
+ACCESS_SKETCH_WIDTH = int(os.environ.get('ACCESS_SKETCH_WIDTH', str(1 << 16)))
+
+access_snapshot = {'tracker': None, 'etag': None, 'checked_at': 0.0}
+access_stats = {'annotated': 0, 'hot': 0}
+access_lock = threading.Lock()
+
+# Reserva da versão gravada antes da cópia; após o prazo (falha sem liberar a reserva) outra entrega pode copiar
+CLAIM_TTL_SECONDS = int(os.environ.get('CLAIM_TTL_SECONDS', '900'))
+
+INSIGHT_FLUSH_SIZE = int(os.environ.get('INSIGHT_FLUSH_SIZE', '100'))
+INSIGHT_FLUSH_SECONDS = float(os.environ.get('INSIGHT_FLUSH_SECONDS', '5'))
+
+# Buffer de insights gravados com batch_write_item
+insight_sink = InsightSink(
+    writer=lambda **kwargs: dynamodb.batch_write_item(**kwargs),
+    table_name=TABLE_NAME,
+    max_buffer=INSIGHT_FLUSH_SIZE,
+    max_age_seconds=INSIGHT_FLUSH_SECONDS
+)
+
+# Limite de chamadas ao Bedrock: taxa local (token bucket), taxa global opcional
+# entre instâncias (contador no DynamoDB) e concorrência adaptativa (AIMD)
+BEDROCK_RATE = float(os.environ.get('BEDROCK_RATE', '0'))
+BEDROCK_BURST = int(os.environ.get('BEDROCK_BURST', '0')) or None
+BEDROCK_GLOBAL_RATE = int(os.environ.get('BEDROCK_GLOBAL_RATE', '0'))
+BEDROCK_MIN_CONCURRENCY = int(os.environ.get('BEDROCK_MIN_CONCURRENCY', '1'))
+BEDROCK_MAX_CONCURRENCY = int(os.environ.get('BEDROCK_MAX_CONCURRENCY', str(MAX_CONCURRENCY)))
+BEDROCK_ACQUIRE_TIMEOUT = float(os.environ.get('BEDROCK_ACQUIRE_TIMEOUT', '10'))
+RATE_LIMIT_TABLE = os.environ.get('RATE_LIMIT_TABLE')
+
+bedrock_limiter = AdaptiveLimiter(
+    rate=BEDROCK_RATE,
+    burst=BEDROCK_BURST,
+    min_concurrency=BEDROCK_MIN_CONCURRENCY,
+    max_concurrency=BEDROCK_MAX_CONCURRENCY,
+    acquire_timeout=BEDROCK_ACQUIRE_TIMEOUT,
+    shared=SharedRateCounter(
+        lambda: get_table(RATE_LIMIT_TABLE) if RATE_LIMIT_TABLE else None,
+        name='bedrock',
+        limit=BEDROCK_GLOBAL_RATE
+    )
+)
+
+# Circuit breaker do Bedrock: com erros ou lentidão acima do limite na janela, as
+# análises vão para a heurística local até uma chamada de teste voltar a funcionar
+bedrock_breaker = CircuitBreaker(
+    window_seconds=float(os.environ.get('BREAKER_WINDOW_SECONDS', '60')),
+    min_calls=int(os.environ.get('BREAKER_MIN_CALLS', '10')),
+    error_rate=float(os.environ.get('BREAKER_ERROR_RATE', '0.5')),
+    slow_seconds=float(os.environ.get('BREAKER_SLOW_SECONDS', '10')),
+    slow_rate=float(os.environ.get('BREAKER_SLOW_RATE', '0.5')),
+    open_seconds=float(os.environ.get('BREAKER_OPEN_SECONDS', '30')),
+    ignore=is_throttle
+)
+heuristic_engine = RuleEngine(rules=HEURISTIC_RULES, min_score=0, source='heuristic')
+
+# Registros sem recomendação (throttling, limite atingido) voltam para a fila com atraso
+DEFERRED_QUEUE_URL = os.environ.get('DEFERRED_QUEUE_URL')
+DEFER_DELAY_SECONDS = min(900, int(os.environ.get('DEFER_DELAY_SECONDS', '300')))
+defer_stats = {'deferred': 0, 'defer_failures': 0}
+
+# Modelo de custo que veta transições sem economia líquida no horizonte
+COST_HORIZON_DAYS = int(os.environ.get('COST_HORIZON_DAYS', '365'))
+COST_MIN_SAVINGS = float(os.environ.get('COST_MIN_SAVINGS', '0'))
+COST_PRICES = json.loads(os.environ.get('COST_PRICES', '{}'))
+
+cost_model = CostModel(prices=COST_PRICES, horizon_days=COST_HORIZON_DAYS, min_savings=COST_MIN_SAVINGS)
+
+# Transições adiadas: com SCHEDULE_TABLE a cópia não é feita na chegada do objeto (quando ele
+# ainda é quente e disputa banda com o upload); fica agendada para TRANSITION_DELAY_DAYS depois
+# da criação e é aplicada em lote pelo sweep_handler nas janelas OFFPEAK_WINDOWS (UTC)
+SCHEDULE_TABLE = os.environ.get('SCHEDULE_TABLE')
+TRANSITION_DELAY_DAYS = float(os.environ.get('TRANSITION_DELAY_DAYS', '7'))
+OFFPEAK_WINDOWS = parse_windows(os.environ.get('OFFPEAK_WINDOWS', ''))
+SWEEP_CONCURRENCY = int(os.environ.get('SWEEP_CONCURRENCY', '8'))
+SWEEP_PAGE_SIZE = int(os.environ.get('SWEEP_PAGE_SIZE', '500'))
+SWEEP_LOOKBACK_DAYS = float(os.environ.get('SWEEP_LOOKBACK_DAYS', '7'))
+SWEEP_RETRY_SECONDS = int(os.environ.get('SWEEP_RETRY_SECONDS', '3600'))
+
+transition_schedule = TransitionSchedule(
+    lambda: get_table(SCHEDULE_TABLE),
+    bucket_seconds=int(os.environ.get('SCHEDULE_BUCKET_SECONDS', '3600')),
+    shards=int(os.environ.get('SCHEDULE_SHARDS', '4'))
+)
+sweep_stats = {'due': 0, 'applied': 0, 'changed': 0, 'missing': 0, 'moved': 0, 'hot': 0, 'failed': 0}
+
+# Progresso de jobs longos (backfill, crawler)
+checkpoint_store = CheckpointStore(lambda: get_table(CHECKPOINT_TABLE) if CHECKPOINT_TABLE else None)
+
+# Handles de tabelas DynamoDB reutilizados entre invocações warm
+_table_handles = {}
+
+def get_table(table_name):
+    """Retorna o handle da tabela, criado uma única vez por container"""
+    
+    cached = _table_handles.get(table_name)
+    if cached is None or cached[0] is not dynamodb:
+        cached = _table_handles[table_name] = (dynamodb, dynamodb.Table(table_name))
+    return cached[1]
 
 def lambda_handler(event, context):
     """
-    Processa eventos S3 e usa Bedrock para recomendar classe de armazenamento
+    Processa eventos S3 e usa Bedrock para recomendar classe de armazenamento.
+    Aceita eventos S3 diretos ou lotes SQS contendo notificações S3
+    """
+    
+    records = event.get('Records', [])
+    
+    if records and records[0].get('eventSource') == 'aws:sqs':
+        return handle_sqs_event(records)
+    
+    results = process_s3_records(records)
+    log_stats()
+    save_similarity_snapshot()
+    
+    return {
+        'statusCode': 200,
+        'results': [summarize_result(result) for result in results]
+    }
+
+def handle_sqs_event(messages):
     """
+    Desembrulha as notificações S3 de cada mensagem SQS e retorna
+    batchItemFailures apenas com as mensagens que tiveram registros com erro
+    """
+    
+    s3_records = []
+    failed_messages = []
+    
+    for message in messages:
+        try:
+            for record in parse_sqs_message(message):
+                s3_records.append((message['messageId'], record))
+        except Exception as e:
+            print(f"Mensagem SQS inválida {message.get('messageId')}: {str(e)}")
+            failed_messages.append(message['messageId'])
+    
+    results = process_s3_records([record for _, record in s3_records])
+    log_stats()
+    save_similarity_snapshot()
+    
+    for (message_id, _), result in zip(s3_records, results):
+        if result['status'] == 'error' and message_id not in failed_messages:
+            failed_messages.append(message_id)
     
-    for record in event['Records']:
-        bucket_name = record['s3']['bucket']['name']
-        object_key = urllib.parse.unquote_plus(record['s3']['object']['key'])
+    print(f"SQS: {len(messages)} mensagens, {len(s3_records)} registros, {len(failed_messages)} falhas")
+    
+    return {'batchItemFailures': [{'itemIdentifier': message_id} for message_id in failed_messages]}
+
+def parse_sqs_message(message):
+    """Extrai os registros S3 do corpo da mensagem (notificação S3 direta ou via SNS)"""
+    
+    body = json.loads(message['body'])
+    
+    if 'Records' not in body and body.get('Type') == 'Notification':
+        body = json.loads(body['Message'])
+    
+    # s3:TestEvent enviado ao configurar a notificação não tem registros
+    records = body.get('Records', [])
+    for record in records:
+        if 's3' not in record:
+            raise ValueError("registro sem campo s3")
+    
+    return records
+
+def process_s3_records(records):
+    """Executa o pipeline completo para uma lista de registros S3 e retorna o resultado de cada um"""
+    
+    # Vários eventos do mesmo objeto no lote viram uma única análise
+    latest, collapsed = coalesce_records(records)
+    
+    # Obter metadados dos arquivos em paralelo
+    results = run_concurrently(collect_metadata, [records[index] for index in latest])
+    processed = dict(zip(latest, process_results(results)))
+    
+    for index, reason in collapsed.items():
+        bucket_name, object_key = record_key(records[index])
+        result = {'bucket_name': bucket_name, 'object_key': object_key}
+        mark_skipped(result, reason)
+        processed[index] = result
+    
+    if collapsed:
+        print(f"Eventos agrupados: {len(records)} registros, {len(collapsed)} descartados")
+    
+    return [processed[index] for index in range(len(records))]
+
+def record_key(record):
+    """Bucket e chave (decodificada) de um registro S3"""
+    
+    return record['s3']['bucket']['name'], urllib.parse.unquote_plus(record['s3']['object']['key'])
+
+def sequencer_order(record, position):
+    """
+    Ordem do evento para o mesmo objeto: sequencer hexadecimal (comparado como número,
+    equivalente a completar com zeros à esquerda) e, sem ele, a posição no lote
+    """
+    
+    sequencer = record['s3']['object'].get('sequencer')
+    try:
+        return int(sequencer, 16), position
+    except (TypeError, ValueError):
+        return -1, position
+
+def coalesce_records(records):
+    """
+    Agrupa os registros por bucket/chave e mantém só o evento mais recente de cada objeto.
+    Retorna (índices a processar, {índice descartado: motivo}); o motivo é 'superseded'
+    para eventos substituídos por um mais novo e 'deleted' quando o mais novo é uma remoção
+    """
+    
+    newest = {}
+    for position, record in enumerate(records):
+        key = record_key(record)
+        if key not in newest or sequencer_order(record, position) > sequencer_order(records[newest[key]], newest[key]):
+            newest[key] = position
+    
+    latest = []
+    collapsed = {}
+    for position, record in enumerate(records):
+        winner = newest[record_key(record)]
+        if records[winner].get('eventName', '').startswith('ObjectRemoved'):
+            collapsed[position] = 'deleted'
+        elif position != winner:
+            collapsed[position] = 'superseded'
+        else:
+            latest.append(position)
+    
+    return latest, collapsed
+
+def process_results(results):
+    """Analisa e aplica recomendações para registros com metadados já coletados"""
+    
+    # Objetos arquivados precisariam de restore antes da cópia
+    for result in results:
+        if result['status'] == 'pending' and result['file_metadata']['storage_class'] in ARCHIVED_CLASSES:
+            mark_skipped(result, 'archived')
+    
+    # Versões já analisadas são descartadas antes de chamar o Bedrock
+    skip_processed_versions([result for result in results if result['status'] == 'pending'])
+    analyzed = [result for result in results if result['status'] == 'pending']
+    
+    by_metadata = {id(result['file_metadata']): result for result in analyzed}
+    
+    def sniff_unresolved(metadata_list):
+        # GET com Range só para quem passou pelas verificações locais (arquivado, dedupe, regras)
+        # e não tem o tipo identificado pela extensão
+        run_concurrently(
+            lambda file_metadata: sniff_content(by_metadata[id(file_metadata)]['bucket_name'],
+                                                by_metadata[id(file_metadata)]['object_key'], file_metadata),
+            [file_metadata for file_metadata in metadata_list if needs_sniffing(file_metadata)]
+        )
+    
+    # Obter recomendações (regras, cache ou Bedrock em lote)
+    recommendations = get_recommendations([result['file_metadata'] for result in analyzed], sniff_unresolved)
+    for result, recommendation in zip(analyzed, recommendations):
+        result['recommendation'] = recommendation
+    
+    assess_costs(analyzed)
+    
+    # Salvar insights e aplicar recomendações em paralelo
+    run_concurrently(apply_recommendation, analyzed)
+    defer_records([result for result in analyzed if result['status'] == 'deferred'])
+    schedule_transitions([result for result in analyzed if result['status'] == 'scheduled'])
+    flush_insights(analyzed)
+    
+    return results
+
+def defer_records(results):
+    """Reenvia à fila de ingestão, com atraso, os registros que não puderam ser analisados"""
+    
+    for start in range(0, len(results), 10):
+        chunk = results[start:start + 10]
+        entries = [{
+            'Id': str(index),
+            'MessageBody': json.dumps({'Records': [{
+                'eventSource': 'aws:s3',
+                'eventName': 'ObjectCreated:Deferred',
+                's3': {
+                    'bucket': {'name': result['bucket_name']},
+                    'object': {'key': urllib.parse.quote_plus(result['object_key'])}
+                }
+            }]}),
+            'DelaySeconds': DEFER_DELAY_SECONDS
+        } for index, result in enumerate(chunk)]
         
         try:
-            # Obter metadados do arquivo
-            file_metadata = get_file_metadata(bucket_name, object_key)
-            
-            # Analisar com Bedrock
-            recommendation = analyze_with_bedrock(file_metadata)
-            
-            # Salvar insight no DynamoDB
-            save_insight_to_dynamodb(bucket_name, object_key, file_metadata, recommendation)
+            response = sqs_client.send_message_batch(QueueUrl=DEFERRED_QUEUE_URL, Entries=entries)
+            failed = {int(entry['Id']) for entry in response.get('Failed', [])}
+        except Exception as e:
+            print(f"Erro adiando registros: {str(e)}")
+            failed = set(range(len(chunk)))
+        
+        for index, result in enumerate(chunk):
+            if index in failed:
+                mark_failed(result, 'sem recomendação e falha ao adiar')
+        
+        with stats_lock:
+            defer_stats['deferred'] += len(chunk) - len(failed)
+            defer_stats['defer_failures'] += len(failed)
+    
+    if results:
+        print(f"Registros adiados para reanálise em {DEFER_DELAY_SECONDS}s: {len(results)}")
+
+def schedule_transitions(results):
+    """Grava as transições adiadas; o instante devido conta a partir da criação do objeto"""
+    
+    if not results:
+        return
+    
+    now = time.time()
+    entries = []
+    for result in results:
+        file_metadata = result['file_metadata']
+        recommendation = result['recommendation']
+        # Objetos antigos (backfill) já vencem no próximo sweep
+        created = now - age_in_days(file_metadata.get('last_modified')) * 86400
+        entries.append({
+            'object_id': f"{result['bucket_name']}/{result['object_key']}",
+            'bucket_name': result['bucket_name'],
+            'object_key': result['object_key'],
+            'due_at': int(max(now, created + TRANSITION_DELAY_DAYS * 86400)),
+            'storage_class': recommendation['storage_class'],
+            'confidence': recommendation['confidence'],
+            'original_storage_class': file_metadata['storage_class'],
+            'source_version': source_version(file_metadata),
+            'file_size': file_metadata['file_size'],
+            'scheduled_at': datetime.now().isoformat()
+        })
+    
+    try:
+        transition_schedule.schedule(entries)
+    except Exception as e:
+        for result in results:
+            mark_failed(result, e)
+        return
+    
+    if TABLE_NAME:
+        for result in results:
+            insight_sink.add(build_insight_item(result['bucket_name'], result['object_key'], result['file_metadata'],
+                                                result['recommendation'], result.get('cost'), 'scheduled'))
+    
+    print(f"Transições agendadas: {len(entries)}")
+
+def assess_costs(results):
+    """Calcula de uma vez a economia projetada de todas as transições recomendadas"""
+    
+    candidates = [result for result in results
+                  if result['recommendation']
+                  and result['recommendation']['storage_class'] != result['file_metadata']['storage_class']]
+    if not candidates:
+        return
+    
+    evaluations = cost_model.evaluate_batch(
+        [result['file_metadata']['file_size'] for result in candidates],
+        [result['file_metadata']['storage_class'] for result in candidates],
+        [result['recommendation']['storage_class'] for result in candidates],
+        [age_in_days(result['file_metadata'].get('last_modified')) for result in candidates]
+    )
+    
+    for result, evaluation in zip(candidates, evaluations):
+        result['cost'] = evaluation
+
+def log_stats():
+    """Registra os contadores acumulados no container"""
+    
+    print(f"Regras locais: {rule_engine.stats}")
+    print(f"Cache de recomendações: {recommendation_cache.stats}")
+    if KEY_TEMPLATES:
+        print(f"Templates de chave: {key_templates.stats} mais acessados: {key_templates.top(5)}")
+    print(f"Análise em lote: {batch_stats}")
+    print(f"Camadas de modelo: {tier_stats}")
+    if analysis_stats['calls']:
+        answered = tier_stats['fast'] + tier_stats['escalated'] + tier_stats['single']
+        fallbacks = analysis_stats['fallbacks']
+        print(f"Saída do modelo: {analysis_stats} "
+              f"({(analysis_stats['input_tokens'] + analysis_stats['output_tokens']) / analysis_stats['calls']:.0f} "
+              f"tokens por chamada, fallback {fallbacks / max(1, answered + fallbacks):.2%})")
+    print(f"Registros ignorados: {skip_stats}")
+    if sniff_stats['sniffed'] or sniff_stats['errors']:
+        print(f"Formatos identificados: {sniff_stats}")
+    print(f"Insights: {insight_sink.stats}")
+    if SIMILARITY_INDEX:
+        print(f"Índice de similaridade: {similarity_index.metrics()}")
+    if access_stats['annotated']:
+        print(f"Frequência de acesso: {access_stats}")
+    print(f"Bedrock (limitador): {bedrock_limiter.metrics()}")
+    print(f"Bedrock (circuit breaker): {bedrock_breaker.metrics()}")
+    if defer_stats['deferred'] or defer_stats['defer_failures']:
+        print(f"Adiados: {defer_stats}")
+    if sweep_stats['due']:
+        print(f"Transições agendadas (sweep): {sweep_stats}")
+    if api_stats['objects']:
+        saved = api_stats['head_object_avoided'] + api_stats['put_object_tagging_avoided']
+        print(f"Chamadas S3 economizadas: {api_stats} ({saved / api_stats['objects']:.2f} por objeto)")
+
+def batch_operations_handler(event, context):
+    """
+    Handler para jobs do S3 Batch Operations (schema 1.0 e 2.0).
+    Processa as tarefas da invocação em paralelo e retorna um resultado por tarefa:
+    falhas transitórias (throttling do Bedrock, 5xx) voltam como TemporaryFailure para o job repetir
+    """
+    
+    records = []
+    for task in event['tasks']:
+        # 1.0 envia o ARN do bucket, 2.0 envia o nome; a chave vem URL-encoded nos dois
+        bucket_name = task.get('s3Bucket') or task['s3BucketArn'].split(':::')[-1]
+        records.append({'s3': {'bucket': {'name': bucket_name}, 'object': {'key': task['s3Key']}}})
+    
+    results = process_s3_records(records)
+    log_stats()
+    
+    task_results = []
+    for task, result in zip(event['tasks'], results):
+        if result['status'] == 'error':
+            code = 'TemporaryFailure' if result.get('temporary') else 'PermanentFailure'
+            message = result['error']
+        elif result['status'] in ('deferred', 'scheduled'):
+            code, message = 'Succeeded', result['status']
+        else:
+            code = 'Succeeded'
+            message = result.get('skip_reason') or result['recommendation']['storage_class']
+        task_results.append({'taskId': task['taskId'], 'resultCode': code, 'resultString': message})
+    
+    return {
+        'invocationSchemaVersion': event['invocationSchemaVersion'],
+        'treatMissingKeysAs': 'PermanentFailure',
+        'invocationId': event['invocationId'],
+        'results': task_results
+    }
+
+def backfill_handler(event, context):
+    """
+    Processa objetos existentes a partir de um relatório do S3 Inventory (CSV ou Parquet),
+    em streaming e com checkpoint para retomar após timeout. Um bloco com falhas temporárias
+    (throttling, circuito aberto sem fila de adiamento, 5xx) não avança o checkpoint: a
+    invocação termina como incompleta e a próxima repete o bloco (linhas já gravadas são duplicadas).
+    Evento: {"manifest_bucket": ..., "manifest_key": ..., "job_id": opcional}
+    """
+    
+    manifest_bucket = event['manifest_bucket']
+    manifest_key = event['manifest_key']
+    job_id = event.get('job_id', f"inventory:{manifest_bucket}/{manifest_key}")
+    
+    checkpoint = checkpoint_store.load(job_id) or {'file_index': 0, 'row_index': 0, 'rows': 0}
+    manifest = read_manifest(s3_client, manifest_bucket, manifest_key)
+    print(f"Backfill {job_id}: retomando em {checkpoint}")
+    
+    chunk = []
+    position = (checkpoint['file_index'], checkpoint['row_index'])
+    rows = iter_inventory_rows(s3_client, manifest, *position)
+    counts = {'rows': 0, 'processed': 0, 'skipped': 0, 'deferred': 0, 'scheduled': 0, 'error': 0}
+    
+    for file_index, row_index, row in rows:
+        chunk.append(row)
+        position = (file_index, row_index + 1)
+        
+        if len(chunk) >= BACKFILL_CHUNK_SIZE:
+            if process_inventory_rows(chunk, counts):
+                return backfill_retry(job_id, checkpoint, counts)
+            chunk = []
+            checkpoint.update(file_index=position[0], row_index=position[1],
+                              rows=checkpoint['rows'] + BACKFILL_CHUNK_SIZE)
+            checkpoint_store.save(job_id, checkpoint)
             
+            if context and context.get_remaining_time_in_millis() < BACKFILL_SAFETY_MS:
+                log_stats()
+                return {'status': 'incomplete', 'job_id': job_id, 'checkpoint': checkpoint, 'counts': counts}
+    
+    if process_inventory_rows(chunk, counts):
+        return backfill_retry(job_id, checkpoint, counts)
+    checkpoint_store.clear(job_id)
+    log_stats()
+    
+    return {'status': 'complete', 'job_id': job_id, 'counts': counts}
+
+def backfill_retry(job_id, checkpoint, counts):
+    """Encerra o backfill no início do bloco com falhas temporárias, para a próxima invocação repeti-lo"""
+    
+    checkpoint_store.save(job_id, checkpoint)
+    log_stats()
+    print(f"Backfill {job_id}: falhas temporárias, bloco será repetido a partir de {checkpoint}")
+    return {'status': 'incomplete', 'job_id': job_id, 'checkpoint': checkpoint, 'counts': counts, 'retry': True}
+
+def process_inventory_rows(rows, counts):
+    """
+    Converte linhas do inventário em registros e passa pelo mesmo pipeline do lambda_handler.
+    Retorna quantos registros falharam com erro temporário (devem ser reprocessados)
+    """
+    
+    results = []
+    for row in rows:
+        file_metadata = row_to_metadata(row, file_type_from_key)
+        if file_metadata is None:
+            continue
+        annotate_access(row['Bucket'], row['Key'], file_metadata)
+        results.append({
+            'bucket_name': row['Bucket'],
+            'object_key': row['Key'],
+            'status': 'pending',
+            'file_metadata': file_metadata
+        })
+    
+    processed = process_results(results)
+    
+    with stats_lock:
+        counts['rows'] += len(rows)
+        for result in processed:
+            counts[result['status']] += 1
+    
+    return sum(1 for result in processed if result['status'] == 'error' and result.get('temporary'))
+
+def crawler_handler(event, context):
+    """
+    Processa objetos existentes listando o bucket com ListObjectsV2 em partições paralelas,
+    para buckets sem S3 Inventory. A listagem já traz tamanho, classe e ETag (sem head_object).
+    Páginas com falhas temporárias não avançam o StartAfter da partição: são relistadas depois.
+    Evento: {"bucket": opcional, "prefix": opcional, "job_id": opcional}
+    """
+    
+    bucket_name = event.get('bucket', BUCKET_NAME)
+    prefix = event.get('prefix', '')
+    job_id = event.get('job_id', f"crawl:{bucket_name}/{prefix}")
+    
+    state = checkpoint_store.load(job_id)
+    if state is None:
+        state = {'partitions': discover_partitions(s3_client, bucket_name, prefix, target=CRAWLER_PARTITIONS),
+                 'objects': 0}
+        checkpoint_store.save(job_id, state)
+    print(f"Crawler {job_id}: {len(state['partitions'])} partições, {state['objects']} objetos já listados")
+    
+    counts = {'rows': 0, 'processed': 0, 'skipped': 0, 'deferred': 0, 'scheduled': 0, 'error': 0}
+    complete = crawl_partitions(
+        s3_client, bucket_name, state,
+        handle_page=lambda rows: process_inventory_rows(rows, counts),
+        on_checkpoint=lambda snapshot: checkpoint_store.save(job_id, snapshot),
+        should_stop=lambda: bool(context) and context.get_remaining_time_in_millis() < BACKFILL_SAFETY_MS,
+        max_concurrency=CRAWLER_CONCURRENCY
+    )
+    log_stats()
+    
+    if not complete:
+        return {'status': 'incomplete', 'job_id': job_id, 'objects': state['objects'], 'counts': counts}
+    
+    checkpoint_store.clear(job_id)
+    return {'status': 'complete', 'job_id': job_id, 'objects': state['objects'], 'counts': counts}
+
+def lifecycle_handler(event, context):
+    """
+    Agrega os insights do bucket em regras de lifecycle por prefixo/tag e
+    copia individualmente apenas os objetos que não se encaixam em nenhuma regra.
+    As regras aplicadas ficam no checkpoint; as cópias percorrem a tabela página a página
+    (LastEvaluatedKey) e param antes do timeout, retomando na próxima invocação.
+    Evento: {"bucket_name": opcional, "job_id": opcional}
+    """
+    
+    bucket_name = (event or {}).get('bucket_name', BUCKET_NAME)
+    job_id = (event or {}).get('job_id', f"lifecycle:{bucket_name}")
+    
+    state = checkpoint_store.load(job_id)
+    if state is None:
+        # Transições vetadas pelo modelo de custo contam como voto por ficar na classe atual
+        insights = load_insights(bucket_name)
+        rules, _ = synthesize_rules(
+            insights,
+            min_objects=LIFECYCLE_MIN_OBJECTS,
+            min_depth=LIFECYCLE_MIN_PREFIX_DEPTH,
+            count_objects=lambda prefix, limit: count_stored_objects(bucket_name, prefix, limit),
+            min_coverage=LIFECYCLE_MIN_COVERAGE
+        )
+        applied_rules = apply_lifecycle_rules(s3_client, bucket_name, rules)
+        # Regras que não couberam no bucket não cobrem nada: seus objetos são copiados
+        state = {'insights': len(insights), 'rules': rules[:applied_rules], 'start_key': None,
+                 'copies': 0, 'copy_failures': 0}
+    else:
+        print(f"Lifecycle {job_id}: retomando cópias em {state['start_key']}")
+    
+    def copy_insight(item):
+        recommendation = {
+            'storage_class': item['recommended_storage_class'],
+            'confidence': item.get('confidence', 'média')
+        }
+        try:
+            apply_storage_class(bucket_name, item['object_key'], recommendation, int(item['file_size']))
+        except Exception as e:
+            print(f"Erro copiando {item['object_key']}: {str(e)}")
+            return False
+        # Página repetida após timeout não copia o objeto de novo
+        mark_insight_applied(f"{bucket_name}/{item['object_key']}")
+        return True
+    
+    for items, last_key in scan_insights(bucket_name, state['start_key']):
+        copies = [item for item in items if needs_copy(item, state['rules'])]
+        copied = sum(run_concurrently(copy_insight, copies))
+        state.update(start_key=last_key, copies=state['copies'] + copied,
+                     copy_failures=state['copy_failures'] + len(copies) - copied)
+        if not last_key:
+            break
+        checkpoint_store.save(job_id, state)
+        
+        if context and context.get_remaining_time_in_millis() < BACKFILL_SAFETY_MS:
+            print(f"Lifecycle {job_id}: interrompido em {last_key}, {state['copies']} cópias até agora")
+            return {'statusCode': 200, 'status': 'incomplete', 'job_id': job_id, 'insights': state['insights'],
+                    'rules': len(state['rules']), 'copies': state['copies'], 'copy_failures': state['copy_failures']}
+    
+    checkpoint_store.clear(job_id)
+    print(f"Lifecycle: {state['insights']} insights, {len(state['rules'])} regras, {state['copies']} cópias individuais")
+    
+    return {
+        'statusCode': 200,
+        'status': 'complete',
+        'insights': state['insights'],
+        'rules': len(state['rules']),
+        'copies': state['copies'],
+        'copy_failures': state['copy_failures']
+    }
+
+def access_log_handler(event, context):
+    """
+    Agrega os logs de acesso do S3 (ou arquivos do CloudTrail com eventos de dados) que
+    chegam no bucket de logs ao snapshot de frequências usado pelo lambda_handler.
+    Os logs são lidos em streaming; a função roda com concorrência 1 (sem escritas concorrentes)
+    """
+    
+    if not ACCESS_STATS:
+        return {'statusCode': 400, 'error': 'ACCESS_STATS não configurado'}
+    
+    snapshot_bucket, snapshot_key = _snapshot_location(ACCESS_STATS)
+    tracker = None
+    try:
+        body = s3_client.get_object(Bucket=snapshot_bucket, Key=snapshot_key)['Body'].read()
+        tracker = AccessTracker.loads(body)
+    except ClientError as e:
+        if e.response['Error']['Code'] not in ('NoSuchKey', '404'):
+            raise
+    except ValueError as e:
+        print(f"Snapshot de acessos inválido, recomeçando: {str(e)}")
+    if tracker is None:
+        tracker = AccessTracker(width=ACCESS_SKETCH_WIDTH, half_life_days=ACCESS_HALF_LIFE_DAYS)
+    
+    files = 0
+    for record in event.get('Records', []):
+        bucket_name, object_key = record_key(record)
+        if (bucket_name, object_key) == (snapshot_bucket, snapshot_key):
+            continue
+        
+        body = s3_client.get_object(Bucket=bucket_name, Key=object_key)['Body']
+        gzipped = object_key.endswith('.gz')
+        stream = gzip.GzipFile(fileobj=body) if gzipped else body
+        
+        if '/CloudTrail/' in object_key or object_key.endswith(('.json', '.json.gz')):
+            tracker.ingest_cloudtrail(json.load(stream))
+        else:
+            tracker.ingest_access_log(stream if gzipped else body.iter_lines())
+        files += 1
+    
+    if files:
+        s3_client.put_object(Bucket=snapshot_bucket, Key=snapshot_key, Body=tracker.dumps(),
+                             ContentType='application/octet-stream')
+    
+    print(f"Logs de acesso: {files} arquivos, {tracker.stats} "
+          f"objetos mais lidos: {tracker.hot_keys(5)} prefixos: {tracker.hot_prefixes(5)}")
+    
+    return {'statusCode': 200, 'files': files, 'stats': tracker.stats}
+
+def sweep_handler(event, context):
+    """
+    Aplica as transições agendadas já vencidas, em páginas de SWEEP_PAGE_SIZE com no máximo
+    SWEEP_CONCURRENCY cópias simultâneas, só dentro das janelas OFFPEAK_WINDOWS
+    ({"force": true} ignora a janela). O cursor é salvo no checkpoint a cada página:
+    a próxima execução agendada retoma de onde a anterior parou
+    """
+    
+    event = event or {}
+    force = event.get('force', False)
+    if not force and not in_window(time.time(), OFFPEAK_WINDOWS):
+        print("Sweep: fora da janela de baixa demanda")
+        return {'status': 'outside_window'}
+    
+    job_id = 'sweep:transitions'
+    state = checkpoint_store.load(job_id) or {
+        'watermark': transition_schedule.bucket_of(time.time() - SWEEP_LOOKBACK_DAYS * 86400)
+    }
+    
+    def should_stop():
+        if context and context.get_remaining_time_in_millis() < BACKFILL_SAFETY_MS:
+            return True
+        return not force and not in_window(time.time(), OFFPEAK_WINDOWS)
+    
+    complete = sweep_due(
+        transition_schedule, state, time.time(),
+        handle_page=apply_due_transitions,
+        on_checkpoint=lambda snapshot: checkpoint_store.save(job_id, snapshot),
+        should_stop=should_stop,
+        page_size=SWEEP_PAGE_SIZE
+    )
+    log_stats()
+    
+    return {'status': 'complete' if complete else 'incomplete', 'state': state, 'counts': dict(sweep_stats)}
+
+def apply_due_transitions(items):
+    """
+    Reconfere cada objeto com head_object (versão, classe atual, frequência de acesso) e
+    aplica as transições que continuam válidas. Aplicadas e descartadas saem da agenda;
+    objetos que esquentaram voltam para daqui a TRANSITION_DELAY_DAYS e falhas para
+    daqui a SWEEP_RETRY_SECONDS
+    """
+    
+    # Cabeçalhos da origem lidos na reconferência, repetidos na cópia sem novo head_object
+    attributes = {}
+    
+    def recheck(item):
+        try:
+            metadata = get_file_metadata(item['bucket_name'], item['object_key'])
+            attributes[item['object_id']] = metadata['copy_attributes']
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+                return 'missing'
+            print(f"Erro reconferindo {item['object_key']}: {str(e)}")
+            return 'failed'
+        
+        # Objeto reescrito desde o agendamento: a nova versão terá a própria análise
+        if source_version(metadata) != item['source_version']:
+            return 'changed'
+        if metadata['storage_class'] != item['original_storage_class'] or metadata.get('optimized_by') == 'S3Optimizer':
+            return 'moved'
+        
+        annotate_access(item['bucket_name'], item['object_key'], metadata)
+        if hot_object_recommendation(metadata):
+            return 'hot'
+        return 'apply'
+    
+    def transition(item):
+        try:
+            apply_storage_class(item['bucket_name'], item['object_key'],
+                                {'storage_class': item['storage_class'], 'confidence': item['confidence']},
+                                int(item['file_size']), attributes.get(item['object_id']))
+        except Exception as e:
+            print(f"Erro aplicando transição de {item['object_key']}: {str(e)}")
+            return 'failed'
+        mark_insight_applied(item['object_id'])
+        return 'applied'
+    
+    outcomes = run_concurrently(recheck, items, max_workers=SWEEP_CONCURRENCY)
+    pending = [item for item, outcome in zip(items, outcomes) if outcome == 'apply']
+    applied = iter(run_concurrently(transition, pending, max_workers=SWEEP_CONCURRENCY))
+    outcomes = [next(applied) if outcome == 'apply' else outcome for outcome in outcomes]
+    
+    failed = [item for item, outcome in zip(items, outcomes) if outcome == 'failed']
+    hot = [item for item, outcome in zip(items, outcomes) if outcome == 'hot']
+    transition_schedule.complete([item['object_id'] for item, outcome in zip(items, outcomes)
+                                  if outcome not in ('failed', 'hot')])
+    if failed:
+        transition_schedule.reschedule(failed, time.time() + SWEEP_RETRY_SECONDS)
+    if hot:
+        transition_schedule.reschedule(hot, time.time() + TRANSITION_DELAY_DAYS * 86400)
+    
+    with stats_lock:
+        sweep_stats['due'] += len(items)
+        for outcome in outcomes:
+            sweep_stats[outcome] += 1
+    
+    print(f"Sweep: {len(items)} transições vencidas, {outcomes.count('applied')} aplicadas, {len(failed)} reagendadas")
+
+def count_stored_objects(bucket_name, prefix, limit):
+    """Objetos guardados sob o prefixo (ListObjectsV2), parando assim que passar de limit"""
+    
+    params = {'Bucket': bucket_name, 'Prefix': prefix, 'MaxKeys': 1000}
+    count = 0
+    while True:
+        response = s3_client.list_objects_v2(**params)
+        count += response.get('KeyCount', len(response.get('Contents', [])))
+        if count > limit or not response.get('IsTruncated'):
+            return count
+        params['ContinuationToken'] = response['NextContinuationToken']
+
+def mark_insight_applied(file_id):
+    """Marca o insight como aplicado para o lifecycle_handler não copiar o objeto de novo"""
+    
+    if not TABLE_NAME:
+        return
+    try:
+        get_table(TABLE_NAME).update_item(
+            Key={'file_id': file_id},
+            UpdateExpression='SET transition_status = :applied',
+            ConditionExpression='attribute_exists(file_id)',
+            ExpressionAttributeValues={':applied': 'applied'}
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            print(f"Erro marcando insight {file_id}: {str(e)}")
+
+def load_insights(bucket_name):
+    """Lê todos os insights do bucket na tabela de insights"""
+    
+    items = []
+    for page, _ in scan_insights(bucket_name):
+        items.extend(page)
+    return items
+
+def scan_insights(bucket_name, start_key=None):
+    """Percorre os insights do bucket página a página, gerando (itens, LastEvaluatedKey ou None)"""
+    
+    table = get_table(TABLE_NAME)
+    scan_args = {
+        'FilterExpression': 'bucket_name = :bucket',
+        'ExpressionAttributeValues': {':bucket': bucket_name},
+        'ProjectionExpression': 'object_key, file_size, original_storage_class, '
+                                'recommended_storage_class, confidence, tags, cost_decision, transition_status'
+    }
+    if start_key:
+        scan_args['ExclusiveStartKey'] = start_key
+    
+    while True:
+        response = table.scan(**scan_args)
+        last_key = response.get('LastEvaluatedKey')
+        yield response.get('Items', []), last_key
+        
+        if not last_key:
+            return
+        scan_args['ExclusiveStartKey'] = last_key
+
+def run_concurrently(func, items, max_workers=None):
+    """Executa func para cada item com no máximo max_workers (MAX_CONCURRENCY) threads, preservando a ordem"""
+    
+    items = list(items)
+    workers = min(max_workers or MAX_CONCURRENCY, len(items))
+    
+    if workers <= 1:
+        return [func(item) for item in items]
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(func, items))
+
+def collect_metadata(record):
+    """Extrai bucket/chave do registro S3 e coleta os metadados do arquivo"""
+    
+    bucket_name, object_key = record_key(record)
+    result = {'bucket_name': bucket_name, 'object_key': object_key, 'status': 'pending'}
+    
+    with stats_lock:
+        api_stats['objects'] += 1
+    
+    try:
+        file_metadata = metadata_from_event(record, object_key)
+        if file_metadata:
+            with stats_lock:
+                api_stats['head_object_avoided'] += 1
+        else:
+            file_metadata = get_file_metadata(bucket_name, object_key)
+        result['file_metadata'] = file_metadata
+    except Exception as e:
+        mark_failed(result, e)
+        return result
+    
+    # Objetos reescritos pelo próprio otimizador (copy_object) não são reanalisados
+    if result['file_metadata'].get('optimized_by') == 'S3Optimizer':
+        mark_skipped(result, 'already_optimized')
+    else:
+        annotate_access(bucket_name, object_key, result['file_metadata'])
+    
+    return result
+
+def needs_sniffing(file_metadata):
+    """No modo 'unknown' só objetos cuja extensão não identifica o tipo (ou sem extensão)"""
+    
+    if SNIFF_CONTENT == 'all':
+        return True
+    if SNIFF_CONTENT != 'unknown':
+        return False
+    
+    name = file_metadata['file_name'].rsplit('/', 1)[-1]
+    return file_metadata['file_type'] == 'unknown' or '.' not in name.strip('.')
+
+def sniff_content(bucket_name, object_key, file_metadata):
+    """
+    Identifica o formato pelos primeiros bytes e marca o objeto como comprimido ou
+    compressível. O file_type só é trocado quando a extensão não diz nada (sem extensão)
+    ou contradiz o conteúdo (extensão de texto com conteúdo binário)
+    """
+    
+    if not file_metadata['file_size'] or not needs_sniffing(file_metadata):
+        return
+    
+    try:
+        sniffed = sniff_object(s3_client, bucket_name, object_key)
+    except Exception as e:
+        print(f"Erro identificando formato de {object_key}: {str(e)}")
+        with stats_lock:
+            sniff_stats['errors'] += 1
+        return
+    
+    file_metadata['sniffed_format'] = sniffed['format']
+    file_metadata['compressed'] = sniffed['compressed']
+    file_metadata['compressible'] = sniffed['compressible']
+    
+    retyped = False
+    if sniffed['format'] in FORMATS:
+        file_type, content_type = FORMATS[sniffed['format']]
+        extension_type = mimetypes.guess_type(object_key)[0] or ''
+        binary = sniffed['format'] not in ('text', 'json')
+        
+        if file_metadata['file_type'] == 'unknown' or (binary and extension_type.startswith('text/')):
+            retyped = file_metadata['file_type'] != file_type
+            file_metadata['file_type'] = file_type
+            file_metadata['content_type'] = content_type
+        elif file_metadata['content_type'] in UNKNOWN_CONTENT_TYPES:
+            file_metadata['content_type'] = content_type
+    
+    with stats_lock:
+        sniff_stats['sniffed'] += 1
+        sniff_stats['retyped'] += retyped
+        sniff_stats['compressed'] += sniffed['compressed']
+        sniff_stats['compressible'] += sniffed['compressible']
+
+def apply_recommendation(result):
+    """Salva o insight e aplica a recomendação de um registro, isolando erros"""
+    
+    object_key = result['object_key']
+    file_metadata = result['file_metadata']
+    recommendation = result['recommendation']
+    
+    if recommendation is None:
+        # Sem fila de adiamento o erro faz o SQS/Batch Operations repetir o registro
+        if DEFERRED_QUEUE_URL:
+            result['status'] = 'deferred'
+        else:
+            mark_failed(result, 'sem recomendação')
+        return result
+    
+    transition = None
+    try:
+        # Nada a copiar quando o objeto já está na classe recomendada
+        if recommendation['storage_class'] == file_metadata['storage_class']:
+            mark_skipped(result, 'same_class')
+        
+        # Transição que não se paga no horizonte (requisição, duração e tamanho mínimos)
+        elif result.get('cost', {}).get('decision') == 'veto':
+            mark_skipped(result, 'cost_veto')
+        
+        # Com agendamento a cópia fica para o sweep fora de pico (agenda e insight gravados em lote no fim)
+        elif SCHEDULE_TABLE:
+            result['status'] = 'scheduled'
+            return result
+        
+        # Outra entrega da mesma versão já reservou (ou aplicou) a cópia: a repetição resolve qual dos dois
+        elif not claim_version(result):
+            mark_failed(result, 'versão reservada por outra entrega')
+            return result
+        
+        else:
             # Aplicar recomendação automaticamente
-            apply_storage_class(bucket_name, object_key, recommendation, file_metadata['file_size'])
-            
+            try:
+                apply_storage_class(result['bucket_name'], object_key, recommendation, file_metadata['file_size'],
+                                    file_metadata.get('copy_attributes'))
+            except Exception:
+                release_claim(result)
+                raise
+            transition = 'applied'
+            result['status'] = 'processed'
             print(f"Processado: {object_key} -> {recommendation['storage_class']}")
-            
+        
+    except Exception as e:
+        # Sem insight: a versão continua elegível quando o registro for repetido
+        mark_failed(result, e)
+        return result
+    
+    # Insight vai para o buffer gravado em lote ao fim da invocação; a marca de transição
+    # evita que o lifecycle_handler copie de novo um objeto já movido
+    try:
+        if TABLE_NAME:
+            insight_sink.add(build_insight_item(result['bucket_name'], object_key, file_metadata,
+                                                recommendation, result.get('cost'), transition))
+    except Exception as e:
+        mark_failed(result, e)
+    
+    return result
+
+def skip_processed_versions(results):
+    """
+    Marca como duplicados os registros cuja versão já possui insight, com
+    batch_get_item antes da análise (e repetições dentro do mesmo evento).
+    Cópias que falharam não contam; reservas ainda válidas voltam como erro temporário
+    """
+    
+    if not results:
+        return
+    
+    stored = {}
+    if TABLE_NAME:
+        file_ids = sorted({f"{result['bucket_name']}/{result['object_key']}" for result in results})
+        try:
+            stored = fetch_attributes(
+                lambda **kwargs: dynamodb.batch_get_item(**kwargs),
+                TABLE_NAME, file_ids, 'file_id, source_version, transition_status, claim_expires_at'
+            )
         except Exception as e:
-            print(f"Erro processando {object_key}: {str(e)}")
+            print(f"Erro verificando insights existentes: {str(e)}")
+    
+    now = time.time()
+    seen = set()
+    for result in results:
+        file_id = f"{result['bucket_name']}/{result['object_key']}"
+        version = source_version(result['file_metadata'])
+        item = stored.get(file_id)
+        status = item.get('transition_status') if item else None
+        
+        if (file_id, version) in seen:
+            mark_skipped(result, 'duplicate')
+        elif item and item.get('source_version') == version:
+            if status == 'claimed' and int(item.get('claim_expires_at', 0)) > now:
+                mark_failed(result, 'versão em processamento por outra entrega')
+            elif status not in ('failed', 'claimed'):
+                mark_skipped(result, 'duplicate')
+        seen.add((file_id, version))
+
+def claim_version(result):
+    """
+    Reserva a versão com put_item condicional antes da cópia. Retorna False quando outra
+    entrega já reservou ou aplicou a mesma versão (reservas vencidas e falhas podem ser retomadas)
+    """
+    
+    if not TABLE_NAME:
+        return True
+    
+    item = build_insight_item(result['bucket_name'], result['object_key'], result['file_metadata'],
+                              result['recommendation'], result.get('cost'), 'claimed')
+    now = int(time.time())
+    item['claim_expires_at'] = now + CLAIM_TTL_SECONDS
+    
+    try:
+        get_table(TABLE_NAME).put_item(
+            Item=item,
+            ConditionExpression='attribute_not_exists(file_id) OR source_version <> :version '
+                                'OR transition_status = :failed '
+                                'OR (transition_status = :claimed AND claim_expires_at < :now)',
+            ExpressionAttributeValues={':version': item['source_version'], ':failed': 'failed',
+                                       ':claimed': 'claimed', ':now': now}
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        print(f"Versão já reservada: {result['object_key']}")
+        return False
+    return True
+
+def release_claim(result):
+    """Troca a reserva por uma marca de falha, ignorada pela verificação de duplicados"""
+    
+    if not TABLE_NAME:
+        return
+    try:
+        get_table(TABLE_NAME).update_item(
+            Key={'file_id': f"{result['bucket_name']}/{result['object_key']}"},
+            UpdateExpression='SET transition_status = :failed REMOVE claim_expires_at',
+            ConditionExpression='source_version = :version AND transition_status = :claimed',
+            ExpressionAttributeValues={':failed': 'failed', ':claimed': 'claimed',
+                                       ':version': source_version(result['file_metadata'])}
+        )
+    except ClientError as e:
+        # Sem a marca, a reserva vence sozinha após CLAIM_TTL_SECONDS
+        print(f"Erro liberando reserva de {result['object_key']}: {str(e)}")
+
+def flush_insights(results):
+    """Grava os insights pendentes e marca como erro os registros cujo insight falhou"""
+    
+    failed = {item['file_id'] for item in insight_sink.flush()}
     
-    return {'statusCode': 200}
+    for result in results:
+        if f"{result['bucket_name']}/{result['object_key']}" in failed:
+            mark_failed(result, 'insight não gravado no DynamoDB')
+
+def mark_failed(result, error):
+    """Registra o erro no resultado do registro"""
+    
+    result['status'] = 'error'
+    result['error'] = str(error)
+    result['temporary'] = is_temporary_error(error)
+    print(f"Erro processando {result['object_key']}: {str(error)}")
+
+def is_temporary_error(error):
+    """Indica se o erro tende a passar sozinho (throttling, 5xx, rede) e vale nova tentativa"""
+    
+    # Falhas internas descritas por texto: análise sem resposta do Bedrock, insight não gravado
+    if isinstance(error, str):
+        return True
+    if isinstance(error, ClientError):
+        status = error.response.get('ResponseMetadata', {}).get('HTTPStatusCode', 0)
+        return error.response.get('Error', {}).get('Code') in TEMPORARY_ERROR_CODES or status >= 500
+    return isinstance(error, (HTTPClientError, EndpointError, ConnectionError, TimeoutError))
+
+def mark_skipped(result, reason):
+    """Registra que o registro foi ignorado e incrementa o contador do motivo"""
+    
+    result['status'] = 'skipped'
+    result['skip_reason'] = reason
+    
+    with stats_lock:
+        skip_stats[reason] += 1
+    
+    print(f"Ignorado ({reason}): {result['object_key']}")
+
+def summarize_result(result):
+    """Resumo do resultado por registro retornado pelo handler"""
+    
+    summary = {
+        'bucket_name': result['bucket_name'],
+        'object_key': result['object_key'],
+        'status': result['status']
+    }
+    
+    if result.get('recommendation'):
+        summary['storage_class'] = result['recommendation']['storage_class']
+    if 'error' in result:
+        summary['error'] = result['error']
+    if 'skip_reason' in result:
+        summary['skip_reason'] = result['skip_reason']
+    
+    return summary
+
+def file_type_from_key(object_key):
+    """Determina o tipo de arquivo pela extensão"""
+    
+    return object_key.split('.')[-1].lower() if '.' in object_key else 'unknown'
+
+def metadata_from_event(record, object_key):
+    """
+    Monta os metadados a partir do próprio registro S3 quando ele traz tudo o que
+    precisamos (tamanho, ETag e evento de upload direto). Retorna None caso contrário
+    """
+    
+    if not TRUST_EVENT_METADATA or record.get('eventName') not in EVENT_METADATA_EVENTS:
+        return None
+    
+    s3_object = record['s3']['object']
+    if 'size' not in s3_object or not s3_object.get('eTag'):
+        return None
+    
+    return {
+        'file_name': object_key,
+        'file_size': s3_object['size'],
+        'file_type': file_type_from_key(object_key),
+        'content_type': mimetypes.guess_type(object_key)[0] or 'unknown',
+        'last_modified': record.get('eventTime', ''),
+        # Uploads sem x-amz-storage-class chegam em STANDARD
+        'storage_class': 'STANDARD',
+        'etag': s3_object['eTag'].strip('"'),
+        'version_id': s3_object.get('versionId'),
+        'optimized_by': None
+    }
 
 def get_file_metadata(bucket_name, object_key):
     """Coleta metadados do arquivo S3"""
     
     response = s3_client.head_object(Bucket=bucket_name, Key=object_key)
     
-    # Determinar tipo de arquivo
-    file_extension = object_key.split('.')[-1].lower() if '.' in object_key else 'unknown'
-    
     metadata = {
         'file_name': object_key,
         'file_size': response['ContentLength'],
-        'file_type': file_extension,
+        'file_type': file_type_from_key(object_key),
         'content_type': response.get('ContentType', 'unknown'),
         'last_modified': response['LastModified'].isoformat(),
-        'storage_class': response.get('StorageClass', 'STANDARD')
+        'storage_class': response.get('StorageClass', 'STANDARD'),
+        'etag': response.get('ETag', '').strip('"'),
+        'version_id': response.get('VersionId'),
+        'optimized_by': response.get('Metadata', {}).get('optimized-by'),
+        # Repetidos na cópia com MetadataDirective=REPLACE, sem um segundo head_object
+        'copy_attributes': copy_attributes(response)
     }
     
     return metadata
 
-def analyze_with_bedrock(file_metadata):
-    """Usa Bedrock para analisar arquivo e recomendar classe de armazenamento"""
+def resolve_by_rules(file_metadata):
+    """Objetos quentes e regras configuradas: decisões que não dependem do conteúdo"""
     
-    # Converter tamanho para formato legível
-    size_mb = file_metadata['file_size'] / (1024 * 1024)
-    size_gb = size_mb / 1024
+    if KEY_TEMPLATES and 'key_template' not in file_metadata:
+        file_metadata['key_template'] = key_templates.learn(file_metadata['file_name'])
     
-    if size_gb >= 1:
-        size_display = f"{size_gb:.2f} GB"
-    else:
-        size_display = f"{size_mb:.2f} MB"
+    return hot_object_recommendation(file_metadata) or rule_engine.classify(file_metadata)
+
+def resolve_from_memory(metadata_list):
+    """
+    Memo por template de chave, cache de recomendações e índice de similaridade para
+    vários arquivos; o cache compartilhado é lido numa única rodada de batch_get_item
+    """
+    
+    recommendations = [key_templates.recall(file_metadata.get('key_template')) for file_metadata in metadata_list]
+    
+    missing = [index for index, recommendation in enumerate(recommendations) if not recommendation]
+    cached = recommendation_cache.get_many([metadata_list[index] for index in missing])
+    for index, recommendation in zip(missing, cached):
+        recommendations[index] = recommendation
+    
+    missing = [index for index in missing if not recommendations[index]]
+    if missing and SIMILARITY_INDEX:
+        load_similarity_snapshot()
+        for index in missing:
+            recommendations[index] = similarity_index.lookup(metadata_list[index])
     
-    prompt = f"""
-    Analise este arquivo S3 e recomende a classe de armazenamento ideal:
+    return recommendations
 
-    Arquivo: {file_metadata['file_name']}
-    Tamanho: {file_metadata['file_size']} bytes ({size_display})
-    Tipo: {file_metadata['file_type']}
-    Content-Type: {file_metadata['content_type']}
+def read_cache_entries(signatures):
+    """Itens do cache compartilhado em lotes de 100 (batch_get_item), como na verificação de versões"""
+    
+    if not CACHE_TABLE:
+        return {}
+    return fetch_attributes(lambda **kwargs: dynamodb.batch_get_item(**kwargs), CACHE_TABLE, signatures,
+                            key_name='signature')
 
-    Classes disponíveis:
-    - STANDARD: Acesso frequente, custo alto por GB
-    - STANDARD_IA: Acesso infrequente, custo médio, mínimo 128KB
-    - GLACIER: Arquivamento, custo baixo, recuperação em minutos/horas
-    - DEEP_ARCHIVE: Arquivamento longo prazo, custo muito baixo, recuperação em 12h
+def remember_recommendation(file_metadata, recommendation):
+    """Guarda a resposta do modelo no memo do template, no cache e no índice de similaridade"""
+    
+    key_templates.remember(file_metadata.get('key_template'), recommendation)
+    recommendation_cache.put(file_metadata, recommendation)
+    if SIMILARITY_INDEX:
+        similarity_index.add(file_metadata, recommendation)
 
-    Considere especialmente:
-    - Tamanho do arquivo (arquivos pequenos <128KB não se beneficiam de IA)
-    - Tipo de arquivo (logs, backups = GLACIER; documentos = IA; imagens ativas = STANDARD)
-    - Padrão de acesso esperado baseado no tipo
-    - Custo-benefício por tamanho
+def _snapshot_location(uri):
+    bucket_name, _, key = uri[len('s3://'):].partition('/')
+    return bucket_name, key
 
-    Responda APENAS em JSON:
-    {{
-        "storage_class": "CLASSE_RECOMENDADA",
-        "reasoning": "explicação da recomendação",
-        "confidence": "alta/média/baixa"
-    }}
+def load_similarity_snapshot():
+    """Carrega o snapshot do índice uma vez por container (cold start)"""
+    
+    if similarity_snapshot['loaded'] or not SIMILARITY_SNAPSHOT:
+        return
+    similarity_snapshot['loaded'] = True
+    
+    bucket_name, key = _snapshot_location(SIMILARITY_SNAPSHOT)
+    try:
+        entries = json.loads(s3_client.get_object(Bucket=bucket_name, Key=key)['Body'].read())
+    except ClientError as e:
+        if e.response['Error']['Code'] not in ('NoSuchKey', '404'):
+            print(f"Erro carregando índice de similaridade: {str(e)}")
+        return
+    
+    similarity_index.restore(entries)
+    similarity_snapshot['saved_at'] = time.time()
+
+def save_similarity_snapshot(force=False):
+    """Grava o snapshot se o índice mudou, no máximo a cada SIMILARITY_SNAPSHOT_SECONDS"""
+    
+    if not SIMILARITY_SNAPSHOT or not similarity_index.dirty:
+        return
+    if not force and time.time() - similarity_snapshot['saved_at'] < SIMILARITY_SNAPSHOT_SECONDS:
+        return
+    
+    bucket_name, key = _snapshot_location(SIMILARITY_SNAPSHOT)
+    try:
+        s3_client.put_object(Bucket=bucket_name, Key=key, Body=json.dumps(similarity_index.snapshot()),
+                             ContentType='application/json')
+        similarity_snapshot['saved_at'] = time.time()
+    except Exception as e:
+        print(f"Erro gravando índice de similaridade: {str(e)}")
+
+def load_access_stats():
     """
+    Frequências de acesso do snapshot, relidas no máximo a cada ACCESS_STATS_REFRESH_SECONDS
+    (GET condicional: o snapshot só é baixado de novo quando mudou)
+    """
+    
+    if not ACCESS_STATS:
+        return None
     
-    body = json.dumps({
+    with access_lock:
+        if time.time() - access_snapshot['checked_at'] < ACCESS_STATS_REFRESH_SECONDS:
+            return access_snapshot['tracker']
+        access_snapshot['checked_at'] = time.time()
+        
+        bucket_name, key = _snapshot_location(ACCESS_STATS)
+        request = {'Bucket': bucket_name, 'Key': key}
+        if access_snapshot['etag']:
+            request['IfNoneMatch'] = access_snapshot['etag']
+        
+        try:
+            response = s3_client.get_object(**request)
+            access_snapshot['tracker'] = AccessTracker.loads(response['Body'].read())
+            access_snapshot['etag'] = response.get('ETag')
+        except ClientError as e:
+            if e.response['Error']['Code'] not in ('304', 'NotModified', 'NoSuchKey', '404'):
+                print(f"Erro carregando frequências de acesso: {str(e)}")
+        except ValueError as e:
+            print(f"Snapshot de acessos inválido: {str(e)}")
+        
+        return access_snapshot['tracker']
+
+def annotate_access(bucket_name, object_key, file_metadata):
+    """Anota as leituras recentes estimadas do objeto e do seu prefixo"""
+    
+    tracker = load_access_stats()
+    if tracker is None:
+        return
+    
+    counts = tracker.access_counts(bucket_name, object_key)
+    file_metadata['access_count'] = round(counts['key'], 1)
+    if counts['prefix'] is not None:
+        file_metadata['prefix_access_count'] = round(counts['prefix'], 1)
+    
+    with stats_lock:
+        access_stats['annotated'] += 1
+
+def hot_object_recommendation(file_metadata):
+    """Objetos lidos com frequência ficam em STANDARD, sem consultar cache nem modelo"""
+    
+    reads = file_metadata.get('access_count')
+    if reads is None or reads < ACCESS_HOT_THRESHOLD:
+        return None
+    
+    with stats_lock:
+        access_stats['hot'] += 1
+    return {
+        'storage_class': 'STANDARD',
+        'reasoning': f"Objeto lido com frequência (~{reads:.0f} leituras recentes nos logs de acesso)",
+        'confidence': 'alta',
+        'source': 'access_log'
+    }
+
+def get_recommendations(metadata_list, enrich=None):
+    """
+    Resolve recomendações para vários arquivos: regras e cache primeiro,
+    o restante vai ao Bedrock em lotes de até BEDROCK_BATCH_SIZE arquivos.
+    `enrich` recebe os metadados que as regras não resolveram antes da consulta
+    ao cache (ex.: identificação do formato). Retorna uma lista na mesma ordem
+    da entrada (None quando a análise falhou)
+    """
+    
+    recommendations = [resolve_by_rules(file_metadata) for file_metadata in metadata_list]
+    pending = {}
+    
+    unresolved = [index for index, recommendation in enumerate(recommendations) if not recommendation]
+    if enrich and unresolved:
+        enrich([metadata_list[index] for index in unresolved])
+    
+    remembered = resolve_from_memory([metadata_list[index] for index in unresolved])
+    for index, recommendation in zip(unresolved, remembered):
+        file_metadata = metadata_list[index]
+        if recommendation:
+            recommendations[index] = recommendation
+        else:
+            # Arquivos com o mesmo template de chave (ou a mesma assinatura) compartilham uma única análise
+            group = file_metadata.get('key_template') or build_signature(file_metadata)
+            pending.setdefault(group, []).append(index)
+    
+    groups = list(pending.values())
+    batch_size = max(1, BEDROCK_BATCH_SIZE)
+    chunks = [groups[start:start + batch_size] for start in range(0, len(groups), batch_size)]
+    
+    def analyze_chunk(chunk):
+        try:
+            return analyze_batch_with_bedrock([metadata_list[group[0]] for group in chunk])
+        except Exception as e:
+            # Throttling, limite local ou circuito aberto: o lote inteiro fica sem resposta (adiado)
+            print(f"Lote adiado ({len(chunk)} arquivos): {str(e)}")
+            return [None] * len(chunk)
+    
+    # Lotes independentes são enviados ao Bedrock em paralelo
+    batch_results = run_concurrently(analyze_chunk, chunks)
+    
+    for chunk, results in zip(chunks, batch_results):
+        for group, recommendation in zip(chunk, results):
+            if recommendation is None:
+                continue
+            remember_recommendation(metadata_list[group[0]], recommendation)
+            for index in group:
+                recommendations[index] = recommendation
+    
+    return recommendations
+
+def format_size(file_size):
+    """Converte tamanho para formato legível"""
+    
+    size_mb = file_size / (1024 * 1024)
+    size_gb = size_mb / 1024
+    
+    if size_gb >= 1:
+        return f"{size_gb:.2f} GB"
+    return f"{size_mb:.2f} MB"
+
+def describe_file(file_metadata):
+    """Linha compacta com os atributos do arquivo usados no prompt"""
+    
+    description = (f"{file_metadata['file_name']} | {file_metadata['file_size']} bytes "
+                   f"({format_size(file_metadata['file_size'])}) | {file_metadata['file_type']} | "
+                   f"{file_metadata['content_type']}")
+    
+    if file_metadata.get('sniffed_format'):
+        flag = ' (comprimido)' if file_metadata['compressed'] else ' (compressível)' if file_metadata['compressible'] else ''
+        description += f" | formato {file_metadata['sniffed_format']}{flag}"
+    
+    if 'access_count' in file_metadata:
+        description += f" | ~{file_metadata['access_count']:.0f} leituras recentes"
+        if 'prefix_access_count' in file_metadata:
+            description += f" (prefixo ~{file_metadata['prefix_access_count']:.0f})"
+    
+    # O template indica que a decisão vale para todas as chaves do mesmo padrão
+    if file_metadata.get('key_template'):
+        description += f" | padrão {file_metadata['key_template']}"
+    return description
+
+def invoke_bedrock(prompt, max_tokens, model_id=None, tool=None):
+    """
+    Chama o modelo (MODEL_ID por padrão) e retorna (saída, usage). Com `tool` o modelo
+    é obrigado a responder chamando a ferramenta e a saída é o input dela (dict);
+    modelos que respondem em texto devolvem o texto para o parser JSON
+    """
+    
+    request = {
         "anthropic_version": "bedrock-2023-05-31",
-        "max_tokens": 300,
+        "max_tokens": max_tokens,
         "messages": [{"role": "user", "content": prompt}]
-    })
+    }
+    if tool:
+        request["tools"] = [tool]
+        request["tool_choice"] = {"type": "tool", "name": tool["name"]}
     
-    response = bedrock_client.invoke_model(
-        modelId='anthropic.claude-3-sonnet-20240229-v1:0',
-        body=body
-    )
+    # Throttling reduz a concorrência; sem vaga/token no prazo levanta RateLimited.
+    # Com o circuito aberto a chamada nem é feita (CircuitOpen)
+    response = bedrock_limiter.call(lambda: bedrock_breaker.call(lambda: bedrock_client.invoke_model(
+        modelId=model_id or MODEL_ID,
+        body=json.dumps(request)
+    )))
     
     result = json.loads(response['body'].read())
-    content = result['content'][0]['text']
+    usage = {
+        'input_tokens': int(result.get('usage', {}).get('input_tokens', 0)),
+        'output_tokens': int(result.get('usage', {}).get('output_tokens', 0))
+    }
     
-    # Extrair JSON da resposta
-    try:
-        recommendation = json.loads(content)
-        return recommendation
-    except:
-        # Fallback se não conseguir parsear
+    output = "".join(block.get('text', '') for block in result.get('content', []))
+    for block in result.get('content', []):
+        if tool and block.get('type') == 'tool_use' and block.get('name') == tool['name']:
+            output = block.get('input')
+            break
+    
+    with stats_lock:
+        analysis_stats['calls'] += 1
+        analysis_stats['input_tokens'] += usage['input_tokens']
+        analysis_stats['output_tokens'] += usage['output_tokens']
+        analysis_stats['tool_answers' if isinstance(output, dict) else 'text_answers'] += 1
+    
+    return output, usage
+
+def validate_recommendation(entry):
+    """Valida uma saída contra RECOMMENDATION_SCHEMA; retorna a recomendação normalizada ou None"""
+    
+    if not isinstance(entry, dict):
+        return None
+    if entry.get('storage_class') not in STORAGE_CLASSES or entry.get('confidence') not in CONFIDENCE_LEVELS:
+        return None
+    if not isinstance(entry.get('reasoning'), str):
+        return None
+    
+    return {
+        'storage_class': entry['storage_class'],
+        'reasoning': entry['reasoning'],
+        'confidence': entry['confidence']
+    }
+
+def model_tiers():
+    """Sequência de (modelo, camada) consultada até obter uma resposta aceitável"""
+    
+    if TIERED_ANALYSIS:
+        return [(FAST_MODEL_ID, 'fast'), (MODEL_ID, 'escalated')]
+    return [(MODEL_ID, 'single')]
+
+def needs_escalation(recommendation):
+    return recommendation.get('confidence') in ESCALATION_CONFIDENCES
+
+def tag_tier(recommendation, model_id, tier, started, usage=None, share=1):
+    """
+    Registra qual modelo respondeu, a latência da chamada e os tokens consumidos.
+    Em lotes os tokens são divididos entre os `share` arquivos da chamada
+    """
+    
+    recommendation['model_tier'] = tier
+    recommendation['model_id'] = model_id
+    recommendation['analysis_ms'] = int((time.perf_counter() - started) * 1000)
+    if usage:
+        recommendation['input_tokens'] = round(usage['input_tokens'] / share)
+        recommendation['output_tokens'] = round(usage['output_tokens'] / share)
+    return recommendation
+
+def analyze_with_bedrock(file_metadata):
+    """
+    Usa Bedrock para analisar arquivo e recomendar classe de armazenamento,
+    começando pelo modelo rápido e escalando quando a resposta não é aceitável
+    """
+    
+    if not bedrock_breaker.available():
+        return local_heuristic(file_metadata)
+    
+    answer = None
+    for model_id, tier in model_tiers():
+        try:
+            recommendation = _ask_model(file_metadata, model_id, tier)
+        except CircuitOpen:
+            return answer or local_heuristic(file_metadata)
+        if recommendation is not None:
+            answer = recommendation
+            if not needs_escalation(recommendation):
+                break
+        if tier == 'fast':
+            with stats_lock:
+                tier_stats['escalations'] += 1
+    
+    if answer is None:
+        # Fallback se nenhum modelo retornou uma recomendação válida
+        with stats_lock:
+            analysis_stats['fallbacks'] += 1
         return {
             "storage_class": "STANDARD_IA",
             "reasoning": "Análise padrão aplicada",
             "confidence": "baixa"
         }
+    
+    with stats_lock:
+        tier_stats[answer['model_tier']] += 1
+    return answer
 
-def save_insight_to_dynamodb(bucket_name, object_key, file_metadata, recommendation):
-    """Salva o insight no DynamoDB"""
+def _ask_model(file_metadata, model_id, tier):
+    """Pergunta a um modelo sobre um arquivo; retorna None se a resposta não passar na validação"""
     
-    if not TABLE_NAME:
-        print("DynamoDB table não configurada")
-        return
+    prompt = f"Recomende a classe S3 do arquivo: {describe_file(file_metadata)}"
+    
+    started = time.perf_counter()
+    try:
+        output, usage = invoke_bedrock(prompt, 200, model_id, tool=RECOMMEND_TOOL)
+        if isinstance(output, str):
+            output = json.loads(output)
+    except ValueError:
+        output, usage = None, None
+    
+    recommendation = validate_recommendation(output)
+    if recommendation is None:
+        with stats_lock:
+            analysis_stats['invalid'] += 1
+        return None
+    
+    return tag_tier(recommendation, model_id, tier, started, usage)
+
+def is_backoff_error(error):
+    """Erros que pedem menos chamadas ao Bedrock (throttling, limite local, circuito aberto)"""
+    
+    return is_throttle(error) or isinstance(error, (RateLimited, CircuitOpen))
+
+def analyze_batch_with_bedrock(metadata_list):
+    """
+    Analisa vários arquivos em uma única chamada ao Bedrock, pedindo um array JSON.
+    No modo em camadas o lote vai primeiro ao modelo rápido e só as entradas com
+    confiança baixa ou inválidas são reenviadas ao modelo maior.
+    Entradas ausentes por resposta inválida caem para a análise individual. Throttling,
+    limite local e circuito aberto não geram novas chamadas: sem nenhuma resposta o erro
+    é propagado (lote adiado); com respostas parciais as demais ficam None
+    """
+    
+    if len(metadata_list) == 1:
+        return [_analyze_single(metadata_list[0])]
+    if not bedrock_breaker.available():
+        return [local_heuristic(file_metadata) for file_metadata in metadata_list]
+    
+    answers = {}
+    pending = list(range(len(metadata_list)))
+    backing_off = False
+    
+    for model_id, tier in model_tiers():
+        if not pending:
+            break
+        
+        subset = [metadata_list[index] for index in pending]
+        try:
+            if len(subset) == 1:
+                entry = _ask_model(subset[0], model_id, tier)
+                entries = {0: entry} if entry else {}
+            else:
+                entries = _ask_batch(subset, model_id, tier)
+        except Exception as e:
+            if is_backoff_error(e):
+                if not answers:
+                    raise
+                backing_off = True
+                break
+            print(f"Erro na análise em lote ({tier}): {str(e)}")
+            entries = {}
+        
+        for position, recommendation in entries.items():
+            answers[pending[position]] = recommendation
+        
+        pending = [index for index in pending if index not in answers or needs_escalation(answers[index])]
+        if tier == 'fast':
+            with stats_lock:
+                tier_stats['escalations'] += len(pending)
+    
+    recommendations = []
+    for index, file_metadata in enumerate(metadata_list):
+        recommendation = answers.get(index)
+        if recommendation is None and not backing_off:
+            with stats_lock:
+                batch_stats['item_fallbacks'] += 1
+            try:
+                recommendation = analyze_with_bedrock(file_metadata)
+            except Exception as e:
+                print(f"Erro analisando {file_metadata['file_name']}: {str(e)}")
+                backing_off = is_backoff_error(e)
+        elif recommendation is not None:
+            with stats_lock:
+                tier_stats[recommendation['model_tier']] += 1
+        recommendations.append(recommendation)
+    
+    return recommendations
+
+def _ask_batch(metadata_list, model_id, tier):
+    """Pergunta a um modelo sobre vários arquivos; retorna {índice: recomendação} das entradas válidas"""
+    
+    prompt = "Recomende a classe S3 de cada arquivo, informando o índice:\n" + "\n".join(
+        f"[{index}] {describe_file(file_metadata)}" for index, file_metadata in enumerate(metadata_list)
+    )
+    
+    with stats_lock:
+        batch_stats['batches'] += 1
+        batch_stats['batched_items'] += len(metadata_list)
+    
+    started = time.perf_counter()
+    output, usage = invoke_bedrock(prompt, min(4096, 60 * len(metadata_list) + 50), model_id,
+                                   tool=BATCH_RECOMMEND_TOOL)
+    if isinstance(output, dict):
+        output = output.get('recommendations')
+    entries = parse_batch_response(output, len(metadata_list))
+    
+    with stats_lock:
+        analysis_stats['invalid'] += len(metadata_list) - len(entries)
     
-    table = dynamodb.Table(TABLE_NAME)
+    return {index: tag_tier(recommendation, model_id, tier, started, usage, len(metadata_list))
+            for index, recommendation in entries.items()}
+
+def parse_batch_response(content, expected):
+    """
+    Mapeia cada entrada válida para o índice do arquivo correspondente. Aceita a lista
+    vinda da ferramenta ou o texto de um modelo que respondeu com um array JSON
+    """
+    
+    if isinstance(content, str):
+        start, end = content.find('['), content.rfind(']')
+        if start < 0 or end < start:
+            return {}
+        try:
+            content = json.loads(content[start:end + 1])
+        except ValueError:
+            return {}
+    
+    if not isinstance(content, list):
+        return {}
+    
+    recommendations = {}
+    for position, entry in enumerate(content):
+        if not isinstance(entry, dict):
+            continue
+        
+        index = entry.get('index', position)
+        if not isinstance(index, int) or not 0 <= index < expected or index in recommendations:
+            continue
+        
+        recommendation = validate_recommendation(entry)
+        if recommendation is None:
+            continue
+        
+        recommendation['source'] = 'bedrock_batch'
+        recommendations[index] = recommendation
+    
+    return recommendations
+
+def local_heuristic(file_metadata):
+    """Recomendação determinística usada com o circuito do Bedrock aberto (não é cacheada)"""
+    
+    with stats_lock:
+        analysis_stats['heuristic'] += 1
+    return heuristic_engine.classify(file_metadata)
+
+def _analyze_single(file_metadata):
+    try:
+        return analyze_with_bedrock(file_metadata)
+    except Exception as e:
+        print(f"Erro analisando {file_metadata['file_name']}: {str(e)}")
+        return None
+
+def build_insight_item(bucket_name, object_key, file_metadata, recommendation, cost=None, transition=None):
+    """Monta o item de insight gravado no DynamoDB (transition: 'applied' ou 'scheduled')"""
     
     item = {
         'file_id': f"{bucket_name}/{object_key}",
@@ -145,50 +1896,103 @@ def save_insight_to_dynamodb(bucket_name, object_key, file_metadata, recommendat
         'recommended_storage_class': recommendation['storage_class'],
         'reasoning': recommendation['reasoning'],
         'confidence': recommendation['confidence'],
+        'recommendation_source': recommendation.get('source', 'bedrock'),
+        'source_version': source_version(file_metadata),
         'analyzed_at': datetime.now().isoformat(),
         'ttl': int(datetime.now().timestamp()) + (365 * 24 * 60 * 60)  # 1 ano TTL
     }
     
-    table.put_item(Item=item)
-    print(f"Insight salvo no DynamoDB: {object_key}")
+    # Camada que respondeu, para latência e custo por modelo
+    if recommendation.get('model_tier'):
+        item['model_tier'] = recommendation['model_tier']
+        item['model_id'] = recommendation['model_id']
+        item['analysis_ms'] = recommendation['analysis_ms']
+    if 'input_tokens' in recommendation:
+        item['input_tokens'] = recommendation['input_tokens']
+        item['output_tokens'] = recommendation['output_tokens']
+    
+    if file_metadata.get('key_template'):
+        item['key_template'] = file_metadata['key_template']
+    
+    if file_metadata.get('sniffed_format'):
+        item['sniffed_format'] = file_metadata['sniffed_format']
+        item['compressed'] = file_metadata['compressed']
+        item['compressible'] = file_metadata['compressible']
+    
+    for name in ('access_count', 'prefix_access_count'):
+        if name in file_metadata:
+            item[name] = Decimal(str(file_metadata[name]))
+    
+    if transition:
+        item['transition_status'] = transition
+    
+    if cost:
+        item['cost_decision'] = cost['decision']
+        item['projected_savings'] = Decimal(str(round(cost['projected_savings'], 8)))
+    
+    return item
 
+def source_version(file_metadata):
+    """Chave de idempotência da versão do objeto (version ID ou ETag)"""
+    
+    return file_metadata.get('version_id') or file_metadata.get('etag') or file_metadata.get('last_modified', '')
 
 
-def apply_storage_class(bucket_name, object_key, recommendation, file_size):
-    """Aplica a classe de armazenamento recomendada"""
+
+def apply_storage_class(bucket_name, object_key, recommendation, file_size, attributes=None):
+    """
+    Aplica a classe de armazenamento recomendada. attributes são os cabeçalhos e metadados
+    da origem (copy_attributes); sem eles a cópia simples faz o próprio head_object
+    """
     
     storage_class = recommendation['storage_class']
     
-    # Copiar objeto com nova classe de armazenamento e adicionar tamanho nos metadados
-    copy_source = {'Bucket': bucket_name, 'Key': object_key}
-    
-    s3_client.copy_object(
-        CopySource=copy_source,
-        Bucket=bucket_name,
-        Key=object_key,
-        StorageClass=storage_class,
-        Metadata={
-            'file-size-bytes': str(file_size),
-            'optimized-by': 'S3Optimizer',
-            'recommended-class': storage_class,
-            'confidence': recommendation['confidence'],
-            'optimized-at': datetime.now().isoformat()
-        },
-        MetadataDirective='REPLACE'
-    )
+    metadata = {
+        'file-size-bytes': str(file_size),
+        'optimized-by': 'S3Optimizer',
+        'recommended-class': storage_class,
+        'confidence': recommendation['confidence'],
+        'optimized-at': datetime.now().isoformat()
+    }
+    
+    # Tags com informações da análise, gravadas na própria cópia
+    tags = [
+        {'Key': 'OptimizedBy', 'Value': 'S3Optimizer'},
+        {'Key': 'RecommendedClass', 'Value': storage_class},
+        {'Key': 'Confidence', 'Value': recommendation['confidence']},
+        {'Key': 'OptimizedAt', 'Value': datetime.now().isoformat()},
+        {'Key': 'FileSizeBytes', 'Value': str(file_size)}
+    ]
+    
+    if file_size >= MULTIPART_THRESHOLD:
+        # Objetos grandes: cópia multipart com partes em paralelo
+        multipart_copy(
+            s3_client, bucket_name, object_key, file_size, storage_class, metadata,
+            part_size=MULTIPART_PART_SIZE,
+            max_concurrency=MULTIPART_CONCURRENCY,
+            tags=tags
+        )
+    else:
+        # Copiar objeto com nova classe de armazenamento, metadados e tags em uma única chamada;
+        # REPLACE descarta os cabeçalhos da origem, então eles são repetidos explicitamente
+        copy_source = {'Bucket': bucket_name, 'Key': object_key}
+        
+        if attributes is None:
+            attributes = copy_attributes(s3_client.head_object(Bucket=bucket_name, Key=object_key))
+        copy_args = dict(attributes, Metadata=dict(attributes.get('Metadata', {}), **metadata))
+        
+        s3_client.copy_object(
+            CopySource=copy_source,
+            Bucket=bucket_name,
+            Key=object_key,
+            StorageClass=storage_class,
+            MetadataDirective='REPLACE',
+            Tagging=urllib.parse.urlencode([(tag['Key'], tag['Value']) for tag in tags]),
+            TaggingDirective='REPLACE',
+            **copy_args
+        )
+    
+    with stats_lock:
+        api_stats['put_object_tagging_avoided'] += 1
     
-    # Adicionar tags com informações da análise
-    s3_client.put_object_tagging(
-        Bucket=bucket_name,
-        Key=object_key,
-        Tagging={
-            'TagSet': [
-                {'Key': 'OptimizedBy', 'Value': 'S3Optimizer'},
-                {'Key': 'RecommendedClass', 'Value': storage_class},
-                {'Key': 'Confidence', 'Value': recommendation['confidence']},
-                {'Key': 'OptimizedAt', 'Value': datetime.now().isoformat()},
-                {'Key': 'FileSizeBytes', 'Value': str(file_size)}
-            ]
-        }
-    )
     print(f"Classe de armazenamento aplicada: {storage_class}")
\ No newline at end of file
@@ -0,0 +1,210 @@
+import hashlib
+
+from botocore.exceptions import ClientError
+
+# Classes que aceitam transição via regra de lifecycle e o mínimo de dias exigido pelo S3
+TRANSITION_DAYS = {
+    'STANDARD_IA': 30,
+    'ONEZONE_IA': 30,
+    'INTELLIGENT_TIERING': 0,
+    'GLACIER_IR': 0,
+    'GLACIER': 0,
+    'DEEP_ARCHIVE': 0
+}
+
+RULE_ID_PREFIX = 's3-optimizer-'
+MAX_LIFECYCLE_RULES = 1000
+
+# Insights cuja transição já foi feita, agendada ou está em andamento não geram cópia individual
+HANDLED_TRANSITIONS = ('applied', 'scheduled', 'claimed')
+
+
+def _vote(item):
+    """Classe que o objeto pede para o prefixo: vetado pelo custo = ficar na classe atual"""
+
+    if item.get('cost_decision') == 'veto':
+        return item.get('original_storage_class') or 'STANDARD'
+    return item['recommended_storage_class']
+
+
+class _PrefixNode:
+    def __init__(self, prefix, depth=0):
+        self.prefix = prefix
+        self.depth = depth
+        self.children = {}
+        self.items = []
+        self.classes = {}
+        self.count = 0
+
+
+def _build_tree(items):
+    root = _PrefixNode('')
+
+    for item in items:
+        storage_class = _vote(item)
+        node = root
+        node.classes[storage_class] = node.classes.get(storage_class, 0) + 1
+        node.count += 1
+
+        for segment in item['object_key'].split('/')[:-1]:
+            child = node.children.get(segment)
+            if child is None:
+                child = node.children[segment] = _PrefixNode(f"{node.prefix}{segment}/", node.depth + 1)
+            node = child
+            node.classes[storage_class] = node.classes.get(storage_class, 0) + 1
+            node.count += 1
+
+        node.items.append(item)
+
+    return root
+
+
+def _covers_prefix(node, count_objects, min_coverage):
+    """Os insights precisam representar ao menos min_coverage dos objetos guardados no prefixo"""
+
+    if count_objects is None:
+        return True
+    # A contagem pode parar assim que passar do máximo aceitável
+    limit = int(node.count / min_coverage)
+    return count_objects(node.prefix, limit) <= limit
+
+
+def _cover(node, min_objects, rules, leftovers, min_depth=1, count_objects=None, min_coverage=0.8):
+    """
+    Cobre o prefixo com uma regra se todas as recomendações concordam, o prefixo tem ao
+    menos min_depth níveis (a raiz nunca vira regra) e os insights cobrem a maior parte
+    dos objetos guardados nele; senão desce na árvore
+    """
+
+    if len(node.classes) == 1 and node.count >= min_objects and node.depth >= min_depth:
+        storage_class = next(iter(node.classes))
+        if storage_class in TRANSITION_DAYS and _covers_prefix(node, count_objects, min_coverage):
+            rules.append({'prefix': node.prefix, 'storage_class': storage_class, 'objects': node.count})
+            return
+
+    leftovers.extend(node.items)
+    for child in node.children.values():
+        _cover(child, min_objects, rules, leftovers, min_depth, count_objects, min_coverage)
+
+
+def _group_by_tags(items, min_objects, rules):
+    """Agrupa objetos restantes por tag compartilhada quando a recomendação concorda"""
+
+    groups = {}
+    for item in items:
+        for key, value in (item.get('tags') or {}).items():
+            groups.setdefault((key, value), []).append(item)
+
+    covered = set()
+    for (key, value), group in sorted(groups.items(), key=lambda entry: -len(entry[1])):
+        group = [item for item in group if item['object_key'] not in covered]
+        classes = {_vote(item) for item in group}
+        if len(group) < min_objects or len(classes) != 1:
+            continue
+
+        storage_class = classes.pop()
+        if storage_class not in TRANSITION_DAYS:
+            continue
+
+        rules.append({'tag': (key, value), 'storage_class': storage_class, 'objects': len(group)})
+        covered.update(item['object_key'] for item in group)
+
+    return [item for item in items if item['object_key'] not in covered]
+
+
+def synthesize_rules(insights, min_objects=2, max_rules=MAX_LIFECYCLE_RULES, min_depth=1,
+                     count_objects=None, min_coverage=0.8):
+    """
+    Gera o conjunto mínimo de regras por prefixo (e por tag) a partir dos insights.
+    Insights vetados pelo modelo de custo votam por ficar na classe atual: bloqueiam ou
+    estreitam a regra do prefixo e nunca geram cópia.
+    count_objects(prefixo, limite) retorna quantos objetos o prefixo guarda (pode parar
+    ao passar do limite); sem ele a cobertura do prefixo não é verificada.
+    Retorna (regras, objetos que precisam de cópia individual)
+    """
+
+    rules = []
+    leftovers = []
+    _cover(_build_tree(insights), min_objects, rules, leftovers, min_depth, count_objects, min_coverage)
+    leftovers = _group_by_tags(leftovers, min_objects, rules)
+
+    # Regras que excedem o limite do bucket voltam para cópia individual
+    rules.sort(key=lambda rule: -rule['objects'])
+    if len(rules) > max_rules:
+        overflow = rules[max_rules:]
+        rules = rules[:max_rules]
+        for rule in overflow:
+            leftovers.extend(item for item in insights if _rule_matches(rule, item))
+
+    copies = [item for item in leftovers if _wants_copy(item)]
+
+    return rules, copies
+
+
+def _wants_copy(item):
+    return (item['recommended_storage_class'] != item.get('original_storage_class')
+            and item.get('cost_decision') != 'veto'
+            and item.get('transition_status') not in HANDLED_TRANSITIONS)
+
+
+def needs_copy(item, rules):
+    """Insight fora de todas as regras aplicadas que ainda precisa de cópia individual"""
+
+    return _wants_copy(item) and not any(_rule_matches(rule, item) for rule in rules)
+
+
+def _rule_matches(rule, item):
+    if 'prefix' in rule:
+        return item['object_key'].startswith(rule['prefix'])
+    key, value = rule['tag']
+    return (item.get('tags') or {}).get(key) == value
+
+
+def to_lifecycle_rule(rule):
+    """Converte a regra sintetizada para o formato de put_bucket_lifecycle_configuration"""
+
+    if 'prefix' in rule:
+        lifecycle_filter = {'Prefix': rule['prefix']}
+        identity = f"prefix:{rule['prefix']}"
+    else:
+        key, value = rule['tag']
+        lifecycle_filter = {'Tag': {'Key': key, 'Value': value}}
+        identity = f"tag:{key}={value}"
+
+    digest = hashlib.sha1(f"{identity}|{rule['storage_class']}".encode()).hexdigest()[:12]
+
+    return {
+        'ID': f"{RULE_ID_PREFIX}{digest}",
+        'Status': 'Enabled',
+        'Filter': lifecycle_filter,
+        'Transitions': [{
+            'Days': TRANSITION_DAYS[rule['storage_class']],
+            'StorageClass': rule['storage_class']
+        }]
+    }
+
+
+def apply_lifecycle_rules(s3_client, bucket_name, rules):
+    """Substitui as regras do otimizador no bucket, preservando regras de outros donos"""
+
+    try:
+        existing = s3_client.get_bucket_lifecycle_configuration(Bucket=bucket_name)['Rules']
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'NoSuchLifecycleConfiguration':
+            raise
+        existing = []
+
+    kept = [rule for rule in existing if not rule.get('ID', '').startswith(RULE_ID_PREFIX)]
+    combined = kept + [to_lifecycle_rule(rule) for rule in rules][:MAX_LIFECYCLE_RULES - len(kept)]
+
+    if not combined:
+        if existing:
+            s3_client.delete_bucket_lifecycle(Bucket=bucket_name)
+    else:
+        s3_client.put_bucket_lifecycle_configuration(
+            Bucket=bucket_name,
+            LifecycleConfiguration={'Rules': combined}
+        )
+
+    print(f"Regras de lifecycle aplicadas em {bucket_name}: {len(combined) - len(kept)} do otimizador")
+    return len(combined) - len(kept)
@@ -0,0 +1,109 @@
+import math
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PARTS = 10000
+
+# Cabeçalhos do objeto de origem preservados na cópia (simples ou multipart)
+PRESERVED_HEADERS = ('ContentType', 'ContentEncoding', 'ContentDisposition',
+                     'ContentLanguage', 'CacheControl', 'Expires')
+
+# Checksums adicionais (o ETag de um upload multipart nunca coincide com o original)
+CHECKSUM_ALGORITHMS = (('ChecksumSHA256', 'SHA256'), ('ChecksumSHA1', 'SHA1'),
+                       ('ChecksumCRC32C', 'CRC32C'), ('ChecksumCRC32', 'CRC32'))
+
+
+def copy_attributes(source):
+    """Cabeçalhos, criptografia e metadados de usuário da origem que uma cópia com REPLACE precisa repetir"""
+
+    attributes = {'Metadata': dict(source.get('Metadata') or {})}
+
+    for header in PRESERVED_HEADERS + ('ServerSideEncryption', 'SSEKMSKeyId'):
+        if source.get(header):
+            attributes[header] = source[header]
+
+    return attributes
+
+
+def plan_parts(file_size, part_size):
+    """Divide o objeto em faixas de bytes respeitando o limite de 10.000 partes"""
+
+    part_size = max(part_size, MIN_PART_SIZE, math.ceil(file_size / MAX_PARTS))
+
+    parts = []
+    for number, start in enumerate(range(0, file_size, part_size), start=1):
+        end = min(start + part_size, file_size) - 1
+        parts.append((number, start, end))
+
+    return parts
+
+
+def multipart_copy(s3_client, bucket_name, object_key, file_size, storage_class, metadata,
+                   part_size=256 * 1024 * 1024, max_concurrency=8, tags=None):
+    """
+    Copia o objeto sobre ele mesmo com create_multipart_upload + upload_part_copy
+    em paralelo, preservando cabeçalhos, metadados, tags e algoritmo de checksum da origem.
+    Se tags for informado, substitui as tags da origem (como TaggingDirective=REPLACE)
+    """
+
+    source = s3_client.head_object(Bucket=bucket_name, Key=object_key, ChecksumMode='ENABLED')
+
+    create_args = copy_attributes(source)
+    create_args.update(Bucket=bucket_name, Key=object_key, StorageClass=storage_class)
+    create_args['Metadata'].update(metadata)
+
+    checksum_field = None
+    for field, algorithm in CHECKSUM_ALGORITHMS:
+        if source.get(field):
+            checksum_field = field
+            create_args['ChecksumAlgorithm'] = algorithm
+            break
+
+    tag_set = tags
+    if tag_set is None:
+        tag_set = s3_client.get_object_tagging(Bucket=bucket_name, Key=object_key).get('TagSet', [])
+    if tag_set:
+        create_args['Tagging'] = urllib.parse.urlencode([(tag['Key'], tag['Value']) for tag in tag_set])
+
+    upload_id = s3_client.create_multipart_upload(**create_args)['UploadId']
+    copy_source = {'Bucket': bucket_name, 'Key': object_key}
+    if source.get('VersionId'):
+        copy_source['VersionId'] = source['VersionId']
+
+    def copy_part(part):
+        number, start, end = part
+        response = s3_client.upload_part_copy(
+            Bucket=bucket_name,
+            Key=object_key,
+            UploadId=upload_id,
+            PartNumber=number,
+            CopySource=copy_source,
+            CopySourceRange=f"bytes={start}-{end}",
+            CopySourceIfMatch=source['ETag']
+        )
+        result = response['CopyPartResult']
+        completed = {'PartNumber': number, 'ETag': result['ETag']}
+        if checksum_field and result.get(checksum_field):
+            completed[checksum_field] = result[checksum_field]
+        return completed
+
+    parts = plan_parts(file_size, part_size)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(parts)))) as executor:
+            completed_parts = list(executor.map(copy_part, parts))
+
+        s3_client.complete_multipart_upload(
+            Bucket=bucket_name,
+            Key=object_key,
+            UploadId=upload_id,
+            MultipartUpload={'Parts': completed_parts}
+        )
+    except Exception:
+        # Evitar partes órfãs cobradas como armazenamento
+        s3_client.abort_multipart_upload(Bucket=bucket_name, Key=object_key, UploadId=upload_id)
+        raise
+
+    print(f"Cópia multipart concluída: {object_key} ({len(parts)} partes)")
+    return len(parts)
@@ -0,0 +1,187 @@
+import collections
+import threading
+import time
+
+from botocore.exceptions import ClientError
+
+# Códigos que indicam que o serviço está limitando as chamadas
+THROTTLE_CODES = {'ThrottlingException', 'TooManyRequestsException', 'ServiceQuotaExceededException'}
+
+
+class RateLimited(Exception):
+    """Nenhuma vaga ou token disponível dentro do tempo de espera"""
+
+
+def is_throttle(error):
+    return isinstance(error, ClientError) and error.response.get('Error', {}).get('Code') in THROTTLE_CODES
+
+
+class TokenBucket:
+    """Token bucket local: `rate` tokens por segundo, acumulando até `burst`"""
+
+    def __init__(self, rate, burst=None, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst or max(1, rate)
+        self.clock = clock
+        self._tokens = self.burst
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        """Consome um token; retorna 0 se conseguiu ou quantos segundos faltam para o próximo"""
+
+        if self.rate <= 0:
+            return 0
+
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.rate
+
+
+class SharedRateCounter:
+    """
+    Limite global entre instâncias: contador por janela de um segundo numa tabela
+    DynamoDB, incrementado com update condicional (falha quando a janela está cheia)
+    """
+
+    def __init__(self, table_provider, name, limit, clock=time.time):
+        self.table_provider = table_provider
+        self.name = name
+        self.limit = limit
+        self.clock = clock
+
+    def try_acquire(self):
+        """Retorna 0 se conseguiu uma vaga na janela atual ou o tempo até a próxima janela"""
+
+        table = self.table_provider()
+        if table is None or self.limit <= 0:
+            return 0
+
+        now = self.clock()
+        window = int(now)
+
+        try:
+            table.update_item(
+                Key={'limiter_id': f"{self.name}#{window}"},
+                UpdateExpression='ADD tokens :one SET expires_at = :expires',
+                ConditionExpression='attribute_not_exists(tokens) OR tokens < :limit',
+                ExpressionAttributeValues={':one': 1, ':limit': self.limit, ':expires': window + 3600}
+            )
+            return 0
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+            return window + 1 - now
+
+
+class AdaptiveLimiter:
+    """
+    Controla chamadas a um serviço limitado: token bucket local (e opcionalmente o
+    contador compartilhado) para a taxa, e concorrência AIMD que sobe 1 vaga a cada
+    `limit` sucessos e cai pela metade a cada throttling. Chamadas que não conseguem
+    vaga ou token em `acquire_timeout` segundos levantam RateLimited
+    """
+
+    def __init__(self, rate=0, burst=None, min_concurrency=1, max_concurrency=16,
+                 acquire_timeout=10.0, shared=None, metrics_window=60.0,
+                 clock=time.monotonic, sleep=time.sleep):
+        self.bucket = TokenBucket(rate, burst, clock=clock)
+        self.shared = shared
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.acquire_timeout = acquire_timeout
+        self.metrics_window = metrics_window
+        self.clock = clock
+        self.sleep = sleep
+        self.limit = float(max_concurrency)
+        self._in_flight = 0
+        self._condition = threading.Condition()
+        self._recent = collections.deque()
+        self.stats = {'calls': 0, 'throttles': 0, 'rate_limited': 0, 'waits': 0}
+
+    def call(self, func):
+        """Executa func respeitando taxa e concorrência, ajustando o limite conforme o resultado"""
+
+        deadline = self.clock() + self.acquire_timeout
+        self._acquire_slot(deadline)
+        try:
+            self._acquire_token(deadline)
+            try:
+                result = func()
+            except Exception as e:
+                if is_throttle(e):
+                    self._on_throttle()
+                raise
+            self._on_success()
+            return result
+        finally:
+            with self._condition:
+                self._in_flight -= 1
+                self._condition.notify()
+
+    def _acquire_slot(self, deadline):
+        with self._condition:
+            while self._in_flight >= int(self.limit):
+                remaining = deadline - self.clock()
+                if remaining <= 0:
+                    self.stats['rate_limited'] += 1
+                    raise RateLimited("sem vaga de concorrência")
+                self.stats['waits'] += 1
+                self._condition.wait(remaining)
+            self._in_flight += 1
+
+    def _acquire_token(self, deadline):
+        for source in (self.bucket, self.shared):
+            while source is not None:
+                wait = source.try_acquire()
+                if not wait:
+                    break
+                if self.clock() + wait > deadline:
+                    with self._condition:
+                        self.stats['rate_limited'] += 1
+                    raise RateLimited("taxa máxima atingida")
+                with self._condition:
+                    self.stats['waits'] += 1
+                self.sleep(wait)
+
+    def _on_success(self):
+        with self._condition:
+            self.stats['calls'] += 1
+            self._record_call()
+            # Aumento aditivo: +1 vaga após `limit` sucessos
+            self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+            self._condition.notify()
+
+    def _on_throttle(self):
+        with self._condition:
+            self.stats['calls'] += 1
+            self.stats['throttles'] += 1
+            self._record_call()
+            # Redução multiplicativa
+            self.limit = max(self.min_concurrency, self.limit / 2)
+
+    def _record_call(self):
+        now = self.clock()
+        self._recent.append(now)
+        while self._recent and now - self._recent[0] > self.metrics_window:
+            self._recent.popleft()
+
+    def metrics(self):
+        """Taxa de throttling, requisições por segundo efetivas e limite de concorrência atual"""
+
+        with self._condition:
+            calls = self.stats['calls']
+            recent = list(self._recent)
+            span = max(self.clock() - recent[0], 1.0) if recent else self.metrics_window
+            return dict(
+                self.stats,
+                throttle_rate=round(self.stats['throttles'] / calls, 4) if calls else 0.0,
+                effective_rps=round(len(recent) / span, 2),
+                concurrency_limit=round(self.limit, 2)
+            )
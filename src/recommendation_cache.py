@@ -0,0 +1,171 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+# Limite de 128KB usado pelas classes IA (mínimo faturável)
+MIN_BILLABLE_SIZE = 128 * 1024
+
+
+def size_bucket(file_size):
+    """Agrupa o tamanho em faixas de potência de 2 (a faixa 18 começa exatamente em 128KB)"""
+    return int(file_size).bit_length()
+
+
+def build_signature(file_metadata):
+    """Gera a assinatura normalizada usada como chave do cache"""
+
+    file_type = str(file_metadata.get('file_type', 'unknown')).lower()
+    content_type = str(file_metadata.get('content_type', 'unknown')).split(';')[0].strip().lower()
+    storage_class = file_metadata.get('storage_class', 'STANDARD')
+
+    return f"{file_type}|{content_type}|{size_bucket(file_metadata['file_size'])}|{storage_class}"
+
+
+class RecommendationCache:
+    """
+    Cache de recomendações em duas camadas: LRU em memória (sobrevive a
+    invocações warm) e tabela DynamoDB compartilhada com TTL. Com `batch_reader`
+    (assinaturas -> {assinatura: item}) as leituras da camada compartilhada de
+    vários arquivos saem numa única chamada em vez de um get_item por arquivo
+    """
+
+    def __init__(self, max_entries=1024, ttl_seconds=86400, table_provider=None, batch_reader=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.table_provider = table_provider
+        self.batch_reader = batch_reader
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'local_hits': 0, 'shared_hits': 0, 'misses': 0, 'shared_errors': 0}
+
+    def get(self, file_metadata):
+        """Retorna a recomendação em cache ou None"""
+
+        return self.get_many([file_metadata])[0]
+
+    def get_many(self, metadata_list):
+        """
+        Recomendações em cache para vários arquivos (None onde não há), na ordem da
+        entrada. As assinaturas ausentes da camada local são lidas juntas da compartilhada
+        """
+
+        signatures = [build_signature(file_metadata) for file_metadata in metadata_list]
+        now = time.time()
+
+        local = {}
+        with self._lock:
+            for signature in set(signatures):
+                entry = self._entries.get(signature)
+                if entry and entry[1] > now:
+                    self._entries.move_to_end(signature)
+                    local[signature] = entry[0]
+                elif entry:
+                    del self._entries[signature]
+
+        missing = sorted(set(signatures) - set(local))
+        shared = self._get_shared_many(missing, now) if missing else {}
+        for signature, recommendation in shared.items():
+            self._store_local(signature, recommendation, now + self.ttl_seconds)
+
+        with self._lock:
+            for signature in signatures:
+                if signature in local:
+                    self.stats['local_hits'] += 1
+                elif signature in shared:
+                    self.stats['shared_hits'] += 1
+                else:
+                    self.stats['misses'] += 1
+
+        found = dict(shared, **local)
+        return [dict(found[signature], source='cache') if signature in found else None
+                for signature in signatures]
+
+    def put(self, file_metadata, recommendation):
+        """
+        Guarda a recomendação nas duas camadas (respostas de baixa confiança e da
+        heurística local não são cacheadas)
+        """
+
+        if recommendation.get('confidence') == 'baixa' or recommendation.get('source') == 'heuristic':
+            return
+
+        signature = build_signature(file_metadata)
+        expires_at = time.time() + self.ttl_seconds
+        value = {
+            'storage_class': recommendation['storage_class'],
+            'reasoning': recommendation.get('reasoning', ''),
+            'confidence': recommendation.get('confidence', 'média')
+        }
+
+        self._store_local(signature, value, expires_at)
+        self._put_shared(signature, value, expires_at)
+
+    def clear(self):
+        """Limpa a camada local e zera os contadores"""
+
+        with self._lock:
+            self._entries.clear()
+            for name in self.stats:
+                self.stats[name] = 0
+
+    def _store_local(self, signature, value, expires_at):
+        with self._lock:
+            self._entries[signature] = (value, expires_at)
+            self._entries.move_to_end(signature)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _table(self):
+        return self.table_provider() if self.table_provider else None
+
+    def _get_shared(self, signature, now):
+        table = self._table()
+        if table is None:
+            return None
+
+        try:
+            item = table.get_item(Key={'signature': signature}).get('Item')
+        except Exception as e:
+            print(f"Erro lendo cache compartilhado: {str(e)}")
+            with self._lock:
+                self.stats['shared_errors'] += 1
+            return None
+
+        # O TTL do DynamoDB remove itens com atraso, então validamos a expiração aqui
+        if not item or int(item.get('ttl', 0)) <= now:
+            return None
+
+        return json.loads(item['recommendation'])
+
+    def _get_shared_many(self, signatures, now):
+        if self.batch_reader is None:
+            found = {signature: self._get_shared(signature, now) for signature in signatures}
+            return {signature: value for signature, value in found.items() if value}
+
+        try:
+            items = self.batch_reader(signatures)
+        except Exception as e:
+            print(f"Erro lendo cache compartilhado: {str(e)}")
+            with self._lock:
+                self.stats['shared_errors'] += 1
+            return {}
+
+        return {signature: json.loads(item['recommendation']) for signature, item in items.items()
+                if int(item.get('ttl', 0)) > now}
+
+    def _put_shared(self, signature, value, expires_at):
+        table = self._table()
+        if table is None:
+            return
+
+        try:
+            table.put_item(Item={
+                'signature': signature,
+                'recommendation': json.dumps(value),
+                'ttl': int(expires_at)
+            })
+        except Exception as e:
+            print(f"Erro gravando cache compartilhado: {str(e)}")
+            with self._lock:
+                self.stats['shared_errors'] += 1
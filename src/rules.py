@@ -0,0 +1,136 @@
+import threading
+
+# Limite de 128KB abaixo do qual STANDARD_IA/GLACIER cobram como se o objeto tivesse 128KB
+MIN_IA_SIZE = 128 * 1024
+
+# Tabela de regras avaliada em ordem; a primeira que casar decide
+# Campos opcionais: max_size, min_size, extensions (file_type), suffixes (final do nome)
+DEFAULT_RULES = [
+    {
+        'name': 'small_object',
+        'max_size': MIN_IA_SIZE - 1,
+        'storage_class': 'STANDARD',
+        'score': 0.95,
+        'reasoning': 'Arquivo menor que 128KB não se beneficia de classes IA/arquivamento'
+    },
+    {
+        'name': 'backup_extension',
+        'extensions': frozenset(['bak', 'backup', 'dump', 'snapshot', 'old']),
+        'storage_class': 'GLACIER',
+        'score': 0.9,
+        'reasoning': 'Arquivo de backup, acesso raro esperado'
+    },
+    {
+        'name': 'backup_archive',
+        'suffixes': ('.sql.gz', '.dump.gz', '.bak.gz', '.tar.gz', '.tgz'),
+        'storage_class': 'GLACIER',
+        'score': 0.9,
+        'reasoning': 'Backup compactado, acesso raro esperado'
+    },
+    {
+        'name': 'log_extension',
+        'extensions': frozenset(['log']),
+        'suffixes': ('.log.gz', '.log.bz2', '.log.zst'),
+        'storage_class': 'GLACIER',
+        'score': 0.9,
+        'reasoning': 'Arquivo de log, acessado apenas para auditoria'
+    }
+]
+
+
+# Heurística usada quando o Bedrock está indisponível (circuito aberto): completa as
+# regras acima com palpites por tipo de arquivo e, na dúvida, mantém STANDARD (sem transição)
+HEURISTIC_RULES = DEFAULT_RULES + [
+    {
+        'name': 'document_extension',
+        'extensions': frozenset(['pdf', 'doc', 'docx', 'xls', 'xlsx', 'ppt', 'pptx', 'odt', 'csv', 'txt']),
+        'storage_class': 'STANDARD_IA',
+        'score': 0.6,
+        'reasoning': 'Documento, acesso infrequente esperado (heurística local)'
+    },
+    {
+        'name': 'archive_extension',
+        'extensions': frozenset(['zip', 'gz', 'tgz', 'bz2', 'xz', 'zst', '7z', 'rar', 'tar', 'parquet', 'orc']),
+        'storage_class': 'STANDARD_IA',
+        'score': 0.6,
+        'reasoning': 'Arquivo compactado ou de dados, acesso infrequente esperado (heurística local)'
+    },
+    {
+        'name': 'default',
+        'storage_class': 'STANDARD',
+        'score': 0.5,
+        'reasoning': 'Sem análise do modelo; classe mantida até reavaliação (heurística local)'
+    }
+]
+
+
+def _matches(rule, file_size, file_type, file_name):
+    if 'max_size' in rule and file_size > rule['max_size']:
+        return False
+    if 'min_size' in rule and file_size < rule['min_size']:
+        return False
+
+    if 'extensions' in rule or 'suffixes' in rule:
+        if file_type in rule.get('extensions', ()):
+            return True
+        return file_name.endswith(rule.get('suffixes', ()))
+
+    return True
+
+
+def score_to_confidence(score):
+    """Converte o score numérico no rótulo usado pelo Bedrock"""
+
+    if score >= 0.85:
+        return 'alta'
+    if score >= 0.6:
+        return 'média'
+    return 'baixa'
+
+
+class RuleEngine:
+    """Classificador determinístico que decide casos óbvios sem chamar o Bedrock"""
+
+    def __init__(self, rules=None, min_score=0.9, source='rules'):
+        self.rules = rules if rules is not None else DEFAULT_RULES
+        self.min_score = min_score
+        self.source = source
+        self._lock = threading.Lock()
+        self.stats = {rule['name']: 0 for rule in self.rules}
+        self.stats['escalated'] = 0
+
+    def classify(self, file_metadata):
+        """Retorna uma recomendação se alguma regra for confiável, senão None"""
+
+        file_size = file_metadata['file_size']
+        file_type = str(file_metadata.get('file_type', 'unknown')).lower()
+        file_name = str(file_metadata.get('file_name', '')).lower()
+
+        for rule in self.rules:
+            if rule['score'] < self.min_score:
+                continue
+            if not _matches(rule, file_size, file_type, file_name):
+                continue
+
+            with self._lock:
+                self.stats[rule['name']] += 1
+
+            return {
+                'storage_class': rule['storage_class'],
+                'reasoning': rule['reasoning'],
+                'confidence': score_to_confidence(rule['score']),
+                'confidence_score': rule['score'],
+                'rule': rule['name'],
+                'source': self.source
+            }
+
+        with self._lock:
+            self.stats['escalated'] += 1
+        return None
+
+    def reset_stats(self):
+        """Zera os contadores por regra"""
+
+        with self._lock:
+            for name in self.stats:
+                self.stats[name] = 0
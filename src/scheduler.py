@@ -0,0 +1,155 @@
+import zlib
+from datetime import datetime, timezone
+from decimal import Decimal
+
+# Índice global da tabela: partição = faixa de tempo (+ shard), ordenação = instante devido
+DUE_INDEX = 'due-index'
+
+
+def parse_windows(spec):
+    """
+    Converte "22:00-06:00,13:00-14:00" (UTC) em [(início, fim)] em minutos do dia.
+    Janelas que passam da meia-noite são permitidas; vazio = sem restrição
+    """
+
+    windows = []
+    for part in filter(None, (chunk.strip() for chunk in (spec or '').split(','))):
+        start, _, end = part.partition('-')
+        minutes = []
+        for value in (start, end):
+            hours, _, mins = value.strip().partition(':')
+            minutes.append(int(hours) * 60 + int(mins or 0))
+        windows.append(tuple(minutes))
+    return windows
+
+
+def in_window(timestamp, windows):
+    """Indica se o instante (epoch, UTC) cai em alguma das janelas"""
+
+    if not windows:
+        return True
+
+    moment = datetime.fromtimestamp(timestamp, timezone.utc)
+    minute = moment.hour * 60 + moment.minute
+    for start, end in windows:
+        if start <= end and start <= minute < end:
+            return True
+        if start > end and (minute >= start or minute < end):
+            return True
+    return False
+
+
+def _plain(value):
+    """Decimal do DynamoDB para int/float (o cursor é serializado em JSON no checkpoint)"""
+
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, dict):
+        return {key: _plain(item) for key, item in value.items()}
+    return value
+
+
+class TransitionSchedule:
+    """
+    Transições adiadas numa tabela DynamoDB (chave object_id). O instante devido é
+    indexado por faixas de `bucket_seconds` divididas em `shards` partições, para
+    espalhar as escritas de uma mesma hora e consultar só as faixas já vencidas
+    """
+
+    def __init__(self, table_provider, bucket_seconds=3600, shards=4, index_name=DUE_INDEX):
+        self.table_provider = table_provider
+        self.bucket_seconds = bucket_seconds
+        self.shards = shards
+        self.index_name = index_name
+
+    def bucket_of(self, timestamp):
+        """Início (epoch) da faixa que contém o instante"""
+
+        return int(timestamp // self.bucket_seconds) * self.bucket_seconds
+
+    def label(self, bucket, shard):
+        stamp = datetime.fromtimestamp(bucket, timezone.utc).strftime('%Y%m%dT%H%M')
+        return f"{stamp}#{shard}"
+
+    def shard_of(self, object_id):
+        return zlib.crc32(object_id.encode('utf-8')) % self.shards
+
+    def schedule(self, entries):
+        """Grava (ou substitui) as transições; cada entrada precisa de object_id e due_at"""
+
+        table = self.table_provider()
+        with table.batch_writer(overwrite_by_pkeys=['object_id']) as writer:
+            for entry in entries:
+                due_at = int(entry['due_at'])
+                item = dict(entry, due_at=due_at,
+                            due_bucket=self.label(self.bucket_of(due_at), self.shard_of(entry['object_id'])))
+                writer.put_item(Item=item)
+
+    def complete(self, object_ids):
+        """Remove as transições aplicadas ou descartadas"""
+
+        table = self.table_provider()
+        with table.batch_writer() as writer:
+            for object_id in object_ids:
+                writer.delete_item(Key={'object_id': object_id})
+
+    def reschedule(self, items, due_at):
+        """Move as transições para um instante futuro (falhas tentadas de novo depois)"""
+
+        self.schedule([dict(item, due_at=due_at, attempts=int(item.get('attempts', 0)) + 1) for item in items])
+
+    def query_due(self, bucket, shard, now, page_size, after=None):
+        """Uma página das transições vencidas de uma faixa/shard: (itens, cursor ou None)"""
+
+        params = {
+            'IndexName': self.index_name,
+            'KeyConditionExpression': 'due_bucket = :bucket AND due_at <= :now',
+            'ExpressionAttributeValues': {':bucket': self.label(bucket, shard), ':now': int(now)},
+            'Limit': page_size
+        }
+        if after:
+            params['ExclusiveStartKey'] = after
+
+        response = self.table_provider().query(**params)
+        return [_plain(item) for item in response.get('Items', [])], _plain(response.get('LastEvaluatedKey'))
+
+
+def sweep_due(schedule, state, now, handle_page, on_checkpoint=None, should_stop=None, page_size=500):
+    """
+    Percorre as faixas vencidas desde state['watermark'] até a faixa atual, shard a shard,
+    entregando páginas de até page_size itens a handle_page (que aplica, descarta ou
+    reagenda cada item). O cursor (faixa, shard, ExclusiveStartKey) fica em `state` e
+    é salvo após cada página: uma nova execução retoma de onde parou.
+    Retorna True quando todas as faixas vencidas foram percorridas
+    """
+
+    current = schedule.bucket_of(now)
+    state.setdefault('bucket', state['watermark'])
+    state.setdefault('shard', 0)
+    state.setdefault('after', None)
+
+    while state['bucket'] <= current:
+        if should_stop and should_stop():
+            return False
+
+        items, after = schedule.query_due(state['bucket'], state['shard'], now, page_size, state['after'])
+        if items:
+            handle_page(items)
+
+        if after:
+            state['after'] = after
+        else:
+            state['after'] = None
+            state['shard'] += 1
+            if state['shard'] >= schedule.shards:
+                state['shard'] = 0
+                state['bucket'] += schedule.bucket_seconds
+
+        if on_checkpoint:
+            on_checkpoint(state)
+
+    # Faixas anteriores à atual ficaram vazias (itens aplicados, descartados ou reagendados)
+    state.update(watermark=current, bucket=current, shard=0, after=None)
+    if on_checkpoint:
+        on_checkpoint(state)
+    return True
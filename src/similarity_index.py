@@ -0,0 +1,243 @@
+import math
+import threading
+import time
+import zlib
+
+# numpy é importado só quando o índice recebe a primeira entrada (_numpy): o import custa
+# cerca de 40ms e ficava no cold start de toda invocação
+np = None
+_numpy_loaded = False
+
+# Blocos do vetor: n-gramas da chave, faixa de tamanho (log2) e tipo (extensão + content type)
+KEY_DIMS = 128
+SIZE_DIMS = 64
+TYPE_DIMS = 16
+DIMS = KEY_DIMS + SIZE_DIMS + TYPE_DIMS
+
+# Peso de cada bloco na similaridade (soma 1)
+KEY_WEIGHT = 0.6
+SIZE_WEIGHT = 0.2
+TYPE_WEIGHT = 0.2
+
+# Sem numpy a busca percorre os vetores esparsos um a um (~7ms com 4096 entradas):
+# o índice fica limitado a este tamanho
+FALLBACK_MAX_ENTRIES = 1024
+
+
+def _numpy():
+    """Módulo numpy, importado na primeira chamada; None se indisponível"""
+
+    global np, _numpy_loaded
+    if not _numpy_loaded:
+        _numpy_loaded = True
+        try:
+            import numpy
+        except ImportError:  # numpy vem de src/requirements.txt; sem ele a busca é feita em Python puro
+            numpy = None
+        np = numpy
+    return np
+
+
+def _hash(text):
+    # crc32 é estável entre processos (hash() muda a cada execução), o que permite persistir o índice
+    return zlib.crc32(text.encode('utf-8'))
+
+
+def _key_block(object_key, ngram=3):
+    counts = {}
+    text = f"^{object_key.lower()}$"
+    for start in range(max(1, len(text) - ngram + 1)):
+        value = _hash(text[start:start + ngram])
+        dim = value % KEY_DIMS
+        # Sinal pelo hash reduz o viés das colisões
+        counts[dim] = counts.get(dim, 0.0) + (1.0 if value & 0x80000000 else -1.0)
+
+    norm = math.sqrt(sum(value * value for value in counts.values())) or 1.0
+    scale = math.sqrt(KEY_WEIGHT) / norm
+    return {dim: value * scale for dim, value in counts.items() if value}
+
+
+def _size_block(file_size):
+    # Faixa log2 com meio peso nas vizinhas: tamanhos próximos continuam parecidos
+    bucket = min(SIZE_DIMS - 1, int(file_size).bit_length())
+    weights = {bucket: 1.0}
+    for neighbour in (bucket - 1, bucket + 1):
+        if 0 <= neighbour < SIZE_DIMS:
+            weights[neighbour] = 0.5
+
+    scale = math.sqrt(SIZE_WEIGHT) / math.sqrt(sum(value * value for value in weights.values()))
+    return {KEY_DIMS + dim: value * scale for dim, value in weights.items()}
+
+
+def type_label(file_metadata):
+    """Tipo do objeto (extensão + content type): só objetos do mesmo tipo são comparados"""
+
+    content_type = str(file_metadata.get('content_type') or 'unknown').split(';')[0].strip().lower()
+    return f"{str(file_metadata.get('file_type') or 'unknown').lower()}|{content_type}"
+
+
+def _type_block(label):
+    return {KEY_DIMS + SIZE_DIMS + _hash(label) % TYPE_DIMS: math.sqrt(TYPE_WEIGHT)}
+
+
+def feature_vector(file_metadata):
+    """Vetor esparso {dimensão: valor} de norma 1: produto escalar = similaridade de cosseno"""
+
+    vector = _key_block(file_metadata['file_name'])
+    vector.update(_size_block(file_metadata['file_size']))
+    vector.update(_type_block(type_label(file_metadata)))
+    return vector
+
+
+class SimilarityIndex:
+    """
+    Índice das recomendações de alta confiança já obtidas, para reaproveitar a decisão
+    em objetos quase iguais (nome parecido, tamanho vizinho). Só entradas exatamente do
+    mesmo tipo são candidatas (o bloco de tipo do vetor usa hashing e pode colidir).
+    Guarda até max_entries vetores (os mais antigos são substituídos) numa matriz numpy
+    com busca vetorizada; sem numpy a busca é feita sobre os vetores esparsos e o
+    índice fica limitado a FALLBACK_MAX_ENTRIES
+    """
+
+    def __init__(self, max_entries=4096, threshold=0.85):
+        self.threshold = threshold
+        self._requested_entries = max_entries
+        self._max_entries = None
+        self._entries = []
+        self._vectors = []
+        self._by_type = {}
+        self._next = 0
+        self._matrix = None
+        self._lock = threading.Lock()
+        self.dirty = False
+        self.stats = {'lookups': 0, 'hits': 0, 'added': 0, 'lookup_ms': 0.0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def max_entries(self):
+        """Capacidade do índice, definida (com a matriz) no primeiro uso para adiar o import do numpy"""
+
+        if self._max_entries is None:
+            numpy = _numpy()
+            if numpy is not None:
+                self._matrix = numpy.zeros((self._requested_entries, DIMS), dtype=numpy.float32)
+                self._max_entries = self._requested_entries
+            else:
+                self._max_entries = min(self._requested_entries, FALLBACK_MAX_ENTRIES)
+        return self._max_entries
+
+    def add(self, file_metadata, recommendation):
+        """Indexa a recomendação do objeto (só respostas com confiança alta)"""
+
+        if recommendation.get('confidence') != 'alta' or recommendation.get('source') == 'heuristic':
+            return
+
+        entry = {
+            'file_name': file_metadata['file_name'],
+            'file_size': int(file_metadata['file_size']),
+            'file_type': file_metadata.get('file_type', 'unknown'),
+            'content_type': file_metadata.get('content_type', 'unknown'),
+            'recommendation': {
+                'storage_class': recommendation['storage_class'],
+                'reasoning': recommendation.get('reasoning', ''),
+                'confidence': recommendation['confidence']
+            }
+        }
+        vector = feature_vector(entry)
+        label = type_label(entry)
+
+        with self._lock:
+            capacity = self.max_entries
+            position = self._next
+            if position < len(self._entries):
+                self._by_type[type_label(self._entries[position])].discard(position)
+                self._entries[position], self._vectors[position] = entry, vector
+            else:
+                self._entries.append(entry)
+                self._vectors.append(vector)
+            self._by_type.setdefault(label, set()).add(position)
+            if self._matrix is not None:
+                row = self._matrix[position]
+                row.fill(0.0)
+                for dim, value in vector.items():
+                    row[dim] = value
+            self._next = (position + 1) % capacity
+            self.stats['added'] += 1
+            self.dirty = True
+
+    def lookup(self, file_metadata):
+        """Recomendação do vizinho mais próximo se a similaridade passar do limiar, senão None"""
+
+        started = time.perf_counter()
+        query = feature_vector(file_metadata)
+
+        with self._lock:
+            best, similarity = self._nearest(query, self._by_type.get(type_label(file_metadata)))
+            entry = self._entries[best] if best is not None else None
+            self.stats['lookups'] += 1
+            self.stats['lookup_ms'] += (time.perf_counter() - started) * 1000
+            if entry is None or similarity < self.threshold:
+                return None
+            self.stats['hits'] += 1
+
+        return dict(entry['recommendation'], source='similar', similarity=round(similarity, 4),
+                    similar_to=entry['file_name'])
+
+    def _nearest(self, query, candidates):
+        if not candidates:
+            return None, 0.0
+
+        if self._matrix is not None:
+            rows = np.fromiter(candidates, dtype=np.intp, count=len(candidates))
+            dims = np.fromiter(query.keys(), dtype=np.intp, count=len(query))
+            values = np.fromiter(query.values(), dtype=np.float32, count=len(query))
+            # Só as linhas do mesmo tipo e as colunas não nulas da consulta entram no produto
+            scores = self._matrix[np.ix_(rows, dims)] @ values
+            best = int(np.argmax(scores))
+            return int(rows[best]), float(scores[best])
+
+        best, best_score = None, -1.0
+        for position in candidates:
+            vector = self._vectors[position]
+            score = sum(value * vector.get(dim, 0.0) for dim, value in query.items())
+            if score > best_score:
+                best, best_score = position, score
+        return best, best_score
+
+    def snapshot(self):
+        """Entradas em ordem de inserção (a mais antiga primeiro), para persistir o índice"""
+
+        with self._lock:
+            self.dirty = False
+            return self._entries[self._next:] + self._entries[:self._next]
+
+    def restore(self, entries):
+        """Reconstrói o índice a partir de um snapshot"""
+
+        for entry in entries[-self.max_entries:]:
+            self.add(entry, entry['recommendation'])
+        self.dirty = False
+
+    def metrics(self):
+        """Contadores e latência média de busca (ms)"""
+
+        with self._lock:
+            lookups = self.stats['lookups']
+            return dict(
+                self.stats,
+                entries=len(self._entries),
+                lookup_ms=round(self.stats['lookup_ms'], 2),
+                avg_lookup_ms=round(self.stats['lookup_ms'] / lookups, 4) if lookups else 0.0
+            )
+
+    def clear(self):
+        with self._lock:
+            self._entries, self._vectors, self._next = [], [], 0
+            self._by_type = {}
+            if self._matrix is not None:
+                self._matrix.fill(0.0)
+            for name in self.stats:
+                self.stats[name] = 0
+            self.dirty = False
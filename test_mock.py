@@ -63,8 +63,8 @@ def test_lambda_handler_mock(mock_dynamodb, mock_bedrock, mock_s3):
     mock_s3.head_object.return_value = create_mock_head_object_response()
     mock_bedrock.invoke_model.return_value = create_mock_bedrock_response()
     
-    mock_table = Mock()
-    mock_dynamodb.Table.return_value = mock_table
+    mock_dynamodb.batch_get_item.return_value = {'Responses': {'test-table': []}}
+    mock_dynamodb.batch_write_item.return_value = {'UnprocessedItems': {}}
     
     # Importar após configurar mocks
     from src.lambda_function import lambda_handler
@@ -73,7 +73,8 @@ def test_lambda_handler_mock(mock_dynamodb, mock_bedrock, mock_s3):
     event = create_mock_s3_event()
     context = {}
     
-    with patch.dict(os.environ, {'DYNAMODB_TABLE': 'test-table'}):
+    with patch('src.lambda_function.TABLE_NAME', 'test-table'), \
+            patch('src.lambda_function.insight_sink.table_name', 'test-table'):
         result = lambda_handler(event, context)
     
     # Verificar resultado
@@ -82,9 +83,9 @@ def test_lambda_handler_mock(mock_dynamodb, mock_bedrock, mock_s3):
     # Verificar chamadas
     mock_s3.head_object.assert_called_once()
     mock_bedrock.invoke_model.assert_called_once()
-    mock_table.put_item.assert_called_once()
+    mock_dynamodb.batch_write_item.assert_called_once()
     mock_s3.copy_object.assert_called_once()
-    mock_s3.put_object_tagging.assert_called_once()
+    mock_s3.put_object_tagging.assert_not_called()
     
     print("✅ Teste lambda_handler passou!")
 
@@ -128,42 +129,6 @@ def test_analyze_with_bedrock_mock():
         
         print("✅ Teste analyze_with_bedrock passou!")
 
-def test_save_insight_to_dynamodb_mock():
-    """Teste da função save_insight_to_dynamodb"""
-    
-    with patch('src.lambda_function.dynamodb') as mock_dynamodb:
-        mock_table = Mock()
-        mock_dynamodb.Table.return_value = mock_table
-        
-        from src.lambda_function import save_insight_to_dynamodb
-        
-        file_metadata = {
-            'file_name': 'documento.pdf',
-            'file_size': 2048000,
-            'file_type': 'pdf',
-            'content_type': 'application/pdf',
-            'storage_class': 'STANDARD'
-        }
-        
-        recommendation = {
-            'storage_class': 'STANDARD_IA',
-            'reasoning': 'Teste',
-            'confidence': 'alta'
-        }
-        
-        # Configurar variável de ambiente antes de importar
-        with patch.dict(os.environ, {'DYNAMODB_TABLE': 'test-table'}):
-            # Reimportar para pegar nova variável
-            import importlib
-            import src.lambda_function
-            importlib.reload(src.lambda_function)
-            
-            src.lambda_function.save_insight_to_dynamodb('test-bucket', 'documento.pdf', file_metadata, recommendation)
-        
-        mock_table.put_item.assert_called_once()
-        
-        print("✅ Teste save_insight_to_dynamodb passou!")
-
 def test_apply_storage_class_mock():
     """Teste da função apply_storage_class"""
     
@@ -178,11 +143,12 @@ def test_apply_storage_class_mock():
         apply_storage_class('test-bucket', 'documento.pdf', recommendation, 2048000)
         
         mock_s3.copy_object.assert_called_once()
-        mock_s3.put_object_tagging.assert_called_once()
+        mock_s3.put_object_tagging.assert_not_called()
         
-        # Verificar parâmetros do copy_object
+        # Verificar parâmetros do copy_object (tags gravadas na própria cópia)
         copy_call = mock_s3.copy_object.call_args
         assert copy_call[1]['StorageClass'] == 'STANDARD_IA'
+        assert 'RecommendedClass=STANDARD_IA' in copy_call[1]['Tagging']
         assert copy_call[1]['Metadata']['file-size-bytes'] == '2048000'
         
         print("✅ Teste apply_storage_class passou!")
@@ -195,7 +161,6 @@ def run_all_tests():
     try:
         test_get_file_metadata_mock()
         test_analyze_with_bedrock_mock()
-        test_save_insight_to_dynamodb_mock()
         test_apply_storage_class_mock()
         test_lambda_handler_mock()
         
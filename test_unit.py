@@ -7,6 +7,7 @@ import unittest
 import json
 import os
 import sys
+import urllib.parse
 from unittest.mock import Mock, patch, MagicMock
 from datetime import datetime
 
@@ -35,6 +36,11 @@ class TestS3Optimizer(unittest.TestCase):
             'reasoning': 'Arquivo PDF de tamanho médio',
             'confidence': 'alta'
         }
+        
+        # Evitar que recomendações cacheadas por outros testes mascarem chamadas ao Bedrock
+        from src.lambda_function import recommendation_cache, similarity_index
+        recommendation_cache.clear()
+        similarity_index.clear()
 
     @patch('src.lambda_function.s3_client')
     def test_get_file_metadata(self, mock_s3):
@@ -93,35 +99,6 @@ class TestS3Optimizer(unittest.TestCase):
         self.assertEqual(result['storage_class'], 'STANDARD_IA')
         self.assertEqual(result['confidence'], 'baixa')
 
-    @patch('src.lambda_function.dynamodb')
-    def test_save_insight_to_dynamodb(self, mock_dynamodb):
-        """Testa salvamento no DynamoDB"""
-        
-        mock_table = Mock()
-        mock_dynamodb.Table.return_value = mock_table
-        
-        from src.lambda_function import save_insight_to_dynamodb
-        
-        with patch.dict(os.environ, {'DYNAMODB_TABLE': 'test-table'}):
-            save_insight_to_dynamodb('bucket', 'key', self.sample_metadata, self.sample_recommendation)
-        
-        mock_table.put_item.assert_called_once()
-        
-        # Verificar estrutura do item
-        call_args = mock_table.put_item.call_args[1]['Item']
-        self.assertEqual(call_args['file_id'], 'bucket/key')
-        self.assertEqual(call_args['recommended_storage_class'], 'STANDARD_IA')
-
-    @patch('src.lambda_function.dynamodb')
-    def test_save_insight_no_table(self, mock_dynamodb):
-        """Testa salvamento sem tabela configurada"""
-        
-        from src.lambda_function import save_insight_to_dynamodb
-        
-        with patch.dict(os.environ, {}, clear=True):
-            # Não deve gerar erro
-            save_insight_to_dynamodb('bucket', 'key', self.sample_metadata, self.sample_recommendation)
-
     @patch('src.lambda_function.s3_client')
     def test_apply_storage_class(self, mock_s3):
         """Testa aplicação da classe de armazenamento"""
@@ -136,12 +113,43 @@ class TestS3Optimizer(unittest.TestCase):
         self.assertEqual(copy_args['StorageClass'], 'STANDARD_IA')
         self.assertEqual(copy_args['Metadata']['file-size-bytes'], '1048576')
         
-        # Verificar tagging
-        mock_s3.put_object_tagging.assert_called_once()
-        tag_args = mock_s3.put_object_tagging.call_args[1]
-        tags = {tag['Key']: tag['Value'] for tag in tag_args['Tagging']['TagSet']}
+        # Verificar tagging na própria cópia
+        mock_s3.put_object_tagging.assert_not_called()
+        self.assertEqual(copy_args['TaggingDirective'], 'REPLACE')
+        tags = dict(urllib.parse.parse_qsl(copy_args['Tagging']))
         self.assertEqual(tags['RecommendedClass'], 'STANDARD_IA')
         self.assertEqual(tags['FileSizeBytes'], '1048576')
+    
+    @patch('src.lambda_function.s3_client')
+    def test_apply_storage_class_preserves_headers(self, mock_s3):
+        """Testa que a cópia simples com REPLACE mantém cabeçalhos e metadados de usuário da origem"""
+        
+        from src.lambda_function import apply_storage_class
+        
+        mock_s3.head_object.return_value = {
+            'ContentType': 'application/json', 'ContentEncoding': 'gzip', 'CacheControl': 'max-age=60',
+            'ServerSideEncryption': 'aws:kms', 'SSEKMSKeyId': 'chave', 'Metadata': {'owner': 'time-dados'}
+        }
+        
+        apply_storage_class('bucket', 'key', self.sample_recommendation, 1048576)
+        
+        mock_s3.head_object.assert_called_once_with(Bucket='bucket', Key='key')
+        copy_args = mock_s3.copy_object.call_args[1]
+        self.assertEqual(copy_args['MetadataDirective'], 'REPLACE')
+        self.assertEqual(copy_args['ContentType'], 'application/json')
+        self.assertEqual(copy_args['ContentEncoding'], 'gzip')
+        self.assertEqual(copy_args['CacheControl'], 'max-age=60')
+        self.assertEqual(copy_args['SSEKMSKeyId'], 'chave')
+        self.assertEqual(copy_args['Metadata']['owner'], 'time-dados')
+        self.assertEqual(copy_args['Metadata']['optimized-by'], 'S3Optimizer')
+        
+        # Atributos já coletados no head_object da análise dispensam um segundo head
+        mock_s3.reset_mock()
+        apply_storage_class('bucket', 'key', self.sample_recommendation, 1048576,
+                            {'ContentType': 'text/csv', 'Metadata': {}})
+        
+        mock_s3.head_object.assert_not_called()
+        self.assertEqual(mock_s3.copy_object.call_args[1]['ContentType'], 'text/csv')
 
     @patch('src.lambda_function.s3_client')
     @patch('src.lambda_function.bedrock_client')
@@ -165,8 +173,8 @@ class TestS3Optimizer(unittest.TestCase):
             }).encode())
         }
         
-        mock_table = Mock()
-        mock_dynamodb.Table.return_value = mock_table
+        mock_dynamodb.batch_get_item.return_value = {'Responses': {'test-table': []}}
+        mock_dynamodb.batch_write_item.return_value = {'UnprocessedItems': {}}
         
         # Evento de teste
         event = {
@@ -178,9 +186,10 @@ class TestS3Optimizer(unittest.TestCase):
             }]
         }
         
-        from src.lambda_function import lambda_handler
+        from src.lambda_function import lambda_handler, insight_sink
         
-        with patch.dict(os.environ, {'DYNAMODB_TABLE': 'test-table'}):
+        with patch('src.lambda_function.TABLE_NAME', 'test-table'), \
+                patch.object(insight_sink, 'table_name', 'test-table'):
             result = lambda_handler(event, {})
         
         self.assertEqual(result['statusCode'], 200)
@@ -188,9 +197,10 @@ class TestS3Optimizer(unittest.TestCase):
         # Verificar todas as chamadas
         mock_s3.head_object.assert_called_once()
         mock_bedrock.invoke_model.assert_called_once()
-        mock_table.put_item.assert_called_once()
+        mock_dynamodb.batch_get_item.assert_called_once()
+        mock_dynamodb.batch_write_item.assert_called_once()
         mock_s3.copy_object.assert_called_once()
-        mock_s3.put_object_tagging.assert_called_once()
+        mock_s3.put_object_tagging.assert_not_called()
 
     def test_size_conversion_logic(self):
         """Testa lógica de conversão de tamanho"""
@@ -260,6 +270,2682 @@ class TestEdgeCases(unittest.TestCase):
             result = get_file_metadata('bucket', 'arquivo_sem_extensao')
             self.assertEqual(result['file_type'], 'unknown')
 
+class TestRecommendationCache(unittest.TestCase):
+    """Testes do cache de recomendações"""
+    
+    def setUp(self):
+        self.metadata = {
+            'file_name': 'exports/part-00001.parquet',
+            'file_size': 5 * 1024 * 1024,
+            'file_type': 'parquet',
+            'content_type': 'application/octet-stream',
+            'storage_class': 'STANDARD'
+        }
+        self.recommendation = {
+            'storage_class': 'GLACIER',
+            'reasoning': 'Export analítico',
+            'confidence': 'alta'
+        }
+
+    def test_signature_normalization(self):
+        """Testa que arquivos equivalentes compartilham a mesma assinatura"""
+        
+        from recommendation_cache import build_signature
+        
+        other = dict(self.metadata, file_name='exports/part-00002.parquet', file_size=6 * 1024 * 1024,
+                     content_type='Application/Octet-Stream; charset=binary')
+        self.assertEqual(build_signature(self.metadata), build_signature(other))
+        
+        # 128KB inicia uma nova faixa de tamanho
+        small = dict(self.metadata, file_size=128 * 1024 - 1)
+        limit = dict(self.metadata, file_size=128 * 1024)
+        self.assertNotEqual(build_signature(small), build_signature(limit))
+
+    def test_local_lru_hit_and_eviction(self):
+        """Testa hits locais e despejo LRU"""
+        
+        from recommendation_cache import RecommendationCache
+        
+        cache = RecommendationCache(max_entries=1)
+        self.assertIsNone(cache.get(self.metadata))
+        
+        cache.put(self.metadata, self.recommendation)
+        result = cache.get(self.metadata)
+        self.assertEqual(result['storage_class'], 'GLACIER')
+        self.assertEqual(result['source'], 'cache')
+        
+        cache.put(dict(self.metadata, file_type='pdf'), self.recommendation)
+        self.assertIsNone(cache.get(self.metadata))
+        self.assertEqual(cache.stats['local_hits'], 1)
+        self.assertEqual(cache.stats['misses'], 2)
+
+    def test_low_confidence_not_cached(self):
+        """Testa que fallbacks de baixa confiança não entram no cache"""
+        
+        from recommendation_cache import RecommendationCache
+        
+        cache = RecommendationCache()
+        cache.put(self.metadata, dict(self.recommendation, confidence='baixa'))
+        self.assertIsNone(cache.get(self.metadata))
+
+    def test_shared_layer_hit_and_expiry(self):
+        """Testa a camada DynamoDB compartilhada e a validação de TTL"""
+        
+        from recommendation_cache import RecommendationCache
+        
+        mock_table = Mock()
+        mock_table.get_item.return_value = {'Item': {
+            'recommendation': json.dumps(self.recommendation),
+            'ttl': int(datetime.now().timestamp()) + 3600
+        }}
+        cache = RecommendationCache(table_provider=lambda: mock_table)
+        
+        self.assertEqual(cache.get(self.metadata)['storage_class'], 'GLACIER')
+        self.assertEqual(cache.stats['shared_hits'], 1)
+        
+        # Segundo acesso é servido pela camada local
+        cache.get(self.metadata)
+        self.assertEqual(cache.stats['local_hits'], 1)
+        mock_table.get_item.assert_called_once()
+        
+        expired = RecommendationCache(table_provider=lambda: mock_table)
+        mock_table.get_item.return_value['Item']['ttl'] = 1
+        self.assertIsNone(expired.get(self.metadata))
+    
+    def test_shared_layer_batch_read(self):
+        """Testa que vários arquivos consultam a camada compartilhada numa única leitura em lote"""
+        
+        from recommendation_cache import RecommendationCache, build_signature
+        
+        others = [dict(self.metadata, file_size=size) for size in (2 ** 20, 2 ** 24, 2 ** 24)]
+        stored = {build_signature(others[0]): {
+            'signature': build_signature(others[0]),
+            'recommendation': json.dumps(self.recommendation),
+            'ttl': int(datetime.now().timestamp()) + 3600
+        }}
+        reader = Mock(side_effect=lambda signatures: {key: stored[key] for key in signatures if key in stored})
+        mock_table = Mock()
+        cache = RecommendationCache(table_provider=lambda: mock_table, batch_reader=reader)
+        
+        found = cache.get_many(others)
+        self.assertEqual(found[0]['storage_class'], 'GLACIER')
+        self.assertEqual(found[1:], [None, None])
+        reader.assert_called_once()
+        self.assertEqual(len(reader.call_args[0][0]), 2)
+        mock_table.get_item.assert_not_called()
+        self.assertEqual((cache.stats['shared_hits'], cache.stats['misses']), (1, 2))
+        
+        # A assinatura encontrada passa a ser servida pela camada local
+        cache.get_many(others[:1])
+        self.assertEqual(cache.stats['local_hits'], 1)
+        reader.assert_called_once()
+
+    @patch('src.lambda_function.bedrock_client')
+    def test_get_recommendations_uses_cache(self, mock_bedrock):
+        """Testa que o Bedrock é chamado uma única vez por assinatura"""
+        
+        mock_bedrock.invoke_model.return_value = {
+            'body': Mock(read=lambda: json.dumps({
+                'content': [{'text': json.dumps(self.recommendation)}]
+            }).encode())
+        }
+        
+        from src.lambda_function import get_recommendations, recommendation_cache
+        recommendation_cache.clear()
+        
+        # Sem o memo por template, que responderia antes do cache
+        with patch('src.lambda_function.KEY_TEMPLATES', False):
+            first = get_recommendations([self.metadata])[0]
+            second = get_recommendations([dict(self.metadata, file_name='exports/part-00002.parquet')])[0]
+        
+        self.assertEqual(first['storage_class'], 'GLACIER')
+        self.assertEqual(second['source'], 'cache')
+        mock_bedrock.invoke_model.assert_called_once()
+
+class TestRuleEngine(unittest.TestCase):
+    """Testes do classificador determinístico"""
+    
+    def _metadata(self, file_name, file_size):
+        file_type = file_name.split('.')[-1].lower() if '.' in file_name else 'unknown'
+        return {'file_name': file_name, 'file_size': file_size, 'file_type': file_type,
+                'content_type': 'application/octet-stream', 'storage_class': 'STANDARD'}
+
+    def test_small_object_stays_standard(self):
+        """Testa que objetos <128KB nunca vão para STANDARD_IA"""
+        
+        from rules import RuleEngine
+        
+        engine = RuleEngine()
+        result = engine.classify(self._metadata('backup.bak', 1024))
+        
+        self.assertEqual(result['storage_class'], 'STANDARD')
+        self.assertEqual(result['rule'], 'small_object')
+        self.assertEqual(engine.stats['small_object'], 1)
+
+    def test_backup_and_log_go_to_glacier(self):
+        """Testa regras de extensão para backups e logs"""
+        
+        from rules import RuleEngine
+        
+        engine = RuleEngine()
+        for name in ['db.bak', 'dump/2025.sql.gz', 'app.log', 'logs/app.log.gz']:
+            result = engine.classify(self._metadata(name, 10 * 1024 * 1024))
+            self.assertEqual(result['storage_class'], 'GLACIER', name)
+            self.assertEqual(result['source'], 'rules')
+        
+        self.assertEqual(engine.stats['log_extension'], 2)
+        self.assertEqual(engine.stats['escalated'], 0)
+
+    def test_escalates_when_not_confident(self):
+        """Testa escalonamento para o Bedrock quando nenhuma regra é confiável"""
+        
+        from rules import RuleEngine
+        
+        engine = RuleEngine(min_score=0.99)
+        self.assertIsNone(engine.classify(self._metadata('app.log', 10 * 1024 * 1024)))
+        self.assertIsNone(RuleEngine().classify(self._metadata('documento.pdf', 1048576)))
+        self.assertEqual(engine.stats['escalated'], 1)
+
+    @patch('src.lambda_function.bedrock_client')
+    def test_get_recommendations_skips_bedrock(self, mock_bedrock):
+        """Testa que regras confiáveis evitam a chamada ao modelo"""
+        
+        from src.lambda_function import get_recommendations
+        
+        result = get_recommendations([self._metadata('logs/app.log', 10 * 1024 * 1024)])[0]
+        
+        self.assertEqual(result['storage_class'], 'GLACIER')
+        mock_bedrock.invoke_model.assert_not_called()
+
+class TestBatchAnalysis(unittest.TestCase):
+    """Testes da análise em lote com Bedrock"""
+    
+    def setUp(self):
+        from src.lambda_function import recommendation_cache, similarity_index
+        recommendation_cache.clear()
+        similarity_index.clear()
+        
+        self.metadata_list = [
+            {'file_name': f'dados/arquivo.{ext}', 'file_size': 10 * 1024 * 1024, 'file_type': ext,
+             'content_type': 'application/octet-stream', 'storage_class': 'STANDARD'}
+            for ext in ['pdf', 'parquet', 'mp4']
+        ]
+
+    def _bedrock_response(self, text):
+        return {'body': Mock(read=lambda: json.dumps({'content': [{'text': text}]}).encode())}
+
+    def test_parse_batch_response(self):
+        """Testa o mapeamento de entradas do array para cada arquivo"""
+        
+        from src.lambda_function import parse_batch_response
+        
+        content = 'Segue a análise: [' \
+            '{"index": 1, "storage_class": "GLACIER", "reasoning": "x", "confidence": "alta"}, ' \
+            '{"index": 0, "storage_class": "FOO", "reasoning": "x", "confidence": "alta"}, ' \
+            '{"index": 7, "storage_class": "STANDARD", "reasoning": "x", "confidence": "alta"}, ' \
+            '"texto"]'
+        
+        result = parse_batch_response(content, 3)
+        
+        self.assertEqual(list(result.keys()), [1])
+        self.assertEqual(result[1]['storage_class'], 'GLACIER')
+
+    @patch('src.lambda_function.bedrock_client')
+    def test_throttled_batch_is_deferred(self, mock_bedrock):
+        """Testa que throttling no lote não gera escalonamento nem chamadas individuais"""
+        
+        from botocore.exceptions import ClientError
+        from src.lambda_function import get_recommendations
+        
+        mock_bedrock.invoke_model.side_effect = ClientError(
+            {'Error': {'Code': 'ThrottlingException', 'Message': 'Rate exceeded'}}, 'InvokeModel')
+        
+        with patch('src.lambda_function.TIERED_ANALYSIS', True):
+            result = get_recommendations(self.metadata_list)
+        
+        self.assertEqual(result, [None, None, None])
+        self.assertEqual(mock_bedrock.invoke_model.call_count, 1)
+    
+    @patch('src.lambda_function.bedrock_client')
+    def test_throttled_escalation_keeps_fast_answers(self, mock_bedrock):
+        """Testa que respostas do modelo rápido são mantidas quando a escalação sofre throttling"""
+        
+        from botocore.exceptions import ClientError
+        from src.lambda_function import get_recommendations
+        
+        batch_text = json.dumps([
+            {'index': 0, 'storage_class': 'STANDARD_IA', 'reasoning': 'Documento', 'confidence': 'alta'},
+            {'index': 2, 'storage_class': 'STANDARD', 'reasoning': 'Vídeo ativo', 'confidence': 'alta'}
+        ])
+        mock_bedrock.invoke_model.side_effect = [
+            self._bedrock_response(batch_text),
+            ClientError({'Error': {'Code': 'ThrottlingException', 'Message': 'Rate exceeded'}}, 'InvokeModel')
+        ]
+        
+        with patch('src.lambda_function.TIERED_ANALYSIS', True):
+            result = get_recommendations(self.metadata_list)
+        
+        self.assertEqual([r and r['storage_class'] for r in result], ['STANDARD_IA', None, 'STANDARD'])
+        self.assertEqual(mock_bedrock.invoke_model.call_count, 2)
+
+    @patch('src.lambda_function.bedrock_client')
+    def test_batch_with_per_item_fallback(self, mock_bedrock):
+        """Testa lote com entrada faltando e fallback individual"""
+        
+        batch_text = json.dumps([
+            {'index': 0, 'storage_class': 'STANDARD_IA', 'reasoning': 'Documento', 'confidence': 'alta'},
+            {'index': 2, 'storage_class': 'STANDARD', 'reasoning': 'Vídeo ativo', 'confidence': 'média'}
+        ])
+        single_text = json.dumps({'storage_class': 'GLACIER', 'reasoning': 'Export', 'confidence': 'alta'})
+        mock_bedrock.invoke_model.side_effect = [
+            self._bedrock_response(batch_text),
+            self._bedrock_response(single_text)
+        ]
+        
+        from src.lambda_function import get_recommendations
+        
+        result = get_recommendations(self.metadata_list)
+        
+        self.assertEqual([r['storage_class'] for r in result], ['STANDARD_IA', 'GLACIER', 'STANDARD'])
+        self.assertEqual(mock_bedrock.invoke_model.call_count, 2)
+        
+        # Prompt do lote contém todos os arquivos
+        prompt = json.loads(mock_bedrock.invoke_model.call_args_list[0][1]['body'])['messages'][0]['content']
+        for file_metadata in self.metadata_list:
+            self.assertIn(file_metadata['file_name'], prompt)
+
+    @patch('src.lambda_function.bedrock_client')
+    def test_batch_dedup_and_rules(self, mock_bedrock):
+        """Testa que regras e assinaturas repetidas não entram no lote"""
+        
+        mock_bedrock.invoke_model.return_value = self._bedrock_response(json.dumps(
+            {'storage_class': 'STANDARD_IA', 'reasoning': 'Documento', 'confidence': 'alta'}
+        ))
+        
+        from src.lambda_function import get_recommendations
+        
+        metadata_list = [
+            self.metadata_list[0],
+            dict(self.metadata_list[0], file_name='dados/outro.pdf'),
+            dict(self.metadata_list[0], file_name='app.log', file_type='log')
+        ]
+        result = get_recommendations(metadata_list)
+        
+        self.assertEqual(result[0]['storage_class'], 'STANDARD_IA')
+        self.assertEqual(result[1]['storage_class'], 'STANDARD_IA')
+        self.assertEqual(result[2]['source'], 'rules')
+        mock_bedrock.invoke_model.assert_called_once()
+
+    @patch('src.lambda_function.dynamodb')
+    @patch('src.lambda_function.bedrock_client')
+    def test_shared_cache_read_in_one_batch(self, mock_bedrock, mock_dynamodb):
+        """Testa que os arquivos do lote consultam o cache compartilhado num único batch_get_item"""
+        
+        import src.lambda_function as lf
+        from recommendation_cache import build_signature
+        
+        mock_dynamodb.batch_get_item.return_value = {'Responses': {'cache': [{
+            'signature': build_signature(self.metadata_list[1]),
+            'recommendation': json.dumps({'storage_class': 'GLACIER', 'reasoning': 'x', 'confidence': 'alta'}),
+            'ttl': int(datetime.now().timestamp()) + 3600
+        }]}}
+        mock_bedrock.invoke_model.return_value = self._bedrock_response(json.dumps([
+            {'index': 0, 'storage_class': 'STANDARD_IA', 'reasoning': 'Documento', 'confidence': 'alta'},
+            {'index': 1, 'storage_class': 'STANDARD', 'reasoning': 'Vídeo', 'confidence': 'alta'}
+        ]))
+        
+        with patch('src.lambda_function.CACHE_TABLE', 'cache'), patch('src.lambda_function.get_table') as get_table:
+            result = lf.get_recommendations(self.metadata_list)
+        
+        self.assertEqual([r['storage_class'] for r in result], ['STANDARD_IA', 'GLACIER', 'STANDARD'])
+        mock_dynamodb.batch_get_item.assert_called_once()
+        self.assertEqual(len(mock_dynamodb.batch_get_item.call_args[1]['RequestItems']['cache']['Keys']), 3)
+        get_table.return_value.get_item.assert_not_called()
+
+class TestConcurrentProcessing(unittest.TestCase):
+    """Testes do processamento concorrente de registros"""
+    
+    def _event(self, keys):
+        return {'Records': [
+            {'s3': {'bucket': {'name': 'test-bucket'}, 'object': {'key': key}}}
+            for key in keys
+        ]}
+
+    @patch('src.lambda_function.s3_client')
+    @patch('src.lambda_function.bedrock_client')
+    @patch('src.lambda_function.dynamodb')
+    def test_records_run_in_parallel(self, mock_dynamodb, mock_bedrock, mock_s3):
+        """Testa que o tempo total fica próximo do registro mais lento"""
+        
+        import time
+        
+        def slow_head(**kwargs):
+            time.sleep(0.1)
+            return {'ContentLength': 1024, 'ContentType': 'text/plain',
+                    'LastModified': datetime.now(), 'StorageClass': 'STANDARD_IA'}
+        
+        mock_s3.head_object.side_effect = slow_head
+        
+        from src.lambda_function import lambda_handler
+        
+        keys = [f'small-{i}.txt' for i in range(8)]
+        with patch('src.lambda_function.MAX_CONCURRENCY', 8):
+            started = time.time()
+            result = lambda_handler(self._event(keys), {})
+            elapsed = time.time() - started
+        
+        self.assertLess(elapsed, 0.5)
+        self.assertEqual([r['object_key'] for r in result['results']], keys)
+        self.assertTrue(all(r['status'] == 'processed' for r in result['results']))
+        mock_bedrock.invoke_model.assert_not_called()
+
+    @patch('src.lambda_function.s3_client')
+    @patch('src.lambda_function.bedrock_client')
+    @patch('src.lambda_function.dynamodb')
+    def test_errors_isolated_per_record(self, mock_dynamodb, mock_bedrock, mock_s3):
+        """Testa que a falha de um registro não afeta os demais"""
+        
+        def head(Bucket, Key):
+            if Key == 'quebrado.txt':
+                raise Exception("S3 Error")
+            return {'ContentLength': 1024, 'ContentType': 'text/plain',
+                    'LastModified': datetime.now(), 'StorageClass': 'STANDARD_IA'}
+        
+        mock_s3.head_object.side_effect = head
+        
+        from src.lambda_function import lambda_handler
+        
+        result = lambda_handler(self._event(['ok.txt', 'quebrado.txt']), {})
+        
+        statuses = {r['object_key']: r['status'] for r in result['results']}
+        self.assertEqual(statuses, {'ok.txt': 'processed', 'quebrado.txt': 'error'})
+        self.assertEqual(result['results'][1]['error'], 'S3 Error')
+
+class TestMultipartCopy(unittest.TestCase):
+    """Testes da cópia multipart para objetos grandes"""
+    
+    GB = 1024 * 1024 * 1024
+
+    def _mock_s3(self):
+        mock_s3 = Mock()
+        mock_s3.head_object.return_value = {
+            'ContentLength': 6 * self.GB,
+            'ContentType': 'application/gzip',
+            'ETag': '"abc"',
+            'Metadata': {'owner': 'backup-job'},
+            'ChecksumSHA256': 'c2hh'
+        }
+        mock_s3.get_object_tagging.return_value = {'TagSet': [{'Key': 'team', 'Value': 'data'}]}
+        mock_s3.create_multipart_upload.return_value = {'UploadId': 'upload-1'}
+        mock_s3.upload_part_copy.side_effect = lambda **kwargs: {
+            'CopyPartResult': {'ETag': f'"part-{kwargs["PartNumber"]}"', 'ChecksumSHA256': 'x'}
+        }
+        return mock_s3
+
+    def test_plan_parts(self):
+        """Testa divisão em partes e limite de 10.000 partes"""
+        
+        from multipart_copy import plan_parts
+        
+        parts = plan_parts(10 * 1024 * 1024 + 1, 5 * 1024 * 1024)
+        self.assertEqual(len(parts), 3)
+        self.assertEqual(parts[-1], (3, 10 * 1024 * 1024, 10 * 1024 * 1024))
+        
+        self.assertLessEqual(len(plan_parts(5 * 1024 * self.GB, 5 * 1024 * 1024)), 10000)
+
+    def test_multipart_copy_preserves_attributes(self):
+        """Testa preservação de metadados, tags e checksum"""
+        
+        from multipart_copy import multipart_copy
+        
+        mock_s3 = self._mock_s3()
+        parts = multipart_copy(mock_s3, 'bucket', 'backup.tar.gz', 6 * self.GB, 'GLACIER',
+                               {'optimized-by': 'S3Optimizer'}, part_size=self.GB, max_concurrency=4)
+        
+        self.assertEqual(parts, 6)
+        create_args = mock_s3.create_multipart_upload.call_args[1]
+        self.assertEqual(create_args['StorageClass'], 'GLACIER')
+        self.assertEqual(create_args['ContentType'], 'application/gzip')
+        self.assertEqual(create_args['Metadata'], {'owner': 'backup-job', 'optimized-by': 'S3Optimizer'})
+        self.assertEqual(create_args['ChecksumAlgorithm'], 'SHA256')
+        self.assertEqual(create_args['Tagging'], 'team=data')
+        
+        completed = mock_s3.complete_multipart_upload.call_args[1]['MultipartUpload']['Parts']
+        self.assertEqual([part['PartNumber'] for part in completed], [1, 2, 3, 4, 5, 6])
+        self.assertEqual(completed[0]['ChecksumSHA256'], 'x')
+        mock_s3.abort_multipart_upload.assert_not_called()
+
+    def test_multipart_copy_aborts_on_failure(self):
+        """Testa que o upload é abortado quando uma parte falha"""
+        
+        from multipart_copy import multipart_copy
+        
+        mock_s3 = self._mock_s3()
+        mock_s3.upload_part_copy.side_effect = Exception("SlowDown")
+        
+        with self.assertRaises(Exception):
+            multipart_copy(mock_s3, 'bucket', 'backup.tar.gz', 6 * self.GB, 'GLACIER', {})
+        
+        mock_s3.abort_multipart_upload.assert_called_once_with(
+            Bucket='bucket', Key='backup.tar.gz', UploadId='upload-1')
+
+    @patch('src.lambda_function.s3_client')
+    def test_apply_storage_class_uses_multipart(self, mock_s3):
+        """Testa que objetos acima do limite não usam copy_object"""
+        
+        mock_s3.head_object.return_value = {'ContentLength': 6 * self.GB, 'ETag': '"abc"'}
+        mock_s3.get_object_tagging.return_value = {'TagSet': []}
+        mock_s3.create_multipart_upload.return_value = {'UploadId': 'upload-1'}
+        mock_s3.upload_part_copy.return_value = {'CopyPartResult': {'ETag': '"p"'}}
+        
+        from src.lambda_function import apply_storage_class
+        
+        apply_storage_class('bucket', 'backup.tar.gz', {'storage_class': 'GLACIER', 'confidence': 'alta'}, 6 * self.GB)
+        
+        mock_s3.copy_object.assert_not_called()
+        mock_s3.complete_multipart_upload.assert_called_once()
+
+class TestLifecycleSynthesis(unittest.TestCase):
+    """Testes da síntese de regras de lifecycle"""
+    
+    def _insight(self, key, recommended, original='STANDARD', tags=None):
+        item = {'object_key': key, 'file_size': 1048576, 'confidence': 'alta',
+                'original_storage_class': original, 'recommended_storage_class': recommended}
+        if tags:
+            item['tags'] = tags
+        return item
+
+    def test_prefix_rules_and_leftovers(self):
+        """Testa regras por prefixo concordante e cópia individual do restante"""
+        
+        from lifecycle import synthesize_rules
+        
+        insights = [
+            self._insight('logs/2025/01/a.log', 'GLACIER'),
+            self._insight('logs/2025/02/b.log', 'GLACIER'),
+            self._insight('logs/2025/02/c.log', 'GLACIER'),
+            self._insight('docs/a.pdf', 'STANDARD_IA'),
+            self._insight('docs/b.pdf', 'STANDARD_IA'),
+            self._insight('docs/ativo.jpg', 'STANDARD'),
+            self._insight('docs/relatorios/x.pdf', 'STANDARD_IA'),
+            self._insight('docs/relatorios/y.pdf', 'STANDARD_IA'),
+            self._insight('raiz.bak', 'GLACIER')
+        ]
+        
+        rules, copies = synthesize_rules(insights)
+        
+        prefixes = {rule['prefix']: rule['storage_class'] for rule in rules}
+        self.assertEqual(prefixes, {'logs/': 'GLACIER', 'docs/relatorios/': 'STANDARD_IA'})
+        self.assertEqual(sorted(item['object_key'] for item in copies),
+                         ['docs/a.pdf', 'docs/b.pdf', 'raiz.bak'])
+
+    def test_tag_groups(self):
+        """Testa regras por tag para objetos sem prefixo concordante"""
+        
+        from lifecycle import synthesize_rules, to_lifecycle_rule
+        
+        insights = [
+            self._insight('a/1.dat', 'DEEP_ARCHIVE', tags={'projeto': 'legado'}),
+            self._insight('b/2.dat', 'DEEP_ARCHIVE', tags={'projeto': 'legado'}),
+            self._insight('a/3.dat', 'STANDARD'),
+            self._insight('b/4.dat', 'STANDARD')
+        ]
+        
+        rules, copies = synthesize_rules(insights)
+        
+        self.assertEqual(len(rules), 1)
+        self.assertEqual(copies, [])
+        lifecycle_rule = to_lifecycle_rule(rules[0])
+        self.assertEqual(lifecycle_rule['Filter'], {'Tag': {'Key': 'projeto', 'Value': 'legado'}})
+        self.assertEqual(lifecycle_rule['Transitions'][0]['StorageClass'], 'DEEP_ARCHIVE')
+
+    def test_apply_preserves_foreign_rules(self):
+        """Testa que regras existentes de outros donos são mantidas"""
+        
+        from lifecycle import apply_lifecycle_rules
+        
+        mock_s3 = Mock()
+        mock_s3.get_bucket_lifecycle_configuration.return_value = {'Rules': [
+            {'ID': 'expirar-tmp', 'Status': 'Enabled'},
+            {'ID': 's3-optimizer-antiga', 'Status': 'Enabled'}
+        ]}
+        
+        applied = apply_lifecycle_rules(mock_s3, 'bucket', [
+            {'prefix': 'logs/', 'storage_class': 'GLACIER', 'objects': 3}
+        ])
+        
+        self.assertEqual(applied, 1)
+        rules = mock_s3.put_bucket_lifecycle_configuration.call_args[1]['LifecycleConfiguration']['Rules']
+        self.assertEqual(rules[0]['ID'], 'expirar-tmp')
+        self.assertEqual(rules[1]['Filter'], {'Prefix': 'logs/'})
+        self.assertEqual(len(rules), 2)
+
+    @patch('src.lambda_function.s3_client')
+    @patch('src.lambda_function.dynamodb')
+    def test_lifecycle_handler(self, mock_dynamodb, mock_s3):
+        """Testa o handler: leitura paginada, regras e cópias restantes"""
+        
+        mock_table = Mock()
+        # Uma leitura para a síntese das regras e outra, página a página, para as cópias
+        mock_table.scan.side_effect = [
+            {'Items': [self._insight('logs/a.log', 'GLACIER')], 'LastEvaluatedKey': {'file_id': 'x'}},
+            {'Items': [self._insight('logs/b.log', 'GLACIER'), self._insight('docs/a.pdf', 'STANDARD_IA')]}
+        ] * 2
+        mock_dynamodb.Table.return_value = mock_table
+        mock_s3.get_bucket_lifecycle_configuration.return_value = {'Rules': []}
+        mock_s3.list_objects_v2.return_value = {'KeyCount': 2, 'IsTruncated': False}
+        
+        from src.lambda_function import lifecycle_handler
+        
+        result = lifecycle_handler({'bucket_name': 'bucket'}, {})
+        
+        self.assertEqual(result['insights'], 3)
+        self.assertEqual(result['rules'], 1)
+        self.assertEqual(result['copies'], 1)
+        self.assertEqual(mock_s3.copy_object.call_args[1]['Key'], 'docs/a.pdf')
+        self.assertEqual(mock_s3.list_objects_v2.call_args[1]['Prefix'], 'logs/')
+    
+    @patch('src.lambda_function.s3_client')
+    def test_lifecycle_handler_checkpoint_and_resume(self, mock_s3):
+        """Testa que as cópias param antes do timeout e retomam do LastEvaluatedKey sem refazer as regras"""
+        
+        import src.lambda_function as lf
+        
+        pages = {
+            None: {'Items': [self._insight('logs/a.log', 'GLACIER'), self._insight('logs/b.log', 'GLACIER')],
+                   'LastEvaluatedKey': {'file_id': 'p1'}},
+            'p1': {'Items': [self._insight('docs/a.pdf', 'STANDARD_IA')], 'LastEvaluatedKey': {'file_id': 'p2'}},
+            'p2': {'Items': [self._insight('docs/b.pdf', 'GLACIER')]}
+        }
+        insights = Mock()
+        insights.scan.side_effect = lambda **kwargs: pages[kwargs.get('ExclusiveStartKey', {}).get('file_id')]
+        checkpoints = LocalCheckpointTable()
+        tables = {'insights': insights, 'checkpoints': checkpoints}
+        mock_s3.get_bucket_lifecycle_configuration.return_value = {'Rules': []}
+        mock_s3.list_objects_v2.return_value = {'KeyCount': 2, 'IsTruncated': False}
+        context = Mock()
+        context.get_remaining_time_in_millis.return_value = 0
+        
+        with patch('src.lambda_function.get_table', side_effect=lambda name: tables[name]), \
+                patch('src.lambda_function.TABLE_NAME', 'insights'), \
+                patch('src.lambda_function.CHECKPOINT_TABLE', 'checkpoints'):
+            first = lf.lifecycle_handler({'bucket_name': 'bucket'}, context)
+            
+            self.assertEqual((first['status'], first['rules'], first['copies']), ('incomplete', 1, 0))
+            saved = json.loads(checkpoints.items['lifecycle:bucket']['state'])
+            self.assertEqual(saved['start_key'], {'file_id': 'p1'})
+            
+            context.get_remaining_time_in_millis.return_value = 900000
+            second = lf.lifecycle_handler({'bucket_name': 'bucket'}, context)
+        
+        self.assertEqual((second['status'], second['rules'], second['copies']), ('complete', 1, 2))
+        self.assertEqual(checkpoints.items, {})
+        mock_s3.get_bucket_lifecycle_configuration.assert_called_once()
+        self.assertEqual([c[1]['Key'] for c in mock_s3.copy_object.call_args_list], ['docs/a.pdf', 'docs/b.pdf'])
+        self.assertEqual([c[1]['Key'] for c in insights.update_item.call_args_list],
+                         [{'file_id': 'bucket/docs/a.pdf'}, {'file_id': 'bucket/docs/b.pdf'}])
+    
+    def test_root_and_uncovered_prefixes_rejected(self):
+        """Testa que a raiz nunca vira regra e prefixos com poucos objetos analisados não são cobertos"""
+        
+        from lifecycle import synthesize_rules
+        
+        insights = [self._insight('a/1.log', 'GLACIER'), self._insight('b/2.log', 'GLACIER')]
+        rules, copies = synthesize_rules(insights)
+        self.assertEqual(rules, [])
+        self.assertEqual(len(copies), 2)
+        
+        insights = [self._insight('logs/1.log', 'GLACIER'), self._insight('logs/2.log', 'GLACIER')]
+        stored = {'logs/': 10}
+        rules, copies = synthesize_rules(insights, count_objects=lambda prefix, limit: stored[prefix])
+        self.assertEqual(rules, [])
+        self.assertEqual(len(copies), 2)
+        
+        stored['logs/'] = 2
+        rules, copies = synthesize_rules(insights, count_objects=lambda prefix, limit: stored[prefix])
+        self.assertEqual([rule['prefix'] for rule in rules], ['logs/'])
+    
+    def test_vetoed_insight_blocks_prefix_rule(self):
+        """Testa que o objeto vetado pelo custo estreita a regra em vez de ser arquivado por ela"""
+        
+        from lifecycle import synthesize_rules
+        
+        insights = [
+            self._insight('logs/2025/01/a.log', 'GLACIER'),
+            self._insight('logs/2025/01/b.log', 'GLACIER'),
+            self._insight('logs/2025/02/c.log', 'GLACIER'),
+            self._insight('logs/2025/02/d.log', 'GLACIER'),
+            dict(self._insight('logs/2025/02/pequeno.log', 'GLACIER'), cost_decision='veto')
+        ]
+        
+        rules, copies = synthesize_rules(insights)
+        
+        self.assertEqual([rule['prefix'] for rule in rules], ['logs/2025/01/'])
+        self.assertEqual(sorted(item['object_key'] for item in copies),
+                         ['logs/2025/02/c.log', 'logs/2025/02/d.log'])
+    
+    def test_transitioned_objects_not_copied_again(self):
+        """Testa que insights já aplicados ou agendados não geram cópia individual"""
+        
+        from lifecycle import synthesize_rules
+        
+        insights = [dict(self._insight('a/1.pdf', 'STANDARD_IA'), transition_status='applied'),
+                    dict(self._insight('b/2.pdf', 'GLACIER'), transition_status='scheduled'),
+                    self._insight('c/3.pdf', 'GLACIER')]
+        
+        rules, copies = synthesize_rules(insights)
+        
+        self.assertEqual(rules, [])
+        self.assertEqual([item['object_key'] for item in copies], ['c/3.pdf'])
+
+class TestIdempotency(unittest.TestCase):
+    """Testes da camada de idempotência"""
+    
+    def setUp(self):
+        from src.lambda_function import recommendation_cache, similarity_index, skip_stats
+        recommendation_cache.clear()
+        similarity_index.clear()
+        for reason in skip_stats:
+            skip_stats[reason] = 0
+        
+        self.event = {'Records': [
+            {'s3': {'bucket': {'name': 'test-bucket'}, 'object': {'key': 'dados/relatorio.pdf'}}}
+        ]}
+        self.head_response = {
+            'ContentLength': 1048576,
+            'ContentType': 'application/pdf',
+            'LastModified': datetime.now(),
+            'StorageClass': 'STANDARD',
+            'ETag': '"etag-1"',
+            'Metadata': {}
+        }
+
+    def _bedrock_response(self, storage_class):
+        return {'body': Mock(read=lambda: json.dumps({'content': [{'text': json.dumps(
+            {'storage_class': storage_class, 'reasoning': 'x', 'confidence': 'alta'}
+        )}]}).encode())}
+
+    @patch('src.lambda_function.s3_client')
+    @patch('src.lambda_function.bedrock_client')
+    @patch('src.lambda_function.dynamodb')
+    def test_skip_already_optimized(self, mock_dynamodb, mock_bedrock, mock_s3):
+        """Testa que objetos copiados pelo otimizador não são reanalisados"""
+        
+        self.head_response['Metadata'] = {'optimized-by': 'S3Optimizer'}
+        mock_s3.head_object.return_value = self.head_response
+        
+        from src.lambda_function import lambda_handler, skip_stats
+        
+        result = lambda_handler(self.event, {})
+        
+        self.assertEqual(result['results'][0]['skip_reason'], 'already_optimized')
+        mock_bedrock.invoke_model.assert_not_called()
+        mock_s3.copy_object.assert_not_called()
+        self.assertEqual(skip_stats['already_optimized'], 1)
+
+    @patch('src.lambda_function.s3_client')
+    @patch('src.lambda_function.bedrock_client')
+    @patch('src.lambda_function.dynamodb')
+    def test_skip_duplicate_version(self, mock_dynamodb, mock_bedrock, mock_s3):
+        """Testa que versões já analisadas são descartadas antes do Bedrock"""
+        
+        mock_s3.head_object.return_value = self.head_response
+        mock_dynamodb.batch_get_item.return_value = {'Responses': {'test-table': [
+            {'file_id': 'test-bucket/dados/relatorio.pdf', 'source_version': 'etag-1'}
+        ]}}
+        
+        from src.lambda_function import lambda_handler
+        
+        # O mesmo registro entregue duas vezes no evento é agrupado antes do pipeline
+        event = {'Records': self.event['Records'] * 2}
+        with patch('src.lambda_function.TABLE_NAME', 'test-table'):
+            result = lambda_handler(event, {})
+        
+        self.assertEqual([r['skip_reason'] for r in result['results']], ['superseded', 'duplicate'])
+        mock_bedrock.invoke_model.assert_not_called()
+        mock_s3.copy_object.assert_not_called()
+
+    @patch('src.lambda_function.s3_client')
+    @patch('src.lambda_function.bedrock_client')
+    @patch('src.lambda_function.dynamodb')
+    def test_skip_same_class(self, mock_dynamodb, mock_bedrock, mock_s3):
+        """Testa que não há cópia quando a classe recomendada é a atual"""
+        
+        mock_s3.head_object.return_value = self.head_response
+        mock_bedrock.invoke_model.return_value = self._bedrock_response('STANDARD')
+        
+        from src.lambda_function import lambda_handler
+        
+        result = lambda_handler(self.event, {})
+        
+        self.assertEqual(result['results'][0]['skip_reason'], 'same_class')
+        mock_s3.copy_object.assert_not_called()
+
+    def _fake_insights(self, mock_dynamodb):
+        """Tabela de insights em memória com o put condicional da reserva"""
+        
+        from botocore.exceptions import ClientError
+        
+        state = {}
+        
+        def put_item(Item, ConditionExpression, ExpressionAttributeValues):
+            current = state.get(Item['file_id'])
+            if current and current['source_version'] == Item['source_version'] \
+                    and current.get('transition_status') != 'failed':
+                raise ClientError({'Error': {'Code': 'ConditionalCheckFailedException', 'Message': 'x'}}, 'PutItem')
+            state[Item['file_id']] = dict(Item)
+        
+        def update_item(Key, **kwargs):
+            state[Key['file_id']]['transition_status'] = kwargs['ExpressionAttributeValues'][':failed']
+        
+        def batch_write_item(RequestItems):
+            for requests in RequestItems.values():
+                for request in requests:
+                    state[request['PutRequest']['Item']['file_id']] = request['PutRequest']['Item']
+            return {}
+        
+        mock_dynamodb.Table.return_value.put_item.side_effect = put_item
+        mock_dynamodb.Table.return_value.update_item.side_effect = update_item
+        mock_dynamodb.batch_write_item.side_effect = batch_write_item
+        mock_dynamodb.batch_get_item.side_effect = lambda RequestItems: {
+            'Responses': {'test-table': [dict(item) for item in state.values()]}}
+        return state
+
+    @patch('src.lambda_function.s3_client')
+    @patch('src.lambda_function.bedrock_client')
+    @patch('src.lambda_function.dynamodb')
+    def test_failed_copy_is_retried(self, mock_dynamodb, mock_bedrock, mock_s3):
+        """Testa que uma cópia que falhou não marca a versão como processada"""
+        
+        from botocore.exceptions import ClientError
+        import src.lambda_function as lf
+        
+        state = self._fake_insights(mock_dynamodb)
+        self.head_response['ContentLength'] = 100 * 1024 * 1024
+        mock_s3.head_object.return_value = self.head_response
+        mock_s3.copy_object.side_effect = [
+            ClientError({'Error': {'Code': 'SlowDown', 'Message': 'x'}}, 'CopyObject'), {}]
+        mock_bedrock.invoke_model.return_value = self._bedrock_response('GLACIER')
+        
+        with patch('src.lambda_function.TABLE_NAME', 'test-table'), \
+                patch.object(lf.insight_sink, 'table_name', 'test-table'):
+            first = lf.lambda_handler(self.event, {})['results'][0]
+            self.assertEqual(state['test-bucket/dados/relatorio.pdf']['transition_status'], 'failed')
+            second = lf.lambda_handler(self.event, {})['results'][0]
+            third = lf.lambda_handler(self.event, {})['results'][0]
+        
+        self.assertEqual(first['status'], 'error')
+        self.assertEqual(second['status'], 'processed')
+        self.assertEqual(third['skip_reason'], 'duplicate')
+        self.assertEqual(mock_s3.copy_object.call_count, 2)
+        self.assertEqual(state['test-bucket/dados/relatorio.pdf']['transition_status'], 'applied')
+
+    @patch('src.lambda_function.s3_client')
+    @patch('src.lambda_function.bedrock_client')
+    @patch('src.lambda_function.dynamodb')
+    def test_concurrent_delivery_does_not_copy(self, mock_dynamodb, mock_bedrock, mock_s3):
+        """Testa que a versão reservada por outra entrega não é copiada de novo"""
+        
+        import src.lambda_function as lf
+        
+        state = self._fake_insights(mock_dynamodb)
+        self.head_response['ContentLength'] = 100 * 1024 * 1024
+        mock_s3.head_object.return_value = self.head_response
+        mock_bedrock.invoke_model.return_value = self._bedrock_response('GLACIER')
+        
+        # A outra entrega reservou a versão depois da verificação de duplicados desta
+        mock_dynamodb.batch_get_item.side_effect = lambda RequestItems: {'Responses': {'test-table': []}}
+        state['test-bucket/dados/relatorio.pdf'] = {'file_id': 'test-bucket/dados/relatorio.pdf',
+                                                    'source_version': 'etag-1', 'transition_status': 'claimed'}
+        
+        with patch('src.lambda_function.TABLE_NAME', 'test-table'):
+            result = lf.lambda_handler(self.event, {})['results'][0]
+        
+        self.assertEqual(result['status'], 'error')
+        mock_s3.copy_object.assert_not_called()
+        
+        # A repetição encontra a reserva ainda válida antes da análise
+        mock_dynamodb.batch_get_item.side_effect = lambda RequestItems: {'Responses': {'test-table': [
+            dict(state['test-bucket/dados/relatorio.pdf'], claim_expires_at=int(datetime.now().timestamp()) + 60)]}}
+        with patch('src.lambda_function.TABLE_NAME', 'test-table'):
+            retry = lf.lambda_handler(self.event, {})['results'][0]
+        
+        self.assertEqual((retry['status'], retry['error']), ('error', 'versão em processamento por outra entrega'))
+        mock_s3.copy_object.assert_not_called()
+
+    def test_source_version_prefers_version_id(self):
+        """Testa a chave de idempotência"""
+        
+        from src.lambda_function import source_version
+        
+        self.assertEqual(source_version({'version_id': 'v1', 'etag': 'e1'}), 'v1')
+        self.assertEqual(source_version({'version_id': None, 'etag': 'e1'}), 'e1')
+
+class TestEventMetadata(unittest.TestCase):
+    """Testes do caminho com menos chamadas S3 por objeto"""
+    
+    def setUp(self):
+        # Caminho opcional (TRUST_EVENT_METADATA=true); o padrão consulta head_object
+        patcher = patch('src.lambda_function.TRUST_EVENT_METADATA', True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def _record(self, event_name='ObjectCreated:Put', **object_fields):
+        s3_object = {'key': 'logs/app+2025.log', 'size': 10 * 1024 * 1024, 'eTag': 'abc123'}
+        s3_object.update(object_fields)
+        return {'eventName': event_name, 'eventTime': '2025-10-17T10:00:00.000Z',
+                's3': {'bucket': {'name': 'test-bucket'}, 'object': s3_object}}
+
+    def test_metadata_from_complete_event(self):
+        """Testa metadados montados a partir do evento"""
+        
+        from src.lambda_function import metadata_from_event
+        
+        metadata = metadata_from_event(self._record(versionId='v1'), 'logs/app 2025.log')
+        
+        self.assertEqual(metadata['file_size'], 10 * 1024 * 1024)
+        self.assertEqual(metadata['file_type'], 'log')
+        self.assertEqual(metadata['etag'], 'abc123')
+        self.assertEqual(metadata['version_id'], 'v1')
+        self.assertEqual(metadata['storage_class'], 'STANDARD')
+
+    def test_incomplete_or_copy_event_needs_head(self):
+        """Testa que eventos incompletos ou de cópia exigem head_object"""
+        
+        from src.lambda_function import metadata_from_event
+        
+        record = self._record()
+        del record['s3']['object']['size']
+        self.assertIsNone(metadata_from_event(record, 'logs/app.log'))
+        self.assertIsNone(metadata_from_event(self._record('ObjectCreated:Copy'), 'logs/app.log'))
+        # Multipart pode ter classe explícita ou ser a cópia multipart do próprio otimizador
+        self.assertIsNone(metadata_from_event(self._record('ObjectCreated:CompleteMultipartUpload'), 'logs/app.log'))
+        
+        with patch('src.lambda_function.TRUST_EVENT_METADATA', False):
+            self.assertIsNone(metadata_from_event(self._record(), 'logs/app.log'))
+
+    @patch('src.lambda_function.s3_client')
+    def test_multipart_copy_of_optimizer_is_skipped(self, mock_s3):
+        """Testa que a cópia multipart do próprio otimizador é identificada pelo head_object"""
+        
+        from src.lambda_function import collect_metadata
+        
+        mock_s3.head_object.return_value = {
+            'ContentLength': 10 * 1024 * 1024, 'ContentType': 'text/plain', 'LastModified': datetime.now(),
+            'StorageClass': 'STANDARD_IA', 'ETag': '"abc123"', 'Metadata': {'optimized-by': 'S3Optimizer'}
+        }
+        
+        result = collect_metadata(self._record('ObjectCreated:CompleteMultipartUpload'))
+        
+        mock_s3.head_object.assert_called_once()
+        self.assertEqual(result['file_metadata']['storage_class'], 'STANDARD_IA')
+        self.assertEqual((result['status'], result['skip_reason']), ('skipped', 'already_optimized'))
+
+    @patch('src.lambda_function.s3_client')
+    @patch('src.lambda_function.bedrock_client')
+    @patch('src.lambda_function.dynamodb')
+    def test_two_calls_per_object(self, mock_dynamodb, mock_bedrock, mock_s3):
+        """Testa o fluxo completo com um head_object (cabeçalhos da cópia) e um copy_object no S3"""
+        
+        from src.lambda_function import lambda_handler, api_stats
+        
+        before = dict(api_stats)
+        result = lambda_handler({'Records': [self._record()]}, {})
+        
+        self.assertEqual(result['results'][0]['status'], 'processed')
+        mock_s3.head_object.assert_called_once()
+        mock_s3.put_object_tagging.assert_not_called()
+        mock_s3.copy_object.assert_called_once()
+        self.assertEqual(mock_s3.copy_object.call_args[1]['Key'], 'logs/app 2025.log')
+        self.assertEqual(api_stats['head_object_avoided'] - before['head_object_avoided'], 1)
+        self.assertEqual(api_stats['put_object_tagging_avoided'] - before['put_object_tagging_avoided'], 1)
+
+    @patch('src.lambda_function.s3_client')
+    @patch('src.lambda_function.bedrock_client')
+    def test_explicit_upload_class_uses_head(self, mock_bedrock, mock_s3):
+        """Testa que sem TRUST_EVENT_METADATA a classe real do upload é respeitada"""
+        
+        import src.lambda_function as lf
+        
+        mock_s3.head_object.return_value = {
+            'ContentLength': 10 * 1024 * 1024, 'ContentType': 'text/plain', 'LastModified': datetime.now(),
+            'StorageClass': 'DEEP_ARCHIVE', 'ETag': '"abc123"', 'Metadata': {}
+        }
+        
+        with patch('src.lambda_function.TRUST_EVENT_METADATA', False), \
+                patch('src.lambda_function.TABLE_NAME', None):
+            result = lf.lambda_handler({'Records': [self._record()]}, {})
+        
+        mock_s3.head_object.assert_called_once()
+        self.assertEqual(result['results'][0]['skip_reason'], 'archived')
+        mock_s3.copy_object.assert_not_called()
+        mock_bedrock.invoke_model.assert_not_called()
+
+class TestInsightSink(unittest.TestCase):
+    """Testes do buffer de insights com batch_write_item"""
+    
+    def _items(self, count):
+        return [{'file_id': f'bucket/arquivo-{i}'} for i in range(count)]
+
+    def test_flush_in_chunks_of_25(self):
+        """Testa agrupamento em requisições de 25 itens"""
+        
+        from insight_sink import InsightSink
+        
+        writer = Mock(return_value={'UnprocessedItems': {}})
+        sink = InsightSink(writer, 'tabela', max_buffer=1000)
+        for item in self._items(60) + self._items(1):
+            sink.add(item)
+        
+        writer.assert_not_called()
+        self.assertEqual(sink.flush(), [])
+        
+        sizes = [len(call[1]['RequestItems']['tabela']) for call in writer.call_args_list]
+        self.assertEqual(sizes, [25, 25, 10])
+        self.assertEqual(sink.stats['items'], 60)
+
+    def test_size_threshold_triggers_flush(self):
+        """Testa gravação automática ao atingir o limite do buffer"""
+        
+        from insight_sink import InsightSink
+        
+        writer = Mock(return_value={})
+        sink = InsightSink(writer, 'tabela', max_buffer=25)
+        for item in self._items(25):
+            sink.add(item)
+        
+        writer.assert_called_once()
+
+    def test_retry_unprocessed_with_backoff(self):
+        """Testa reenvio de itens não processados e falha após o limite de tentativas"""
+        
+        from insight_sink import InsightSink
+        
+        items = self._items(3)
+        unprocessed = {'UnprocessedItems': {'tabela': [{'PutRequest': {'Item': items[2]}}]}}
+        writer = Mock(side_effect=[unprocessed, {}])
+        sleep = Mock()
+        sink = InsightSink(writer, 'tabela', sleep=sleep)
+        for item in items:
+            sink.add(item)
+        
+        self.assertEqual(sink.flush(), [])
+        self.assertEqual(writer.call_count, 2)
+        self.assertEqual(len(writer.call_args[1]['RequestItems']['tabela']), 1)
+        sleep.assert_called_once()
+        
+        writer = Mock(return_value=unprocessed)
+        sink = InsightSink(writer, 'tabela', max_attempts=3, sleep=Mock())
+        sink.add(items[2])
+        self.assertEqual(sink.flush(), [items[2]])
+        self.assertEqual(sink.stats['failed'], 1)
+
+    def test_fetch_attributes_batches(self):
+        """Testa leitura em lotes de 100 chaves"""
+        
+        from insight_sink import fetch_attributes
+        
+        reader = Mock(side_effect=lambda RequestItems: {'Responses': {'tabela': [
+            {'file_id': key['file_id']} for key in RequestItems['tabela']['Keys']
+        ]}})
+        
+        found = fetch_attributes(reader, 'tabela', [f'k{i}' for i in range(150)], 'file_id')
+        
+        self.assertEqual(len(found), 150)
+        self.assertEqual(reader.call_count, 2)
+
+class LocalQueue:
+    """Stand-in local de fila SQS: entrega lotes e mantém mensagens com falha para reentrega"""
+    
+    def __init__(self):
+        self.messages = []
+        self.counter = 0
+
+    def send(self, body):
+        self.counter += 1
+        self.messages.append({'messageId': f'msg-{self.counter}', 'eventSource': 'aws:sqs',
+                              'body': json.dumps(body)})
+
+    def deliver(self, handler, batch_size=10):
+        """Entrega um lote ao handler e remove da fila apenas as mensagens bem-sucedidas"""
+        
+        batch, self.messages = self.messages[:batch_size], self.messages[batch_size:]
+        response = handler({'Records': batch}, {})
+        failed = {item['itemIdentifier'] for item in response['batchItemFailures']}
+        self.messages.extend(message for message in batch if message['messageId'] in failed)
+        return failed
+
+class TestSqsIngestion(unittest.TestCase):
+    """Testes da ingestão via SQS com respostas parciais"""
+    
+    def _notification(self, *keys):
+        return {'Records': [
+            {'eventName': 'ObjectCreated:Put',
+             's3': {'bucket': {'name': 'test-bucket'},
+                    'object': {'key': key, 'size': 10 * 1024 * 1024, 'eTag': f'etag-{key}'}}}
+            for key in keys
+        ]}
+
+    @patch('src.lambda_function.TRUST_EVENT_METADATA', True)
+    @patch('src.lambda_function.s3_client')
+    @patch('src.lambda_function.bedrock_client')
+    @patch('src.lambda_function.dynamodb')
+    def test_partial_batch_failures(self, mock_dynamodb, mock_bedrock, mock_s3):
+        """Testa que apenas mensagens com registros falhos voltam para a fila"""
+        
+        def copy_object(**kwargs):
+            if kwargs['Key'] == 'quebrado.log':
+                raise Exception("AccessDenied")
+        
+        mock_s3.copy_object.side_effect = copy_object
+        
+        from src.lambda_function import lambda_handler
+        
+        queue = LocalQueue()
+        queue.send(self._notification('a.log', 'b.log'))
+        queue.send(self._notification('quebrado.log'))
+        queue.send({'Event': 's3:TestEvent'})
+        queue.messages.append({'messageId': 'msg-invalida', 'eventSource': 'aws:sqs', 'body': 'nao-json'})
+        
+        failed = queue.deliver(lambda_handler)
+        
+        self.assertEqual(failed, {'msg-2', 'msg-invalida'})
+        self.assertEqual([message['messageId'] for message in queue.messages], ['msg-2', 'msg-invalida'])
+        self.assertEqual(mock_s3.copy_object.call_count, 3)
+
+    def test_parse_sns_wrapped_message(self):
+        """Testa notificação S3 entregue via SNS dentro da mensagem SQS"""
+        
+        from src.lambda_function import parse_sqs_message
+        
+        body = {'Type': 'Notification', 'Message': json.dumps(self._notification('a.txt'))}
+        records = parse_sqs_message({'messageId': 'm', 'body': json.dumps(body)})
+        
+        self.assertEqual(records[0]['s3']['object']['key'], 'a.txt')
+
+def build_inventory(rows_per_file, files=1):
+    """Monta um relatório do S3 Inventory em CSV gzip servido por um get_object simulado"""
+    
+    import gzip
+    import io
+    
+    objects = {}
+    manifest = {
+        'sourceBucket': 'test-bucket',
+        'destinationBucket': 'arn:aws:s3:::inventory-bucket',
+        'fileFormat': 'CSV',
+        'fileSchema': 'Bucket, Key, Size, LastModifiedDate, ETag, StorageClass',
+        'files': []
+    }
+    
+    for file_index in range(files):
+        lines = []
+        for row_index in range(rows_per_file):
+            key = urllib.parse.quote_plus(f"logs/arquivo {file_index}-{row_index}.log")
+            lines.append(f'"test-bucket","{key}","{10 * 1024 * 1024}","2024-01-01T00:00:00.000Z","etag{row_index}","STANDARD"')
+        data_key = f"data/{file_index}.csv.gz"
+        objects[data_key] = gzip.compress('\n'.join(lines).encode())
+        manifest['files'].append({'key': data_key})
+    
+    objects['manifest.json'] = json.dumps(manifest).encode()
+    
+    def get_object(Bucket, Key, **kwargs):
+        return {'Body': io.BytesIO(objects[Key])}
+    
+    return get_object
+
+class LocalCheckpointTable:
+    """Tabela de checkpoints em memória"""
+    
+    def __init__(self):
+        self.items = {}
+    
+    def get_item(self, Key):
+        item = self.items.get(Key['job_id'])
+        return {'Item': item} if item else {}
+    
+    def put_item(self, Item):
+        self.items[Item['job_id']] = Item
+    
+    def delete_item(self, Key):
+        self.items.pop(Key['job_id'], None)
+
+class TestInventoryBackfill(unittest.TestCase):
+    """Testes do backfill a partir do S3 Inventory"""
+    
+    def test_iter_rows_and_resume(self):
+        """Testa leitura em streaming e retomada a partir de (arquivo, linha)"""
+        
+        from src.inventory import read_manifest, iter_inventory_rows, row_to_metadata
+        from src.lambda_function import file_type_from_key
+        
+        s3 = Mock()
+        s3.get_object.side_effect = build_inventory(rows_per_file=3, files=2)
+        
+        manifest = read_manifest(s3, 'inventory-bucket', 'manifest.json')
+        self.assertEqual(manifest['dataBucket'], 'inventory-bucket')
+        
+        rows = list(iter_inventory_rows(s3, manifest))
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[0][2]['Key'], 'logs/arquivo 0-0.log')
+        
+        resumed = list(iter_inventory_rows(s3, manifest, start_file=1, start_row=2))
+        self.assertEqual([(f, r) for f, r, _ in resumed], [(1, 2)])
+        
+        metadata = row_to_metadata(rows[0][2], file_type_from_key)
+        self.assertEqual(metadata['file_size'], 10 * 1024 * 1024)
+        self.assertEqual(metadata['file_type'], 'log')
+        self.assertEqual(metadata['etag'], 'etag0')
+    
+    def test_row_to_metadata_skips_delete_markers(self):
+        """Testa que delete markers e versões antigas são ignorados"""
+        
+        from src.inventory import row_to_metadata
+        from src.lambda_function import file_type_from_key
+        
+        self.assertIsNone(row_to_metadata({'Key': 'a', 'IsDeleteMarker': 'true'}, file_type_from_key))
+        self.assertIsNone(row_to_metadata({'Key': 'a', 'IsLatest': 'false'}, file_type_from_key))
+    
+    @patch('src.lambda_function.s3_client')
+    @patch('src.lambda_function.bedrock_client')
+    def test_backfill_checkpoint_and_resume(self, mock_bedrock, mock_s3):
+        """Testa que o backfill salva checkpoint antes do timeout e retoma de onde parou"""
+        
+        import src.lambda_function as lf
+        
+        mock_s3.get_object.side_effect = build_inventory(rows_per_file=5, files=2)
+        table = LocalCheckpointTable()
+        context = Mock()
+        context.get_remaining_time_in_millis.return_value = 0
+        event = {'manifest_bucket': 'inventory-bucket', 'manifest_key': 'manifest.json', 'job_id': 'job'}
+        
+        with patch('src.lambda_function.CHECKPOINT_TABLE', 'checkpoints'), \
+             patch('src.lambda_function.BACKFILL_CHUNK_SIZE', 4), \
+             patch('src.lambda_function.get_table', return_value=table):
+            first = lf.backfill_handler(event, context)
+            
+            self.assertEqual(first['status'], 'incomplete')
+            self.assertEqual(first['checkpoint']['rows'], 4)
+            self.assertIn('job', table.items)
+            
+            context.get_remaining_time_in_millis.return_value = 900000
+            second = lf.backfill_handler(event, context)
+        
+        self.assertEqual(second['status'], 'complete')
+        self.assertEqual(second['counts']['rows'], 6)
+        self.assertEqual(table.items, {})
+        # Logs são resolvidos pelas regras locais: nenhuma chamada ao Bedrock
+        mock_bedrock.invoke_model.assert_not_called()
+        self.assertEqual(mock_s3.copy_object.call_count, 10)
+    
+    @patch('src.lambda_function.s3_client')
+    @patch('src.lambda_function.bedrock_client')
+    def test_backfill_repeats_chunk_with_temporary_failures(self, mock_bedrock, mock_s3):
+        """Testa que falhas temporárias não avançam o checkpoint: o bloco é repetido"""
+        
+        from botocore.exceptions import ClientError
+        import src.lambda_function as lf
+        
+        copied = []
+        throttled = []
+        
+        def copy_object(**kwargs):
+            if not throttled and kwargs['Key'] == 'logs/arquivo 0-1.log':
+                throttled.append(kwargs['Key'])
+                raise ClientError({'Error': {'Code': 'SlowDown', 'Message': 'x'}}, 'CopyObject')
+            copied.append(kwargs['Key'])
+        
+        mock_s3.get_object.side_effect = build_inventory(rows_per_file=5, files=2)
+        mock_s3.copy_object.side_effect = copy_object
+        table = LocalCheckpointTable()
+        context = Mock()
+        context.get_remaining_time_in_millis.return_value = 900000
+        event = {'manifest_bucket': 'inventory-bucket', 'manifest_key': 'manifest.json', 'job_id': 'job'}
+        
+        with patch('src.lambda_function.CHECKPOINT_TABLE', 'checkpoints'), \
+             patch('src.lambda_function.BACKFILL_CHUNK_SIZE', 4), \
+             patch('src.lambda_function.MAX_CONCURRENCY', 1), \
+             patch('src.lambda_function.get_table', return_value=table):
+            first = lf.backfill_handler(event, context)
+            
+            self.assertEqual((first['status'], first['retry']), ('incomplete', True))
+            self.assertEqual((first['checkpoint']['file_index'], first['checkpoint']['row_index']), (0, 0))
+            
+            second = lf.backfill_handler(event, context)
+        
+        self.assertEqual(second['status'], 'complete')
+        self.assertIn('logs/arquivo 0-1.log', copied)
+        self.assertEqual(len(set(copied)), 10)
+
+class LocalBucketListing:
+    """Stand-in de ListObjectsV2 sobre uma lista de chaves em memória"""
+    
+    def __init__(self, keys, page_size=2):
+        self.keys = sorted(keys)
+        self.page_size = page_size
+        self.calls = []
+    
+    def list_objects_v2(self, Bucket, Prefix='', Delimiter=None, StartAfter='', ContinuationToken=None, MaxKeys=1000):
+        self.calls.append({'Prefix': Prefix, 'Delimiter': Delimiter, 'StartAfter': StartAfter})
+        entries = []
+        for key in self.keys:
+            if not key.startswith(Prefix) or key <= max(StartAfter, ContinuationToken or ''):
+                continue
+            split = key.find(Delimiter, len(Prefix)) if Delimiter else -1
+            entry = ('prefix', key[:split + 1]) if split >= 0 else ('key', key)
+            if entry not in entries:
+                entries.append(entry)
+        
+        page = entries[:self.page_size]
+        response = {
+            'Contents': [{'Key': key, 'Size': 10 * 1024 * 1024, 'ETag': '"e"', 'StorageClass': 'STANDARD',
+                          'LastModified': datetime(2024, 1, 1)} for kind, key in page if kind == 'key'],
+            'CommonPrefixes': [{'Prefix': prefix} for kind, prefix in page if kind == 'prefix'],
+            'IsTruncated': len(entries) > self.page_size
+        }
+        if response['IsTruncated']:
+            # Token aponta para a última chave da página (prefixos comuns pulam o subárvore inteiro)
+            kind, last = page[-1]
+            response['NextContinuationToken'] = last + '\uffff' if kind == 'prefix' else last
+        return response
+
+class TestListingCrawler(unittest.TestCase):
+    """Testes do crawler ListObjectsV2 particionado"""
+    
+    KEYS = ['raiz.log', 'a/1.log', 'a/2.log', 'a/x/3.log', 'b/1.log', 'b/2.log', 'b/3.log', 'c/1.log']
+    
+    def test_discover_partitions(self):
+        """Testa divisão do keyspace pelos prefixos descobertos"""
+        
+        from src.crawler import discover_partitions
+        
+        s3 = LocalBucketListing(self.KEYS)
+        partitions = discover_partitions(s3, 'bucket', target=4)
+        
+        self.assertEqual(partitions['|/'], {'prefix': '', 'delimiter': '/'})
+        self.assertEqual(sorted(p['prefix'] for p in partitions.values() if p['delimiter'] is None), ['a/', 'b/', 'c/'])
+    
+    def test_crawl_covers_every_key_once_and_resumes(self):
+        """Testa que a listagem paralela cobre todas as chaves e retoma pelo StartAfter"""
+        
+        from src.crawler import crawl_partitions, discover_partitions
+        
+        s3 = LocalBucketListing(self.KEYS)
+        state = {'partitions': discover_partitions(s3, 'bucket', target=4), 'objects': 0}
+        seen = []
+        
+        complete = crawl_partitions(s3, 'bucket', state, lambda rows: seen.extend(row['Key'] for row in rows),
+                                    max_concurrency=4)
+        
+        self.assertTrue(complete)
+        self.assertEqual(sorted(seen), sorted(self.KEYS))
+        self.assertEqual(state['objects'], len(self.KEYS))
+        
+        # Retomada: partição b/ já processou até b/2.log
+        state = {'partitions': {'b/': {'prefix': 'b/', 'delimiter': None, 'start_after': 'b/2.log'}}, 'objects': 2}
+        seen = []
+        crawl_partitions(s3, 'bucket', state, lambda rows: seen.extend(row['Key'] for row in rows))
+        
+        self.assertEqual(seen, ['b/3.log'])
+        self.assertTrue(state['partitions']['b/']['done'])
+    
+    def test_page_with_temporary_failures_is_relisted(self):
+        """Testa que uma página com falhas temporárias não avança o StartAfter da partição"""
+        
+        from src.crawler import crawl_partitions
+        
+        s3 = LocalBucketListing(self.KEYS)
+        state = {'partitions': {'b/': {'prefix': 'b/', 'delimiter': None}}, 'objects': 0}
+        pages = []
+        
+        def handle_page(rows):
+            pages.append([row['Key'] for row in rows])
+            return len(pages) == 2
+        
+        self.assertFalse(crawl_partitions(s3, 'bucket', state, handle_page))
+        self.assertEqual(state['partitions']['b/']['start_after'], 'b/2.log')
+        self.assertEqual(state['objects'], 2)
+        
+        self.assertTrue(crawl_partitions(s3, 'bucket', state, handle_page))
+        self.assertEqual(pages, [['b/1.log', 'b/2.log'], ['b/3.log'], ['b/3.log']])
+    
+    @patch('src.lambda_function.s3_client')
+    @patch('src.lambda_function.bedrock_client')
+    def test_crawler_handler_checkpoint_and_resume(self, mock_bedrock, mock_s3):
+        """Testa que o crawler salva checkpoint por partição e conclui na invocação seguinte"""
+        
+        import src.lambda_function as lf
+        
+        listing = LocalBucketListing(self.KEYS)
+        mock_s3.list_objects_v2.side_effect = listing.list_objects_v2
+        table = LocalCheckpointTable()
+        context = Mock()
+        context.get_remaining_time_in_millis.return_value = 0
+        event = {'bucket': 'test-bucket', 'job_id': 'crawl'}
+        
+        with patch('src.lambda_function.CHECKPOINT_TABLE', 'checkpoints'), \
+             patch('src.lambda_function.CRAWLER_PARTITIONS', 4), \
+             patch('src.lambda_function.get_table', return_value=table):
+            first = lf.crawler_handler(event, context)
+            
+            self.assertEqual(first['status'], 'incomplete')
+            saved = json.loads(table.items['crawl']['state'])
+            self.assertEqual(saved['objects'], first['objects'])
+            
+            context.get_remaining_time_in_millis.return_value = 900000
+            second = lf.crawler_handler(event, context)
+        
+        self.assertEqual(second['status'], 'complete')
+        self.assertEqual(second['objects'], len(self.KEYS))
+        self.assertEqual(table.items, {})
+        # Metadados vêm da listagem: head_object só para os cabeçalhos de cada cópia
+        self.assertEqual(mock_s3.head_object.call_count, len(self.KEYS))
+        self.assertEqual(mock_s3.copy_object.call_count, len(self.KEYS))
+
+class TestBatchOperations(unittest.TestCase):
+    """Testes do handler do S3 Batch Operations"""
+    
+    def setUp(self):
+        from src.lambda_function import recommendation_cache, similarity_index
+        recommendation_cache.clear()
+        similarity_index.clear()
+    
+    def _head_object(self, Bucket, Key, **kwargs):
+        from botocore.exceptions import ClientError
+        
+        if Key == 'sumiu.log':
+            raise ClientError({'Error': {'Code': '404', 'Message': 'Not Found'},
+                               'ResponseMetadata': {'HTTPStatusCode': 404}}, 'HeadObject')
+        return {'ContentLength': 10 * 1024 * 1024, 'ContentType': 'application/octet-stream',
+                'LastModified': datetime.now(), 'StorageClass': 'STANDARD', 'ETag': '"e"', 'Metadata': {}}
+    
+    @patch('src.lambda_function.s3_client')
+    @patch('src.lambda_function.bedrock_client')
+    def test_result_codes(self, mock_bedrock, mock_s3):
+        """Testa Succeeded, PermanentFailure (objeto ausente) e TemporaryFailure (throttling do Bedrock)"""
+        
+        from botocore.exceptions import ClientError
+        from src.lambda_function import batch_operations_handler
+        
+        mock_s3.head_object.side_effect = self._head_object
+        mock_bedrock.invoke_model.side_effect = ClientError(
+            {'Error': {'Code': 'ThrottlingException', 'Message': 'Rate exceeded'}}, 'InvokeModel')
+        
+        event = {
+            'invocationSchemaVersion': '1.0',
+            'invocationId': 'inv-1',
+            'job': {'id': 'job-1'},
+            'tasks': [
+                {'taskId': 't1', 's3Key': 'logs/app+2024.log', 's3BucketArn': 'arn:aws:s3:::test-bucket'},
+                {'taskId': 't2', 's3Key': 'sumiu.log', 's3BucketArn': 'arn:aws:s3:::test-bucket'},
+                {'taskId': 't3', 's3Key': 'dados.bin', 's3BucketArn': 'arn:aws:s3:::test-bucket'}
+            ]
+        }
+        
+        response = batch_operations_handler(event, None)
+        codes = {result['taskId']: result['resultCode'] for result in response['results']}
+        
+        self.assertEqual(response['invocationId'], 'inv-1')
+        self.assertEqual(response['treatMissingKeysAs'], 'PermanentFailure')
+        self.assertEqual(codes, {'t1': 'Succeeded', 't2': 'PermanentFailure', 't3': 'TemporaryFailure'})
+        self.assertEqual(response['results'][0]['resultString'], 'GLACIER')
+        mock_s3.copy_object.assert_called_once()
+        self.assertEqual(mock_s3.copy_object.call_args[1]['Key'], 'logs/app 2024.log')
+    
+    @patch('src.lambda_function.s3_client')
+    def test_schema_v2_bucket_name(self, mock_s3):
+        """Testa o schema 2.0, que envia o nome do bucket em vez do ARN"""
+        
+        from src.lambda_function import batch_operations_handler
+        
+        mock_s3.head_object.side_effect = self._head_object
+        event = {
+            'invocationSchemaVersion': '2.0',
+            'invocationId': 'inv-2',
+            'job': {'id': 'job-2', 'userArguments': {}},
+            'tasks': [{'taskId': 't1', 's3Key': 'a.log', 's3VersionId': None, 's3Bucket': 'outro-bucket'}]
+        }
+        
+        response = batch_operations_handler(event, None)
+        
+        self.assertEqual(response['invocationSchemaVersion'], '2.0')
+        self.assertEqual(response['results'][0]['resultCode'], 'Succeeded')
+        self.assertEqual(mock_s3.head_object.call_args[1]['Bucket'], 'outro-bucket')
+
+class TestCostModel(unittest.TestCase):
+    """Testes do modelo de custo de transição"""
+    
+    def test_small_object_to_ia_is_vetoed(self):
+        """Testa que o mínimo faturável de 128KB torna IA desvantajoso para objetos pequenos"""
+        
+        from src.cost_model import CostModel
+        
+        model = CostModel()
+        evaluation = model.evaluate_batch([10 * 1024], ['STANDARD'], ['STANDARD_IA'])[0]
+        
+        self.assertEqual(evaluation['decision'], 'veto')
+        self.assertLess(evaluation['projected_savings'], 0)
+    
+    def test_large_object_to_glacier_is_applied(self):
+        """Testa economia positiva para objeto grande indo para GLACIER"""
+        
+        from src.cost_model import CostModel
+        
+        savings = CostModel().project_savings(100 * 1024 ** 3, 'STANDARD', 'GLACIER')
+        
+        # 100GB por 12 meses: (0.023 - 0.004) * 100 * 365/30 menos a requisição
+        self.assertAlmostEqual(savings, 0.019 * 100 * 365 / 30, places=2)
+    
+    def test_minimum_duration_and_early_deletion(self):
+        """Testa duração mínima da classe destino e cobrança por saída antecipada da origem"""
+        
+        from src.cost_model import CostModel
+        
+        short = CostModel(horizon_days=30)
+        size = 1024 ** 3
+        
+        # DEEP_ARCHIVE cobra 180 dias mesmo com horizonte de 30
+        expected = 0.023 * 1 - (size + 40 * 1024) / 1024 ** 3 * 0.00099 * 6 - 0.05 / 1000
+        self.assertAlmostEqual(short.project_savings(size, 'STANDARD', 'DEEP_ARCHIVE'), expected, places=6)
+        
+        # Sair do STANDARD_IA com 10 dias de idade paga os 20 dias restantes
+        fresh = short.project_savings(size, 'STANDARD_IA', 'GLACIER', age_days=10)
+        aged = short.project_savings(size, 'STANDARD_IA', 'GLACIER', age_days=60)
+        self.assertAlmostEqual(aged - fresh, 0.0125 * 20 / 30, places=6)
+    
+    def test_price_override_and_threshold(self):
+        """Testa tabela de preços configurável e limiar mínimo de economia"""
+        
+        from src.cost_model import CostModel
+        
+        model = CostModel(prices={'GLACIER': {'storage': 0.023}}, min_savings=0.001)
+        evaluation = model.evaluate_batch([1024 ** 3], ['STANDARD'], ['GLACIER'])[0]
+        
+        self.assertEqual(model.prices['GLACIER']['min_days'], 90)
+        self.assertEqual(evaluation['decision'], 'veto')
+    
+    def test_batch_matches_single(self):
+        """Testa que a versão vetorizada coincide com o cálculo individual"""
+        
+        from src.cost_model import CostModel
+        
+        model = CostModel()
+        sizes = [1, 200 * 1024, 5 * 1024 ** 2, 3 * 1024 ** 3]
+        current = ['STANDARD', 'STANDARD', 'STANDARD_IA', 'REDUCED_REDUNDANCY']
+        target = ['STANDARD_IA', 'DEEP_ARCHIVE', 'GLACIER', 'GLACIER_IR']
+        ages = [0, 5, 12, 400]
+        
+        batch = model.project_savings_batch(sizes, current, target, ages)
+        single = [model.project_savings(*args) for args in zip(sizes, current, target, ages)]
+        
+        for left, right in zip(batch, single):
+            self.assertAlmostEqual(left, right, places=12)
+    
+    @patch('src.lambda_function.s3_client')
+    @patch('src.lambda_function.bedrock_client')
+    @patch('src.lambda_function.dynamodb')
+    def test_veto_skips_copy_and_is_recorded_in_insight(self, mock_dynamodb, mock_bedrock, mock_s3):
+        """Testa que a transição vetada não copia o objeto e o insight registra a decisão"""
+        
+        import src.lambda_function as lf
+        from src.cost_model import CostModel
+        
+        lf.recommendation_cache.clear()
+        
+        lf.similarity_index.clear()
+        mock_s3.head_object.return_value = {
+            'ContentLength': 200 * 1024, 'ContentType': 'application/octet-stream',
+            'LastModified': datetime.now(), 'StorageClass': 'STANDARD', 'ETag': '"e"', 'Metadata': {}
+        }
+        mock_bedrock.invoke_model.return_value = {'body': Mock(read=lambda: json.dumps({'content': [{'text': json.dumps(
+            {'storage_class': 'DEEP_ARCHIVE', 'reasoning': 'x', 'confidence': 'alta'})}]}).encode())}
+        mock_dynamodb.batch_get_item.return_value = {'Responses': {}}
+        mock_dynamodb.batch_write_item.return_value = {}
+        
+        event = {'Records': [{'s3': {'bucket': {'name': 'test-bucket'}, 'object': {'key': 'dados/curto.bin'}}}]}
+        with patch('src.lambda_function.TABLE_NAME', 'insights'), \
+             patch.object(lf.insight_sink, 'table_name', 'insights'), \
+             patch('src.lambda_function.cost_model', CostModel(horizon_days=30)):
+            response = lf.lambda_handler(event, None)
+        
+        self.assertEqual(response['results'][0]['skip_reason'], 'cost_veto')
+        mock_s3.copy_object.assert_not_called()
+        
+        item = mock_dynamodb.batch_write_item.call_args[1]['RequestItems']['insights'][0]['PutRequest']['Item']
+        self.assertEqual(item['cost_decision'], 'veto')
+        self.assertLess(item['projected_savings'], 0)
+
+class TestClientFactory(unittest.TestCase):
+    """Testes da fábrica de clientes boto3"""
+    
+    def test_settings_per_service_with_global_fallback(self):
+        """Testa variáveis por serviço com fallback para as globais"""
+        
+        from src.clients import client_settings
+        
+        environ = {'BEDROCK_READ_TIMEOUT': '120', 'CLIENT_READ_TIMEOUT': '30', 'BEDROCK_REGION': 'us-west-2',
+                   'CLIENT_RETRY_MODE': 'standard', 'S3_TCP_KEEPALIVE': 'false'}
+        
+        bedrock = client_settings('BEDROCK', max_pool_connections=16, default_region='us-east-1', environ=environ)
+        s3 = client_settings('S3', environ=environ)
+        
+        self.assertEqual(bedrock['read_timeout'], 120)
+        self.assertEqual(bedrock['region_name'], 'us-west-2')
+        self.assertEqual(bedrock['max_pool_connections'], 16)
+        self.assertEqual(bedrock['retries'], {'mode': 'standard', 'max_attempts': 5})
+        self.assertTrue(bedrock['tcp_keepalive'])
+        self.assertEqual(s3['read_timeout'], 30)
+        self.assertIsNone(s3['region_name'])
+        self.assertFalse(s3['tcp_keepalive'])
+    
+    def test_create_client_applies_config(self):
+        """Testa que o cliente criado recebe região, pool, timeouts e retry adaptativo"""
+        
+        from src.clients import create_client
+        
+        client = create_client('bedrock-runtime', 'BEDROCK', max_pool_connections=32, default_region='us-east-1',
+                               environ={'BEDROCK_CONNECT_TIMEOUT': '2'})
+        
+        self.assertEqual(client.meta.region_name, 'us-east-1')
+        self.assertEqual(client.meta.config.max_pool_connections, 32)
+        self.assertEqual(client.meta.config.connect_timeout, 2)
+        self.assertEqual(client.meta.config.retries['mode'], 'adaptive')
+    
+    def test_lazy_client_created_once_on_first_use(self):
+        """Testa criação preguiçosa e única do cliente, mesmo com acesso concorrente"""
+        
+        from concurrent.futures import ThreadPoolExecutor
+        from src.clients import LazyClient
+        
+        factory = Mock(return_value=Mock(head_object=Mock(return_value='ok')))
+        client = LazyClient(factory)
+        
+        self.assertFalse(client.created)
+        factory.assert_not_called()
+        
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda _: client.head_object(), range(32)))
+        
+        self.assertEqual(set(results), {'ok'})
+        factory.assert_called_once()
+
+class FakeClock:
+    """Relógio controlado pelo teste; sleep avança o tempo"""
+    
+    def __init__(self):
+        self.now = 1000.0
+    
+    def __call__(self):
+        return self.now
+    
+    def sleep(self, seconds):
+        self.now += seconds
+
+class TestRateLimiter(unittest.TestCase):
+    """Testes do limitador de chamadas ao Bedrock"""
+    
+    def _throttle(self):
+        from botocore.exceptions import ClientError
+        return ClientError({'Error': {'Code': 'ThrottlingException', 'Message': 'Rate exceeded'}}, 'InvokeModel')
+    
+    def test_token_bucket_rate_and_burst(self):
+        """Testa consumo do burst e reposição na taxa configurada"""
+        
+        from src.rate_limiter import TokenBucket
+        
+        clock = FakeClock()
+        bucket = TokenBucket(rate=2, burst=2, clock=clock)
+        
+        self.assertEqual([bucket.try_acquire(), bucket.try_acquire()], [0, 0])
+        self.assertAlmostEqual(bucket.try_acquire(), 0.5)
+        clock.sleep(0.5)
+        self.assertEqual(bucket.try_acquire(), 0)
+    
+    def test_aimd_backs_off_on_throttle_and_ramps_up(self):
+        """Testa redução multiplicativa no throttling e aumento aditivo nos sucessos"""
+        
+        from src.rate_limiter import AdaptiveLimiter
+        
+        clock = FakeClock()
+        limiter = AdaptiveLimiter(max_concurrency=8, clock=clock, sleep=clock.sleep)
+        
+        for _ in range(2):
+            with self.assertRaises(Exception):
+                limiter.call(Mock(side_effect=self._throttle()))
+        self.assertEqual(limiter.limit, 2)
+        
+        for _ in range(5):
+            limiter.call(lambda: 'ok')
+        self.assertGreater(limiter.limit, 3)
+        self.assertLessEqual(limiter.limit, 8)
+        
+        metrics = limiter.metrics()
+        self.assertEqual(metrics['throttles'], 2)
+        self.assertAlmostEqual(metrics['throttle_rate'], 2 / 7, places=3)
+        self.assertGreater(metrics['effective_rps'], 0)
+    
+    def test_rate_limited_when_token_not_available_in_time(self):
+        """Testa que a chamada é recusada quando o próximo token passa do prazo"""
+        
+        from src.rate_limiter import AdaptiveLimiter, RateLimited
+        
+        clock = FakeClock()
+        limiter = AdaptiveLimiter(rate=0.1, burst=1, acquire_timeout=1, clock=clock, sleep=clock.sleep)
+        
+        limiter.call(lambda: 'ok')
+        with self.assertRaises(RateLimited):
+            limiter.call(lambda: 'ok')
+        self.assertEqual(limiter.metrics()['rate_limited'], 1)
+    
+    def test_shared_counter_limits_window(self):
+        """Testa o contador global por janela de um segundo no DynamoDB"""
+        
+        from botocore.exceptions import ClientError
+        from src.rate_limiter import SharedRateCounter
+        
+        windows = {}
+        
+        def update_item(Key, ExpressionAttributeValues, **kwargs):
+            used = windows.get(Key['limiter_id'], 0)
+            if used >= ExpressionAttributeValues[':limit']:
+                raise ClientError({'Error': {'Code': 'ConditionalCheckFailedException', 'Message': ''}}, 'UpdateItem')
+            windows[Key['limiter_id']] = used + 1
+        
+        table = Mock(update_item=Mock(side_effect=update_item))
+        counter = SharedRateCounter(lambda: table, 'bedrock', limit=2, clock=lambda: 100.25)
+        
+        self.assertEqual([counter.try_acquire(), counter.try_acquire()], [0, 0])
+        self.assertAlmostEqual(counter.try_acquire(), 0.75)
+        self.assertEqual(windows, {'bedrock#100': 2})
+    
+    @patch('src.lambda_function.s3_client')
+    @patch('src.lambda_function.bedrock_client')
+    @patch('src.lambda_function.sqs_client')
+    def test_unanalyzed_records_are_deferred(self, mock_sqs, mock_bedrock, mock_s3):
+        """Testa que registros sem recomendação por throttling voltam à fila com atraso"""
+        
+        import src.lambda_function as lf
+        
+        lf.recommendation_cache.clear()
+        
+        lf.similarity_index.clear()
+        mock_s3.head_object.return_value = {
+            'ContentLength': 5 * 1024 * 1024, 'ContentType': 'application/octet-stream',
+            'LastModified': datetime.now(), 'StorageClass': 'STANDARD', 'ETag': '"e"', 'Metadata': {}
+        }
+        mock_bedrock.invoke_model.side_effect = self._throttle()
+        mock_sqs.send_message_batch.return_value = {'Successful': [{'Id': '0'}], 'Failed': []}
+        
+        event = {'Records': [{'s3': {'bucket': {'name': 'test-bucket'}, 'object': {'key': 'dados/x%2B1.bin'}}}]}
+        with patch('src.lambda_function.DEFERRED_QUEUE_URL', 'https://sqs/fila'):
+            response = lf.lambda_handler(event, None)
+        
+        self.assertEqual(response['results'][0]['status'], 'deferred')
+        mock_s3.copy_object.assert_not_called()
+        
+        entry = mock_sqs.send_message_batch.call_args[1]['Entries'][0]
+        body = json.loads(entry['MessageBody'])
+        self.assertEqual(body['Records'][0]['s3']['object']['key'], 'dados%2Fx%2B1.bin')
+        self.assertEqual(entry['DelaySeconds'], lf.DEFER_DELAY_SECONDS)
+        
+        # A mensagem adiada é um evento S3 válido para o handler SQS
+        records = lf.parse_sqs_message({'messageId': 'm', 'body': entry['MessageBody']})
+        self.assertEqual(urllib.parse.unquote_plus(records[0]['s3']['object']['key']), 'dados/x+1.bin')
+
+class TestModelTiering(unittest.TestCase):
+    """Testes da análise em camadas (modelo rápido primeiro, escalação para o maior)"""
+    
+    def setUp(self):
+        self.metadata = {
+            'file_name': 'dados/relatorio.pdf', 'file_size': 5 * 1024 * 1024, 'file_type': 'pdf',
+            'content_type': 'application/pdf', 'storage_class': 'STANDARD'
+        }
+    
+    def _response(self, payload):
+        text = payload if isinstance(payload, str) else json.dumps(payload)
+        return {'body': Mock(read=lambda: json.dumps({'content': [{'text': text}]}).encode())}
+    
+    def _models(self, mock_bedrock):
+        return [call[1]['modelId'] for call in mock_bedrock.invoke_model.call_args_list]
+    
+    @patch('src.lambda_function.bedrock_client')
+    def test_fast_model_answers_when_confident(self, mock_bedrock):
+        """Testa que resposta confiante do modelo rápido não escala"""
+        
+        import src.lambda_function as lf
+        
+        mock_bedrock.invoke_model.return_value = self._response(
+            {'storage_class': 'STANDARD_IA', 'reasoning': 'Documento', 'confidence': 'alta'})
+        
+        result = lf.analyze_with_bedrock(self.metadata)
+        
+        self.assertEqual(self._models(mock_bedrock), [lf.FAST_MODEL_ID])
+        self.assertEqual(result['model_tier'], 'fast')
+        self.assertIn('analysis_ms', result)
+    
+    @patch('src.lambda_function.bedrock_client')
+    def test_escalates_on_low_confidence_and_invalid_json(self, mock_bedrock):
+        """Testa escalação para o modelo maior com confiança baixa ou JSON inválido"""
+        
+        import src.lambda_function as lf
+        
+        for fast_answer in ({'storage_class': 'GLACIER', 'reasoning': 'x', 'confidence': 'baixa'},
+                            'não é json',
+                            {'storage_class': 'CLASSE_INVENTADA', 'reasoning': 'x', 'confidence': 'alta'}):
+            mock_bedrock.reset_mock()
+            mock_bedrock.invoke_model.side_effect = [
+                self._response(fast_answer),
+                self._response({'storage_class': 'STANDARD_IA', 'reasoning': 'Documento', 'confidence': 'alta'})
+            ]
+            
+            result = lf.analyze_with_bedrock(self.metadata)
+            
+            self.assertEqual(self._models(mock_bedrock), [lf.FAST_MODEL_ID, lf.MODEL_ID])
+            self.assertEqual(result['storage_class'], 'STANDARD_IA')
+            self.assertEqual(result['model_tier'], 'escalated')
+            self.assertEqual(result['model_id'], lf.MODEL_ID)
+    
+    @patch('src.lambda_function.bedrock_client')
+    def test_batch_escalates_only_unresolved_entries(self, mock_bedrock):
+        """Testa que só as entradas com confiança baixa ou ausentes vão ao modelo maior"""
+        
+        import src.lambda_function as lf
+        
+        metadata_list = [dict(self.metadata, file_name=f'dados/{i}.pdf') for i in range(3)]
+        mock_bedrock.invoke_model.side_effect = [
+            self._response([
+                {'index': 0, 'storage_class': 'STANDARD_IA', 'reasoning': 'a', 'confidence': 'alta'},
+                {'index': 1, 'storage_class': 'GLACIER', 'reasoning': 'b', 'confidence': 'baixa'}
+            ]),
+            self._response([
+                {'index': 0, 'storage_class': 'STANDARD', 'reasoning': 'c', 'confidence': 'média'},
+                {'index': 1, 'storage_class': 'DEEP_ARCHIVE', 'reasoning': 'd', 'confidence': 'alta'}
+            ])
+        ]
+        
+        result = lf.analyze_batch_with_bedrock(metadata_list)
+        
+        self.assertEqual(self._models(mock_bedrock), [lf.FAST_MODEL_ID, lf.MODEL_ID])
+        escalation_prompt = json.loads(mock_bedrock.invoke_model.call_args_list[1][1]['body'])['messages'][0]['content']
+        self.assertNotIn('dados/0.pdf', escalation_prompt)
+        self.assertEqual([r['storage_class'] for r in result], ['STANDARD_IA', 'STANDARD', 'DEEP_ARCHIVE'])
+        self.assertEqual([r['model_tier'] for r in result], ['fast', 'escalated', 'escalated'])
+    
+    @patch('src.lambda_function.bedrock_client')
+    def test_single_tier_mode_and_insight_fields(self, mock_bedrock):
+        """Testa o modo sem camadas e o registro da camada no insight"""
+        
+        import src.lambda_function as lf
+        
+        mock_bedrock.invoke_model.return_value = self._response(
+            {'storage_class': 'GLACIER', 'reasoning': 'x', 'confidence': 'baixa'})
+        
+        with patch('src.lambda_function.TIERED_ANALYSIS', False):
+            result = lf.analyze_with_bedrock(self.metadata)
+        
+        self.assertEqual(self._models(mock_bedrock), [lf.MODEL_ID])
+        
+        item = lf.build_insight_item('bucket', 'dados/relatorio.pdf', dict(self.metadata, etag='e'), result)
+        self.assertEqual(item['model_tier'], 'single')
+        self.assertEqual(item['model_id'], lf.MODEL_ID)
+        self.assertIsInstance(item['analysis_ms'], int)
+
+class TestStructuredOutput(unittest.TestCase):
+    """Testes da saída estruturada via ferramenta (tool use) e da contagem de tokens"""
+    
+    def setUp(self):
+        self.metadata = {
+            'file_name': 'dados/relatorio.pdf', 'file_size': 5 * 1024 * 1024, 'file_type': 'pdf',
+            'content_type': 'application/pdf', 'storage_class': 'STANDARD'
+        }
+    
+    def _tool_response(self, name, tool_input, input_tokens=120, output_tokens=40):
+        return {'body': Mock(read=lambda: json.dumps({
+            'content': [{'type': 'tool_use', 'id': 't1', 'name': name, 'input': tool_input}],
+            'usage': {'input_tokens': input_tokens, 'output_tokens': output_tokens}
+        }).encode())}
+    
+    @patch('src.lambda_function.bedrock_client')
+    def test_tool_schema_and_usage(self, mock_bedrock):
+        """Testa que a ferramenta é exigida com enum de classes e que os tokens chegam ao insight"""
+        
+        import src.lambda_function as lf
+        
+        mock_bedrock.invoke_model.return_value = self._tool_response(
+            'recommend_storage_class', {'storage_class': 'STANDARD_IA', 'reasoning': 'Documento', 'confidence': 'alta'})
+        
+        result = lf.analyze_with_bedrock(self.metadata)
+        
+        body = json.loads(mock_bedrock.invoke_model.call_args[1]['body'])
+        self.assertEqual(body['tool_choice'], {'type': 'tool', 'name': 'recommend_storage_class'})
+        schema = body['tools'][0]['input_schema']
+        self.assertEqual(schema['properties']['storage_class']['enum'], list(lf.STORAGE_CLASSES))
+        self.assertIn('dados/relatorio.pdf', body['messages'][0]['content'])
+        
+        self.assertEqual(result['storage_class'], 'STANDARD_IA')
+        self.assertEqual((result['input_tokens'], result['output_tokens']), (120, 40))
+        
+        item = lf.build_insight_item('bucket', 'dados/relatorio.pdf', dict(self.metadata, etag='e'), result)
+        self.assertEqual((item['input_tokens'], item['output_tokens']), (120, 40))
+    
+    @patch('src.lambda_function.bedrock_client')
+    def test_strict_validation_escalates(self, mock_bedrock):
+        """Testa que saída fora do esquema (confiança inválida) é rejeitada e escalada"""
+        
+        import src.lambda_function as lf
+        
+        mock_bedrock.invoke_model.side_effect = [
+            self._tool_response('recommend_storage_class',
+                                {'storage_class': 'GLACIER', 'reasoning': 'x', 'confidence': 'altíssima'}),
+            self._tool_response('recommend_storage_class',
+                                {'storage_class': 'GLACIER', 'reasoning': 'x', 'confidence': 'alta'})
+        ]
+        
+        before = dict(lf.analysis_stats)
+        result = lf.analyze_with_bedrock(self.metadata)
+        
+        self.assertEqual(result['model_tier'], 'escalated')
+        self.assertEqual(lf.analysis_stats['invalid'] - before['invalid'], 1)
+        self.assertEqual(lf.analysis_stats['fallbacks'], before['fallbacks'])
+    
+    @patch('src.lambda_function.bedrock_client')
+    def test_batch_tool_splits_tokens(self, mock_bedrock):
+        """Testa o lote via ferramenta com os tokens da chamada divididos entre os arquivos"""
+        
+        import src.lambda_function as lf
+        
+        metadata_list = [dict(self.metadata, file_name=f'dados/{index}.pdf') for index in range(2)]
+        mock_bedrock.invoke_model.return_value = self._tool_response('recommend_storage_classes', {
+            'recommendations': [
+                {'index': 1, 'storage_class': 'GLACIER', 'reasoning': 'b', 'confidence': 'alta'},
+                {'index': 0, 'storage_class': 'STANDARD', 'reasoning': 'a', 'confidence': 'média'}
+            ]
+        }, input_tokens=200, output_tokens=80)
+        
+        result = lf.analyze_batch_with_bedrock(metadata_list)
+        
+        self.assertEqual(mock_bedrock.invoke_model.call_count, 1)
+        self.assertEqual([r['storage_class'] for r in result], ['STANDARD', 'GLACIER'])
+        self.assertEqual([(r['input_tokens'], r['output_tokens']) for r in result], [(100, 40), (100, 40)])
+
+class TestCircuitBreaker(unittest.TestCase):
+    """Testes do circuit breaker do Bedrock e da heurística local"""
+    
+    def setUp(self):
+        self.metadata = {
+            'file_name': 'dados/relatorio.pdf', 'file_size': 5 * 1024 * 1024, 'file_type': 'pdf',
+            'content_type': 'application/pdf', 'storage_class': 'STANDARD'
+        }
+    
+    def _fail(self):
+        raise TimeoutError("read timeout")
+    
+    def test_opens_on_errors_and_recovers_through_probe(self):
+        """Testa abertura por taxa de erro, recusa imediata e fechamento após teste bem-sucedido"""
+        
+        from src.circuit_breaker import CircuitBreaker, CircuitOpen
+        
+        clock = FakeClock()
+        breaker = CircuitBreaker(min_calls=4, error_rate=0.5, open_seconds=30, clock=clock)
+        
+        for outcome in (lambda: 'ok', self._fail, lambda: 'ok', self._fail):
+            try:
+                breaker.call(outcome)
+            except TimeoutError:
+                pass
+        
+        self.assertEqual(breaker.state, 'open')
+        self.assertRaises(CircuitOpen, breaker.call, lambda: 'ok')
+        
+        clock.sleep(30)
+        self.assertTrue(breaker.available())
+        self.assertRaises(TimeoutError, breaker.call, self._fail)
+        self.assertEqual(breaker.state, 'open')
+        
+        clock.sleep(30)
+        self.assertEqual(breaker.call(lambda: 'ok'), 'ok')
+        self.assertEqual(breaker.state, 'closed')
+    
+    def test_opens_on_slow_calls_and_ignores_throttling(self):
+        """Testa abertura por latência e que throttling não conta como falha"""
+        
+        from botocore.exceptions import ClientError
+        from src.circuit_breaker import CircuitBreaker
+        from src.rate_limiter import is_throttle
+        
+        clock = FakeClock()
+        breaker = CircuitBreaker(min_calls=3, slow_seconds=5, slow_rate=0.5, ignore=is_throttle, clock=clock)
+        throttle = ClientError({'Error': {'Code': 'ThrottlingException'}}, 'InvokeModel')
+        
+        def throttled():
+            raise throttle
+        
+        for _ in range(3):
+            self.assertRaises(ClientError, breaker.call, throttled)
+        self.assertEqual(breaker.state, 'closed')
+        
+        def slow():
+            clock.sleep(6)
+            return 'ok'
+        
+        breaker.call(lambda: 'ok')
+        breaker.call(slow)
+        self.assertEqual(breaker.state, 'closed')
+        breaker.call(slow)
+        self.assertEqual(breaker.state, 'open')
+    
+    @patch('src.lambda_function.bedrock_client')
+    def test_open_circuit_uses_local_heuristic(self, mock_bedrock):
+        """Testa que com o circuito aberto a análise não chama o Bedrock e marca o insight"""
+        
+        import src.lambda_function as lf
+        from src.circuit_breaker import CircuitBreaker
+        
+        clock = FakeClock()
+        breaker = CircuitBreaker(min_calls=1, clock=clock)
+        self.assertRaises(TimeoutError, breaker.call, self._fail)
+        
+        with patch('src.lambda_function.bedrock_breaker', breaker):
+            single = lf.analyze_with_bedrock(self.metadata)
+            batch = lf.analyze_batch_with_bedrock([self.metadata, dict(self.metadata, file_name='x.bin', file_type='bin')])
+        
+        mock_bedrock.invoke_model.assert_not_called()
+        self.assertEqual(single['source'], 'heuristic')
+        self.assertEqual(single['storage_class'], 'STANDARD_IA')
+        self.assertEqual([r['storage_class'] for r in batch], ['STANDARD_IA', 'STANDARD'])
+        
+        item = lf.build_insight_item('bucket', 'dados/relatorio.pdf', dict(self.metadata, etag='e'), single)
+        self.assertEqual(item['recommendation_source'], 'heuristic')
+        
+        # Recomendações da heurística não entram no cache
+        lf.recommendation_cache.clear()
+        lf.similarity_index.clear()
+        lf.recommendation_cache.put(self.metadata, single)
+        self.assertIsNone(lf.recommendation_cache.get(self.metadata))
+
+class TestEventCoalescing(unittest.TestCase):
+    """Testes do agrupamento de eventos do mesmo objeto dentro do lote"""
+    
+    def _record(self, key, sequencer=None, event_name='ObjectCreated:Put', size=5 * 1024 * 1024):
+        record = {
+            'eventName': event_name,
+            's3': {'bucket': {'name': 'bucket'}, 'object': {'key': key, 'size': size, 'eTag': 'e'}}
+        }
+        if sequencer:
+            record['s3']['object']['sequencer'] = sequencer
+        return record
+    
+    def test_keeps_newest_by_sequencer(self):
+        """Testa que vence o maior sequencer, comparado como hexadecimal de tamanhos diferentes"""
+        
+        from src.lambda_function import coalesce_records
+        
+        records = [
+            self._record('logs/app.log', '00A1B2C3D4E5F60001'),
+            self._record('outro.bin', '0055'),
+            self._record('logs/app.log', '00A1B2C3D4E5F60003'),
+            self._record('logs%2Fapp.log', 'A1B2C3D4E5F60002'),
+        ]
+        
+        latest, collapsed = coalesce_records(records)
+        
+        self.assertEqual(latest, [1, 2])
+        self.assertEqual(collapsed, {0: 'superseded', 3: 'superseded'})
+    
+    def test_later_delete_drops_key(self):
+        """Testa que uma remoção posterior descarta todos os eventos do objeto"""
+        
+        from src.lambda_function import coalesce_records
+        
+        records = [
+            self._record('tmp/a.csv', '01'),
+            self._record('tmp/a.csv', '03', event_name='ObjectRemoved:Delete'),
+            self._record('tmp/b.csv', '01', event_name='ObjectRemoved:Delete'),
+            self._record('tmp/b.csv', '02'),
+        ]
+        
+        latest, collapsed = coalesce_records(records)
+        
+        self.assertEqual(latest, [3])
+        self.assertEqual(collapsed, {0: 'deleted', 1: 'deleted', 2: 'superseded'})
+    
+    @patch('src.lambda_function.s3_client')
+    @patch('src.lambda_function.bedrock_client')
+    def test_delete_marker_event_is_inert(self, mock_bedrock, mock_s3):
+        """Testa que uma remoção isolada (sem tamanho nem ETag) é ignorada sem chamadas ao S3"""
+        
+        import src.lambda_function as lf
+        
+        record = {'eventName': 'ObjectRemoved:DeleteMarkerCreated',
+                  's3': {'bucket': {'name': 'bucket'}, 'object': {'key': 'tmp/c.csv', 'sequencer': '05'}}}
+        with patch('src.lambda_function.TABLE_NAME', None):
+            result = lf.lambda_handler({'Records': [record]}, {})
+        
+        self.assertEqual([r['skip_reason'] for r in result['results']], ['deleted'])
+        mock_s3.head_object.assert_not_called()
+        mock_bedrock.invoke_model.assert_not_called()
+    
+    @patch('src.lambda_function.s3_client')
+    @patch('src.lambda_function.bedrock_client')
+    def test_overwrite_storm_costs_one_analysis(self, mock_bedrock, mock_s3):
+        """Testa que várias sobrescritas no lote geram uma única análise e resultados alinhados"""
+        
+        import src.lambda_function as lf
+        
+        mock_s3.head_object.return_value = {
+            'ContentLength': 5 * 1024 * 1024, 'ContentType': 'application/octet-stream',
+            'LastModified': datetime.now(), 'StorageClass': 'STANDARD', 'ETag': '"e"', 'Metadata': {}
+        }
+        mock_bedrock.invoke_model.return_value = {'body': Mock(read=lambda: json.dumps({'content': [{'text': json.dumps(
+            {'storage_class': 'STANDARD', 'reasoning': 'x', 'confidence': 'alta'})}]}).encode())}
+        lf.recommendation_cache.clear()
+        lf.similarity_index.clear()
+        
+        records = [self._record('ckpt/state.bin', f'{sequence:04X}') for sequence in range(20)]
+        with patch('src.lambda_function.TABLE_NAME', None):
+            results = lf.process_s3_records(records)
+        
+        self.assertEqual(len(results), 20)
+        self.assertEqual([r.get('skip_reason') for r in results[:19]], ['superseded'] * 19)
+        self.assertEqual(results[19]['skip_reason'], 'same_class')
+        self.assertLessEqual(mock_bedrock.invoke_model.call_count, 1)
+
+class TestKeyTemplates(unittest.TestCase):
+    """Testes da normalização de chaves em templates e do memo por template"""
+    
+    def test_normalize_key(self):
+        """Testa datas, ids, UUIDs, hashes e partições colapsados no template"""
+        
+        from key_templates import normalize_key
+        
+        cases = {
+            'logs/2025/10/17/host-42/app.log.gz': 'logs/{date}/{id}/app.log.gz',
+            'exports/tenant=123/part-00017.parquet': 'exports/tenant={value}/part-{n}.parquet',
+            'uploads/3f2504e0-4f89-11d3-9a0c-0305e82c3301.json': 'uploads/{uuid}.json',
+            'blobs/d41d8cd98f00b204e9800998ecf8427e.bin': 'blobs/{hash}.bin',
+            'dumps/db_2025-10-17T03:00:00Z.sql': 'dumps/db_{date}.sql',
+            'media/video.mp4': 'media/video.mp4'
+        }
+        for key, template in cases.items():
+            self.assertEqual(normalize_key(key), template)
+    
+    def test_learning_is_capped_and_counts_hits(self):
+        """Testa contagem de acessos, limite de templates e chaves sem partes variáveis"""
+        
+        from key_templates import KeyTemplates
+        
+        templates = KeyTemplates(max_templates=2)
+        for day in range(1, 4):
+            templates.learn(f'logs/2025/10/{day:02d}/app.log')
+        templates.learn('exports/tenant=1/a.csv')
+        templates.learn('backups/host-1/db.sql')
+        
+        self.assertIsNone(templates.learn('dados/relatorio.pdf'))
+        self.assertEqual(templates.hits('logs/{date}/app.log'), 0)
+        self.assertEqual(templates.top(), [('exports/tenant={value}/a.csv', 1), ('backups/{id}/db.sql', 1)])
+        self.assertEqual(templates.stats['evicted'], 1)
+    
+    @patch('src.lambda_function.bedrock_client')
+    def test_one_analysis_per_template(self, mock_bedrock):
+        """Testa que chaves do mesmo padrão compartilham uma análise e o template vai ao prompt"""
+        
+        import src.lambda_function as lf
+        
+        mock_bedrock.invoke_model.return_value = {'body': Mock(read=lambda: json.dumps({'content': [{'text': json.dumps(
+            {'storage_class': 'GLACIER', 'reasoning': 'Export', 'confidence': 'alta'})}]}).encode())}
+        lf.key_templates.clear()
+        lf.recommendation_cache.clear()
+        lf.similarity_index.clear()
+        
+        def metadata(key, size):
+            return {'file_name': key, 'file_size': size, 'file_type': 'parquet',
+                    'content_type': 'application/octet-stream', 'storage_class': 'STANDARD'}
+        
+        batch = lf.get_recommendations([metadata(f'exports/tenant={tenant}/part-0001.parquet', tenant * 2 ** 20)
+                                        for tenant in range(1, 6)])
+        later = lf.get_recommendations([metadata('exports/tenant=99/part-0042.parquet', 2 ** 30)])[0]
+        
+        self.assertEqual(mock_bedrock.invoke_model.call_count, 1)
+        prompt = json.loads(mock_bedrock.invoke_model.call_args[1]['body'])['messages'][0]['content']
+        self.assertIn('padrão exports/tenant={value}/part-{n}.parquet', prompt)
+        self.assertEqual({r['storage_class'] for r in batch}, {'GLACIER'})
+        self.assertEqual(later['source'], 'template')
+        self.assertEqual(lf.key_templates.hits('exports/tenant={value}/part-{n}.parquet'), 6)
+
+class TestSimilarityIndex(unittest.TestCase):
+    """Testes do reaproveitamento de recomendações por similaridade"""
+    
+    def _metadata(self, file_name, file_size=3 * 1024 * 1024, file_type='pdf', content_type='application/pdf'):
+        return {'file_name': file_name, 'file_size': file_size, 'file_type': file_type,
+                'content_type': content_type, 'storage_class': 'STANDARD'}
+    
+    def _recommendation(self, confidence='alta'):
+        return {'storage_class': 'STANDARD_IA', 'reasoning': 'Relatório', 'confidence': confidence}
+    
+    def test_reuses_only_close_neighbours(self):
+        """Testa reaproveitamento para objetos parecidos e recusa para tipo ou tamanho diferentes"""
+        
+        import src.similarity_index as similarity
+        
+        for numpy_module in (similarity._numpy(), None):
+            with patch.object(similarity, 'np', numpy_module):
+                index = similarity.SimilarityIndex(max_entries=8)
+                index.add(self._metadata('exports/acme/report-2025-q1.pdf'), self._recommendation())
+                index.add(self._metadata('exports/acme/notes.txt'), self._recommendation('média'))
+                
+                hit = index.lookup(self._metadata('exports/acme/report-2025-q2.pdf', 3_500_000))
+                self.assertEqual(hit['source'], 'similar')
+                self.assertEqual(hit['similar_to'], 'exports/acme/report-2025-q1.pdf')
+                
+                self.assertIsNone(index.lookup(self._metadata('exports/acme/report-2025-q2.pdf',
+                                                              file_type='png', content_type='image/png')))
+                self.assertIsNone(index.lookup(self._metadata('exports/acme/report-2025-q1.pdf', 300 * 1024 ** 2)))
+                self.assertIsNone(index.lookup(self._metadata('exports/acme/notes.txt')))
+                self.assertEqual(len(index), 1)
+    
+    def test_type_must_match_exactly(self):
+        """Testa que tipos cujo hash colide (pdf e zip) nunca reaproveitam a recomendação um do outro"""
+        
+        import src.similarity_index as similarity
+        
+        pdf, archive = self._metadata('dados/relatorio.pdf'), self._metadata(
+            'dados/relatorio.zip', file_type='zip', content_type='application/zip')
+        self.assertEqual(similarity._type_block(similarity.type_label(pdf)).keys(),
+                         similarity._type_block(similarity.type_label(archive)).keys())
+        
+        for numpy_module in (similarity._numpy(), None):
+            with patch.object(similarity, 'np', numpy_module):
+                index = similarity.SimilarityIndex(max_entries=4096)
+                index.add(pdf, self._recommendation())
+                self.assertIsNone(index.lookup(archive))
+                self.assertIsNotNone(index.lookup(pdf))
+                if numpy_module is None:
+                    self.assertEqual(index.max_entries, similarity.FALLBACK_MAX_ENTRIES)
+    
+    def test_bounded_and_snapshot_roundtrip(self):
+        """Testa o limite de entradas (as mais antigas saem) e a restauração do snapshot"""
+        
+        from src.similarity_index import SimilarityIndex
+        
+        names = ['juridico/contrato.pdf', 'financeiro/balanco.pdf', 'rh/holerite.pdf',
+                 'vendas/proposta.pdf', 'marketing/campanha.pdf']
+        index = SimilarityIndex(max_entries=3)
+        for name in names:
+            index.add(self._metadata(name), self._recommendation())
+        
+        snapshot = json.loads(json.dumps(index.snapshot()))
+        self.assertEqual([entry['file_name'] for entry in snapshot], names[2:])
+        
+        restored = SimilarityIndex(max_entries=3)
+        restored.restore(snapshot)
+        self.assertFalse(restored.dirty)
+        self.assertEqual(restored.lookup(self._metadata('marketing/campanha.pdf'))['similarity'], 1.0)
+        self.assertIsNone(restored.lookup(self._metadata('juridico/contrato.pdf')))
+    
+    @patch('src.lambda_function.s3_client')
+    @patch('src.lambda_function.bedrock_client')
+    def test_similar_object_skips_bedrock_and_persists(self, mock_bedrock, mock_s3):
+        """Testa que o objeto parecido não chama o Bedrock e que o índice é gravado no S3"""
+        
+        import src.lambda_function as lf
+        
+        mock_bedrock.invoke_model.return_value = {'body': Mock(read=lambda: json.dumps({'content': [{'text': json.dumps(
+            self._recommendation())}]}).encode())}
+        lf.recommendation_cache.clear()
+        lf.similarity_index.clear()
+        
+        with patch('src.lambda_function.KEY_TEMPLATES', False), \
+                patch('src.lambda_function.SIMILARITY_SNAPSHOT', 's3://estado/similaridade.json'), \
+                patch.dict(lf.similarity_snapshot, {'loaded': True, 'saved_at': 0.0}):
+            first = lf.get_recommendations([self._metadata('exports/acme/report-2025-q1.pdf')])[0]
+            second = lf.get_recommendations([self._metadata('exports/acme/report-2025-q2.pdf', 5_000_000,
+                                                            content_type='application/pdf; charset=binary')])[0]
+            lf.save_similarity_snapshot()
+        
+        self.assertEqual(first['confidence'], 'alta')
+        self.assertEqual(second['source'], 'similar')
+        mock_bedrock.invoke_model.assert_called_once()
+        
+        put_args = mock_s3.put_object.call_args[1]
+        self.assertEqual((put_args['Bucket'], put_args['Key']), ('estado', 'similaridade.json'))
+        self.assertEqual(len(json.loads(put_args['Body'])), 1)
+
+def sniff_samples():
+    """Primeiros bytes de cada formato reconhecido pelo sniffer"""
+    
+    import gzip
+    import io
+    import tarfile
+    import zipfile
+    
+    zipped = io.BytesIO()
+    with zipfile.ZipFile(zipped, 'w') as archive:
+        archive.writestr('a.txt', 'conteúdo')
+    
+    tarred = io.BytesIO()
+    with tarfile.open(fileobj=tarred, mode='w', format=tarfile.USTAR_FORMAT) as archive:
+        info = tarfile.TarInfo('a.txt')
+        info.size = 3
+        archive.addfile(info, io.BytesIO(b'abc'))
+    
+    return {
+        'gzip': gzip.compress(b'x' * 100),
+        'zstd': b'\x28\xb5\x2f\xfd' + bytes(range(60)),
+        'zip': zipped.getvalue(),
+        'pdf': b'%PDF-1.7\n%\xe2\xe3\xcf\xd3\n',
+        'jpeg': b'\xff\xd8\xff\xe0\x00\x10JFIF',
+        'png': b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR',
+        'parquet': b'PAR1\x15\x04\x15\x10',
+        'orc': b'ORC\x0a\x0b',
+        'tar': tarred.getvalue()[:4096],
+        'sqlite': b'SQLite format 3\x00\x10\x00',
+        'json': b'{"evento": "acesso", "usuario": 1}\n' * 50,
+        'text': b'2025-10-17 12:00:00 INFO requisicao atendida\n' * 50,
+    }
+
+class TestContentSniffer(unittest.TestCase):
+    """Testes da identificação de formato pelos magic bytes"""
+    
+    def test_detects_formats(self):
+        """Testa a assinatura de cada formato e as marcas de comprimido/compressível"""
+        
+        from content_sniffer import sniff
+        
+        for expected, data in sniff_samples().items():
+            self.assertEqual(sniff(data)['format'], expected)
+        
+        self.assertTrue(sniff(sniff_samples()['gzip'])['compressed'])
+        self.assertTrue(sniff(sniff_samples()['text'])['compressible'])
+        
+        noise = sniff(os.urandom(4096))
+        self.assertEqual(noise['format'], 'unknown')
+        self.assertFalse(noise['compressed'] or noise['compressible'])
+    
+    def test_ranged_get(self):
+        """Testa que só os primeiros KB são pedidos ao S3"""
+        
+        from content_sniffer import SNIFF_BYTES, sniff_object
+        
+        s3 = Mock()
+        s3.get_object.return_value = {'Body': Mock(read=lambda size: sniff_samples()['parquet'])}
+        
+        self.assertEqual(sniff_object(s3, 'bucket', 'dados/sem-extensao')['format'], 'parquet')
+        self.assertEqual(s3.get_object.call_args[1]['Range'], f"bytes=0-{SNIFF_BYTES - 1}")
+    
+    @patch('src.lambda_function.TRUST_EVENT_METADATA', True)
+    @patch('src.lambda_function.s3_client')
+    @patch('src.lambda_function.bedrock_client')
+    def test_extensionless_object_is_typed(self, mock_bedrock, mock_s3):
+        """Testa que objeto sem extensão chega ao modelo com o formato identificado"""
+        
+        import src.lambda_function as lf
+        
+        lf.recommendation_cache.clear()
+        lf.similarity_index.clear()
+        mock_s3.get_object.return_value = {'Body': Mock(read=lambda size: sniff_samples()['gzip'])}
+        mock_bedrock.invoke_model.return_value = {'body': Mock(read=lambda: json.dumps({'content': [{'text': json.dumps(
+            {'storage_class': 'GLACIER', 'reasoning': 'Export comprimido', 'confidence': 'alta'})}]}).encode())}
+        
+        record = {
+            'eventName': 'ObjectCreated:Put',
+            's3': {'bucket': {'name': 'bucket'},
+                   'object': {'key': 'exports/exportacao-final', 'size': 8 * 1024 * 1024, 'eTag': 'e'}}
+        }
+        with patch('src.lambda_function.SNIFF_CONTENT', 'unknown'), patch('src.lambda_function.TABLE_NAME', None):
+            result = lf.collect_metadata(record)
+            mock_s3.get_object.assert_not_called()
+            lf.process_results([result])
+        
+        metadata = result['file_metadata']
+        self.assertEqual((metadata['file_type'], metadata['content_type']), ('gz', 'application/gzip'))
+        self.assertTrue(metadata['compressed'])
+        prompt = json.loads(mock_bedrock.invoke_model.call_args[1]['body'])['messages'][0]['content']
+        self.assertIn('formato gzip (comprimido)', prompt)
+        
+        item = lf.build_insight_item('bucket', 'exports/exportacao-final', metadata,
+                                     {'storage_class': 'GLACIER', 'reasoning': 'x', 'confidence': 'alta'})
+        self.assertEqual(item['sniffed_format'], 'gzip')
+    
+    @patch('src.lambda_function.s3_client')
+    def test_known_extension_not_sniffed(self, mock_s3):
+        """Testa que no modo 'unknown' objetos com tipo conhecido não geram GET extra"""
+        
+        import src.lambda_function as lf
+        
+        record = {
+            'eventName': 'ObjectCreated:Put',
+            's3': {'bucket': {'name': 'bucket'},
+                   'object': {'key': 'fotos/praia.jpg', 'size': 8 * 1024 * 1024, 'eTag': 'e'}}
+        }
+        with patch('src.lambda_function.SNIFF_CONTENT', 'unknown'):
+            result = lf.collect_metadata(record)
+            self.assertFalse(lf.needs_sniffing(result['file_metadata']))
+            self.assertTrue(lf.needs_sniffing(dict(result['file_metadata'], file_name='dados.v2/export')))
+        
+        mock_s3.get_object.assert_not_called()
+        self.assertNotIn('sniffed_format', result['file_metadata'])
+    
+    @patch('src.lambda_function.TRUST_EVENT_METADATA', True)
+    @patch('src.lambda_function.s3_client')
+    def test_rule_match_not_sniffed(self, mock_s3):
+        """Testa que objetos resolvidos pelas regras não geram GET com Range"""
+        
+        import src.lambda_function as lf
+        from rules import RuleEngine
+        
+        record = {
+            'eventName': 'ObjectCreated:Put',
+            's3': {'bucket': {'name': 'bucket'},
+                   'object': {'key': 'backups/dump-final', 'size': 8 * 1024 * 1024, 'eTag': 'e'}}
+        }
+        engine = RuleEngine([{'name': 'dumps', 'suffixes': ('-final',), 'storage_class': 'GLACIER',
+                              'score': 0.95, 'reasoning': 'Dump final'}])
+        with patch('src.lambda_function.SNIFF_CONTENT', 'unknown'), patch('src.lambda_function.TABLE_NAME', None), \
+                patch('src.lambda_function.rule_engine', engine):
+            result = lf.collect_metadata(record)
+            lf.process_results([result])
+        
+        mock_s3.get_object.assert_not_called()
+        self.assertEqual(result['recommendation']['storage_class'], 'GLACIER')
+
+def access_log_line(object_key, operation='REST.GET.OBJECT', status='200', when=None, bucket='bucket'):
+    """Linha no formato do S3 server access log"""
+    
+    from datetime import timezone
+    
+    stamp = (when or datetime.now(timezone.utc)).strftime('%d/%b/%Y:%H:%M:%S +0000')
+    encoded = urllib.parse.quote(object_key)
+    return (f'79a59df900b949e5 {bucket} [{stamp}] 192.0.2.3 79a59df900b949e5 3E57427F3EXAMPLE '
+            f'{operation} {encoded} "GET /{bucket}/{encoded} HTTP/1.1" {status} - 113 113 7 6 "-" '
+            f'"aws-cli/2.0" - s9lzHYrFp76ZVxRcpX9= SigV4 ECDHE-RSA-AES128-GCM-SHA256 AuthHeader '
+            f'{bucket}.s3.us-east-1.amazonaws.com TLSv1.2 - -')
+
+class TestAccessLog(unittest.TestCase):
+    """Testes da frequência de acesso a partir dos logs do S3"""
+    
+    def test_parse_access_log_line(self):
+        """Testa que só leituras com sucesso são contadas e a chave é decodificada"""
+        
+        import time
+        from access_log import parse_access_log_line
+        
+        bucket, key, timestamp = parse_access_log_line(access_log_line('dados/relatório final.csv'))
+        self.assertEqual((bucket, key), ('bucket', 'dados/relatório final.csv'))
+        self.assertAlmostEqual(timestamp, time.time(), delta=5)
+        
+        self.assertIsNone(parse_access_log_line(access_log_line('dados/a.csv', operation='REST.PUT.OBJECT')))
+        self.assertIsNone(parse_access_log_line(access_log_line('dados/a.csv', status='404')))
+        self.assertIsNone(parse_access_log_line('linha truncada'))
+    
+    def test_log_timestamp_memoized(self):
+        """Testa que a data repetida é convertida uma vez e datas inválidas viram None"""
+        
+        from access_log import parse_log_timestamp
+        
+        parse_log_timestamp.cache_clear()
+        first = parse_log_timestamp('[06/Feb/2019:00:00:38 +0000]')
+        self.assertEqual(parse_log_timestamp('[06/Feb/2019:00:00:38 +0000]'), first)
+        self.assertEqual(first, 1549411238.0)
+        self.assertEqual(parse_log_timestamp.cache_info().hits, 1)
+        self.assertIsNone(parse_log_timestamp('[data inválida]'))
+    
+    def test_sketch_estimates_and_decay(self):
+        """Testa que a contagem nunca subestima e cai pela metade a cada meia-vida"""
+        
+        from access_log import DecayingSketch
+        
+        sketch = DecayingSketch(width=256, depth=4, half_life=3600, top_k=5)
+        truth = {f"obj-{index}": index % 7 for index in range(200)}
+        for item, count in truth.items():
+            for _ in range(count):
+                sketch.add(item, 1000.0)
+        for _ in range(50):
+            sketch.add('quente', 1000.0)
+        
+        for item, count in truth.items():
+            self.assertGreaterEqual(sketch.estimate(item, now=1000.0), count - 1e-9)
+        self.assertAlmostEqual(sketch.estimate('quente', now=1000.0), 50, delta=5)
+        self.assertAlmostEqual(sketch.estimate('quente', now=4600.0), sketch.estimate('quente', now=1000.0) / 2)
+        self.assertEqual(sketch.heavy_hitters(1, now=1000.0)[0][0], 'quente')
+        
+        # Acessos muito depois do marco reescalam os contadores sem perder a proporção
+        sketch.add('quente', 1000.0 + 3600 * 100)
+        self.assertAlmostEqual(sketch.estimate('quente', now=1000.0 + 3600 * 100), 1.0, delta=0.01)
+    
+    def test_tracker_prefixes_and_snapshot(self):
+        """Testa contagem por prefixo, CloudTrail e a serialização do tracker"""
+        
+        from access_log import AccessTracker
+        
+        tracker = AccessTracker(width=1024, prefix_levels=2)
+        tracker.ingest_access_log([access_log_line('logs/app/a.log'), access_log_line('logs/app/b.log'),
+                                   access_log_line('logs/app/b.log', status='403')])
+        tracker.ingest_cloudtrail({'Records': [
+            {'eventSource': 's3.amazonaws.com', 'eventName': 'GetObject', 'eventTime': '2026-10-17T00:00:00Z',
+             'requestParameters': {'bucketName': 'bucket', 'key': 'logs/app/a.log'}},
+            {'eventSource': 's3.amazonaws.com', 'eventName': 'PutObject', 'eventTime': '2026-10-17T00:00:00Z',
+             'requestParameters': {'bucketName': 'bucket', 'key': 'logs/app/a.log'}}
+        ]})
+        self.assertEqual(tracker.stats, {'lines': 3, 'accesses': 3, 'ignored': 1})
+        
+        restored = AccessTracker.loads(tracker.dumps())
+        now = datetime(2026, 10, 17).timestamp()
+        for candidate in (tracker, restored):
+            counts = candidate.access_counts('bucket', 'logs/app/a.log', now=now)
+            self.assertGreaterEqual(counts['key'], 1.9)
+            self.assertGreaterEqual(counts['prefix'], 2.9)
+        self.assertEqual(restored.hot_prefixes(1, now=now)[0][0], 'bucket/logs/')
+        
+        with self.assertRaises(ValueError):
+            AccessTracker.loads(b'lixo')
+    
+    @patch('src.lambda_function.s3_client')
+    @patch('src.lambda_function.bedrock_client')
+    def test_hot_object_stays_standard(self, mock_bedrock, mock_s3):
+        """Testa o fluxo completo: logs agregados pelo handler mantêm objetos quentes em STANDARD"""
+        
+        import gzip
+        import io
+        from decimal import Decimal
+        from botocore.exceptions import ClientError
+        from botocore.response import StreamingBody
+        import src.lambda_function as lf
+        
+        log = gzip.compress('\n'.join([access_log_line('dados/painel.csv')] * 30
+                                       + [access_log_line('dados/antigo.csv')]).encode())
+        snapshots = {}
+        
+        def get_object(Bucket, Key, **kwargs):
+            if Key == 'estado/acessos.bin':
+                if Key not in snapshots:
+                    raise ClientError({'Error': {'Code': 'NoSuchKey', 'Message': ''}}, 'GetObject')
+                return {'Body': io.BytesIO(snapshots[Key]), 'ETag': '"e1"'}
+            return {'Body': StreamingBody(io.BytesIO(log), len(log))}
+        
+        mock_s3.get_object.side_effect = get_object
+        mock_s3.put_object.side_effect = lambda Bucket, Key, Body, **kwargs: snapshots.update({Key: Body})
+        event = {'Records': [{'s3': {'bucket': {'name': 'logs'}, 'object': {'key': 'acessos/2026-10-17.gz'}}}]}
+        
+        with patch('src.lambda_function.ACCESS_STATS', 's3://logs/estado/acessos.bin'), \
+                patch.dict(lf.access_snapshot, {'tracker': None, 'etag': None, 'checked_at': 0.0}), \
+                patch('src.lambda_function.TRUST_EVENT_METADATA', True):
+            response = lf.access_log_handler(event, None)
+            self.assertEqual(response['files'], 1)
+            self.assertEqual(response['stats']['accesses'], 31)
+            
+            metadata = {}
+            for key in ('dados/painel.csv', 'dados/antigo.csv'):
+                record = {'eventName': 'ObjectCreated:Put',
+                          's3': {'bucket': {'name': 'bucket'}, 'object': {'key': key, 'size': 1024, 'eTag': 'e'}}}
+                metadata[key] = lf.collect_metadata(record)['file_metadata']
+        
+        self.assertGreaterEqual(metadata['dados/painel.csv']['access_count'], 30)
+        self.assertLess(metadata['dados/antigo.csv']['access_count'], lf.ACCESS_HOT_THRESHOLD)
+        self.assertGreaterEqual(metadata['dados/antigo.csv']['prefix_access_count'], 31)
+        
+        recommendation = lf.resolve_by_rules(metadata['dados/painel.csv'])
+        self.assertEqual((recommendation['storage_class'], recommendation['source']), ('STANDARD', 'access_log'))
+        mock_bedrock.invoke_model.assert_not_called()
+        self.assertIn('leituras recentes', lf.describe_file(metadata['dados/antigo.csv']))
+        
+        item = lf.build_insight_item('bucket', 'dados/painel.csv', metadata['dados/painel.csv'], recommendation)
+        self.assertEqual(item['recommendation_source'], 'access_log')
+        self.assertIsInstance(item['access_count'], Decimal)
+
+class LocalScheduleTable:
+    """Stand-in da tabela de agendamento: batch_writer e query no índice due-index"""
+    
+    def __init__(self):
+        self.items = {}
+        self.queries = 0
+    
+    def batch_writer(self, overwrite_by_pkeys=None):
+        table = self
+        
+        class Writer:
+            def __enter__(self):
+                return self
+            
+            def __exit__(self, *exc):
+                return False
+            
+            def put_item(self, Item):
+                table.items[Item['object_id']] = dict(Item)
+            
+            def delete_item(self, Key):
+                table.items.pop(Key['object_id'], None)
+        
+        return Writer()
+    
+    def query(self, IndexName, KeyConditionExpression, ExpressionAttributeValues, Limit, ExclusiveStartKey=None):
+        from decimal import Decimal
+        
+        self.queries += 1
+        label, now = ExpressionAttributeValues[':bucket'], ExpressionAttributeValues[':now']
+        matches = sorted((item for item in self.items.values()
+                          if item['due_bucket'] == label and item['due_at'] <= now),
+                         key=lambda item: (item['due_at'], item['object_id']))
+        if ExclusiveStartKey:
+            start = (ExclusiveStartKey['due_at'], ExclusiveStartKey['object_id'])
+            matches = [item for item in matches if (item['due_at'], item['object_id']) > start]
+        
+        # Números voltam como Decimal, como no boto3
+        page = [dict(item, due_at=Decimal(item['due_at'])) for item in matches[:Limit]]
+        response = {'Items': page}
+        if len(matches) > Limit:
+            last = page[-1]
+            response['LastEvaluatedKey'] = {key: last[key] for key in ('object_id', 'due_bucket', 'due_at')}
+        return response
+
+class TestTransitionScheduler(unittest.TestCase):
+    """Testes do agendamento de transições e do sweep fora de pico"""
+    
+    def test_offpeak_windows(self):
+        """Testa janelas UTC, inclusive as que passam da meia-noite"""
+        
+        from datetime import timezone
+        from scheduler import in_window, parse_windows
+        
+        windows = parse_windows('22:00-02:00, 13:00-14:30')
+        self.assertEqual(windows, [(1320, 120), (780, 870)])
+        
+        def at(hour, minute):
+            return datetime(2026, 10, 17, hour, minute, tzinfo=timezone.utc).timestamp()
+        
+        self.assertTrue(in_window(at(23, 0), windows))
+        self.assertTrue(in_window(at(1, 59), windows))
+        self.assertFalse(in_window(at(2, 0), windows))
+        self.assertTrue(in_window(at(14, 29), windows))
+        self.assertFalse(in_window(at(15, 0), windows))
+        self.assertTrue(in_window(at(15, 0), parse_windows('')))
+    
+    def test_sweep_pages_and_resumes(self):
+        """Testa que o sweep percorre só as faixas vencidas, em páginas, e retoma pelo cursor"""
+        
+        from scheduler import TransitionSchedule, sweep_due
+        
+        table = LocalScheduleTable()
+        schedule = TransitionSchedule(lambda: table, bucket_seconds=3600, shards=2)
+        now = 1_800_000_000
+        due = [{'object_id': f"bucket/antigo-{index}", 'due_at': now - 3 * 3600 + index * 400} for index in range(25)]
+        future = [{'object_id': f"bucket/futuro-{index}", 'due_at': now + 3600 * (index + 1)} for index in range(2)]
+        schedule.schedule(due + future)
+        
+        handled = []
+        
+        def handle_page(items):
+            self.assertLessEqual(len(items), 4)
+            handled.extend(item['object_id'] for item in items)
+            schedule.complete([item['object_id'] for item in items])
+        
+        checkpoints = []
+        state = {'watermark': schedule.bucket_of(now - 6 * 3600)}
+        pages = iter(range(3))
+        complete = sweep_due(schedule, state, now, handle_page, page_size=4,
+                             on_checkpoint=lambda snapshot: checkpoints.append(json.dumps(snapshot)),
+                             should_stop=lambda: next(pages, None) is None)
+        self.assertFalse(complete)
+        
+        # Nova execução a partir do último checkpoint (JSON, como no CheckpointStore)
+        state = json.loads(checkpoints[-1])
+        self.assertTrue(sweep_due(schedule, state, now, handle_page, page_size=4))
+        
+        self.assertEqual(sorted(handled), sorted(item['object_id'] for item in due))
+        self.assertEqual(sorted(table.items), ['bucket/futuro-0', 'bucket/futuro-1'])
+        self.assertEqual(state['watermark'], schedule.bucket_of(now))
+    
+    @patch('src.lambda_function.s3_client')
+    def test_transitions_scheduled_and_swept(self, mock_s3):
+        """Testa o fluxo completo: agenda na chegada e aplica no sweep só o que continua válido"""
+        
+        from botocore.exceptions import ClientError
+        import src.lambda_function as lf
+        
+        tables = {'schedule': LocalScheduleTable(), 'checkpoints': LocalCheckpointTable()}
+        results = [{'bucket_name': 'bucket', 'object_key': f"dados/{name}.csv", 'status': 'pending',
+                    'file_metadata': {'file_name': f"dados/{name}.csv", 'file_size': 1024, 'file_type': 'csv',
+                                      'content_type': 'text/csv', 'storage_class': 'STANDARD',
+                                      'etag': f"etag-{name}", 'last_modified': datetime.now().isoformat()}}
+                   for name in ('estavel', 'reescrito', 'apagado')]
+        recommendation = {'storage_class': 'GLACIER', 'reasoning': 'Arquivo frio', 'confidence': 'alta'}
+        
+        def head_object(Bucket, Key):
+            if 'apagado' in Key:
+                raise ClientError({'Error': {'Code': '404', 'Message': 'Not Found'}}, 'HeadObject')
+            etag = 'etag-novo' if 'reescrito' in Key else f"etag-{Key[6:-4]}"
+            return {'ContentLength': 1024, 'ContentType': 'text/csv', 'LastModified': datetime.now(),
+                    'ETag': f'"{etag}"'}
+        
+        mock_s3.head_object.side_effect = head_object
+        
+        with patch('src.lambda_function.get_table', side_effect=lambda name: tables[name]), \
+                patch('src.lambda_function.SCHEDULE_TABLE', 'schedule'), \
+                patch('src.lambda_function.CHECKPOINT_TABLE', 'checkpoints'), \
+                patch('src.lambda_function.TABLE_NAME', None), \
+                patch('src.lambda_function.TRANSITION_DELAY_DAYS', 0), \
+                patch('src.lambda_function.OFFPEAK_WINDOWS', [(0, 0)]), \
+                patch('src.lambda_function.assess_costs'), \
+                patch('src.lambda_function.get_recommendations', return_value=[recommendation] * 3), \
+                patch.dict(lf.sweep_stats, {name: 0 for name in lf.sweep_stats}):
+            lf.process_results(results)
+            
+            self.assertEqual([result['status'] for result in results], ['scheduled'] * 3)
+            self.assertEqual(len(tables['schedule'].items), 3)
+            mock_s3.copy_object.assert_not_called()
+            
+            # Fora da janela nada é feito; {"force": true} ignora a janela
+            self.assertEqual(lf.sweep_handler({}, None)['status'], 'outside_window')
+            response = lf.sweep_handler({'force': True}, None)
+        
+        self.assertEqual(response['status'], 'complete')
+        self.assertEqual((response['counts']['applied'], response['counts']['changed'],
+                          response['counts']['missing']), (1, 1, 1))
+        mock_s3.copy_object.assert_called_once()
+        self.assertEqual(mock_s3.copy_object.call_args[1]['Key'], 'dados/estavel.csv')
+        self.assertEqual(mock_s3.copy_object.call_args[1]['StorageClass'], 'GLACIER')
+        self.assertEqual(tables['schedule'].items, {})
+        self.assertIn('watermark', json.loads(tables['checkpoints'].items['sweep:transitions']['state']))
+
 if __name__ == '__main__':
     # Executar testes
     unittest.main(verbosity=2)
\ No newline at end of file